@@ -1,157 +1,449 @@
+import time
+
 import Chess_AI.Engine.Chessboard as chessboard
+import Chess_AI.Engine.TranspositionTable as transposition
+import Chess_AI.Engine.MoveOrdering as ordering
+
+# score of player who is checkmated at root. Checkmate found ply plies deeper is scored -MATE_SCORE + ply,
+# so shorter mates are preferred. Scores beyond MATE_BOUND are mates, MATE_SCORE - abs(score) is distance to mate
+MATE_SCORE = 99999
+MATE_BOUND = MATE_SCORE - 1000
+
+
+def score_to_transposition(score, ply):
+    """Get score stored in transposition table. Mate scores are stored as distance to mate from stored position
+    (not from root), so they are right wherever in search the position is found again"""
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def score_from_transposition(score, ply):
+    """Get score stored in transposition table as score from root of search found at ply"""
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+    return score
+
 
 class BoardEvaluation:
     def __init__(self, board_state):
         self.board_state = board_state
-
-        self.king_table = [[-30, -40, -40, -50, -50, -40, -40, -30],
-                           [-30, -40, -40, -50, -50, -40, -40, -30],
-                           [-30, -40, -40, -50, -50, -40, -40, -30],
-                           [-30, -40, -40, -50, -50, -40, -40, -30],
-                           [-20, -30, -30, -40, -40, -30, -30, -20],
-                           [-10, -20, -20, -20, -20, -20, -20, -10],
-                           [20, 20, 0, 0, 0, 0, 20, 20],
-                           [20, 30, 10, 0, 0, 10, 30, 20]
-                           ]
-        self.queen_table = [[-20, -10, -10, -5, -5, -10, -10, -20],
-                            [-10, 0, 0, 0, 0, 0, 0, -10],
-                            [-10, 0, 5, 5, 5, 5, 0, -10],
-                            [-5, 0, 5, 5, 5, 5, 0, -5],
-                            [0, 0, 5, 5, 5, 5, 0, -5],
-                            [-10, 5, 5, 5, 5, 5, 0, -10],
-                            [-10, 0, 0, 0, 0, 0, 0, -10],
-                            [-20, -10, -10, -5, -5, -10, -10, -20]
-                            ]
-        self.rook_table = [[0, 0, 0, 0, 0, 0, 0, 0],
-                           [5, 10, 10, 10, 10, 10, 10, 5],
-                           [-5, 0, 0, 0, 0, 0, 0, -5],
-                           [-5, 0, 0, 0, 0, 0, 0, -5],
-                           [-5, 0, 0, 0, 0, 0, 0, -5],
-                           [-5, 0, 0, 0, 0, 0, 0, -5],
-                           [-5, 0, 0, 0, 0, 0, 0, -5],
-                           [0, 0, 0, 5, 5, 0, 0, 0]
-                           ]
-        self.bishop_table = [[-20, -10, -10, -10, -10, -10, -10, -20],
-                             [-10, 0, 0, 0, 0, 0, 0, -10],
-                             [-10, 0, 5, 10, 10, 5, 0, -10],
-                             [-10, 5, 5, 10, 10, 5, 5, -10],
-                             [-10, 0, 10, 10, 10, 10, 0, -10],
-                             [-10, 10, 10, 10, 10, 10, 10, -10],
-                             [-10, 5, 0, 0, 0, 0, 5, -10],
-                             [-20, -10, -10, -10, -10, -10, -10, -20]
-                             ]
-        self.knight_table = [[-50, -40, -30, -30, -30, -30, -40, -50],
-                             [-40, -20, 0, 0, 0, 0, -20, -40],
-                             [-30, 0, 10, 15, 15, 10, 0, -30],
-                             [-30, 5, 15, 20, 20, 15, 5, -30],
-                             [-30, 0, 15, 20, 20, 15, 0, -30],
-                             [-30, 5, 10, 15, 15, 10, 5, -30],
-                             [-40, -20, 0, 5, 5, 0, -20, -40],
-                             [-50, -40, -30, -30, -30, -30, -40, -50]
-                             ]
-        self.pawn_table = [[0, 0, 0, 0, 0, 0, 0, 0],
-                           [50, 50, 50, 50, 50, 50, 50, 50],
-                           [10, 10, 20, 30, 30, 20, 10, 10],
-                           [5, 5, 10, 25, 25, 10, 5, 5],
-                           [0, 0, 0, 20, 20, 0, 0, 0],
-                           [5, -5, -10, 0, 0, -10, -5, 5],
-                           [5, 10, 10, -20, -20, 10, 10, 5],
-                           [0, 0, 0, 0, 0, 0, 0, 0]
-                           ]
-        self.position_tables = [None] * 6
-        self.position_tables[chessboard.PieceType.KING] = self.king_table
-        self.position_tables[chessboard.PieceType.QUEEN] = self.queen_table
-        self.position_tables[chessboard.PieceType.ROOK] = self.rook_table
-        self.position_tables[chessboard.PieceType.BISHOP] = self.bishop_table
-        self.position_tables[chessboard.PieceType.KNIGHT] = self.knight_table
-        self.position_tables[chessboard.PieceType.PAWN] = self.pawn_table
-
-        self.values = {chessboard.PieceType.KING: 0, chessboard.PieceType.QUEEN: 900, chessboard.PieceType.ROOK: 500,
-                       chessboard.PieceType.BISHOP: 330, chessboard.PieceType.KNIGHT: 320,
-                       chessboard.PieceType.PAWN: 100}
+        self.values = {piece_type: chessboard.PieceSquareTables.values[piece_type]
+                       for piece_type in chessboard.PieceType.piece_type_list()}
 
     def evaluate(self):
-        """Get board evaluation score"""
-        game_state = self.board_state.game_state()
-        if game_state == chessboard.GameState.CHECKMATE:
-            return -99999 if self.board_state.white_to_move else 99999
-        elif game_state == chessboard.GameState.STALEMATE or game_state == chessboard.GameState.INSUFFICIENT_MATERIAL:
-            return 0
-        else:
-            pieces_lists = self.board_state.get_pieces_lists()
-            evaluation = self.material_score(pieces_lists) + self.position_score(pieces_lists)
-            return evaluation if self.board_state.white_to_move else -evaluation
-
-    def material_score(self, pieces_lists):
-        """Get board material evaluation score"""
-        material_score = 0
-        for piece_type in chessboard.PieceType.piece_type_list():
-            material_score += self.values[piece_type] * (len(pieces_lists[piece_type][chessboard.Color.WHITE]) -
-                                                         len(pieces_lists[piece_type][chessboard.Color.BLACK]))
-        return material_score
-
-    def position_score(self, pieces_lists):
-        """Get board position evaluation score"""
-        position_score = 0
-        for piece_type in chessboard.PieceType.piece_type_list():
-            for piece in pieces_lists[piece_type][chessboard.Color.WHITE]:
-                position_score += self.position_tables[piece_type][piece.position[0]][piece.position[1]]
-            for piece in pieces_lists[piece_type][chessboard.Color.BLACK]:
-                position_score -= self.position_tables[piece_type][7 - piece.position[0]][piece.position[1]]
-        return position_score
+        """Get board evaluation score from current player's point of view. Checkmate and draws are not recognized,
+        search detects them where it generates moves"""
+        # material and position scores are updated by moves, so there is no need to scan the board
+        evaluation = self.board_state.material_score + self.board_state.position_score
+        return evaluation if self.board_state.white_to_move else -evaluation
+
+
+class SearchTimeout(Exception):
+    """Raised inside search when time budget is spent"""
 
 
 class ChessAI:
-    def __init__(self, board_state):
+    # how often (in nodes) search checks if time budget is spent
+    TIME_CHECK_INTERVAL = 256
+    # positional gain allowed for capture in quiescence search beyond captured piece value (delta pruning)
+    DELTA_MARGIN = 200
+    # half width of first root window around previous iteration score (aspiration window). Window side that
+    # search fails on is widened ASPIRATION_GROWTH times until it covers all scores
+    ASPIRATION_WINDOW = 50
+    ASPIRATION_GROWTH = 4
+    # null move pruning: position is cut off if null move searched NULL_MOVE_REDUCTION plies shallower still fails
+    # high. Used from NULL_MOVE_MIN_DEPTH
+    NULL_MOVE_REDUCTION = 2
+    NULL_MOVE_MIN_DEPTH = 3
+    # late move reductions: quiet moves ordered after first LMR_MOVES moves are searched one ply shallower
+    # (two plies after LMR_DEEP_MOVES moves). Used from LMR_MIN_DEPTH
+    LMR_MOVES = 3
+    LMR_DEEP_MOVES = 6
+    LMR_MIN_DEPTH = 2
+
+    def __init__(self, board_state, hash_size_mb=16):
         self.board_state = board_state
         self.evaluator = BoardEvaluation(board_state)
+        # kept between ai_move calls, so results of previous searches in game are reused
+        self.transposition_table = transposition.TranspositionTable(hash_size_mb)
+        self.move_orderer = ordering.MoveOrderer(board_state, self.evaluator.values)
+        self.nodes = 0
+        self.deadline = None
+        self.stop_requested = False
+        self.time_limit = None
+        # search is stopped when it searched that many nodes (inf if it is not limited)
+        self.node_limit = float("inf")
+        # time from which time budget is counted (start of search, or ponderhit unless pondering time is kept)
+        self.clock_start_time = None
+        self.pondering = False
+        # selective search switches, set for every search by ai_move
+        self.null_move_pruning = True
+        self.late_move_reductions = True
+        # progress of current search: start time, last fully searched depth and its best move
+        self.search_start_time = None
+        self.search_depth = 0
+        self.best_move = None
+        self.best_score = None
+        # expected opponent's reply to move found by last search, None if it is unknown
+        self.ponder_move = None
+        # function called with ChessAI after every fully searched depth (from search thread), None if not used
+        self.info_callback = None
+        # SearchStatistics of current search, None if statistics are not collected
+        self.statistics = None
+
+    def set_board_state(self, board_state):
+        """Search another position object. Transposition table and move ordering data are kept"""
+        self.board_state = board_state
+        self.evaluator.board_state = board_state
+        self.move_orderer.board_state = board_state
+
+    def ai_move(self, depth=3, time_limit=None, max_depth=None, ponder=False, null_move_pruning=True,
+                late_move_reductions=True, statistics=None, node_limit=None):
+        """Get next AI move. Search deepens one ply at a time up to depth (or max_depth if given).
+        If time_limit (in seconds) is given, search stops when time is spent and returns best move of
+        last fully searched depth. Depth 1 is always searched fully. Search can be also stopped by stop method.
+        In ponder mode (searching position after expected opponent's move) time is not counted until ponderhit
+        is called. null_move_pruning and late_move_reductions turn selective search techniques on or off.
+        If statistics (SearchStatistics) is given, it is filled with counters of this search. If node_limit is given,
+        search stops (like on time limit) when it has searched that many nodes"""
+        if max_depth is None:
+            max_depth = depth
+        self.transposition_table.new_search()
+        self.move_orderer.new_search()
+        self.nodes = 0
+        self.deadline = None
+        self.time_limit = time_limit
+        self.node_limit = node_limit if node_limit is not None else float("inf")
+        self.search_start_time = time.perf_counter()
+        self.clock_start_time = self.search_start_time
+        self.pondering = ponder
+        self.null_move_pruning = null_move_pruning
+        self.late_move_reductions = late_move_reductions
+        self.statistics = statistics
+        self.search_depth = 0
+        self.best_move = None
+        self.best_score = None
+        self.ponder_move = None
+        history_length = len(self.board_state.moves_history)
+
+        moves = self.board_state.legal_moves()
+        if len(moves) <= 1:
+            self.stop_requested = False
+            self.pondering = False
+            if moves:
+                self.ponder_move = self.find_ponder_move(moves[0])
+            if statistics is not None:
+                statistics.finish(0)
+            return moves[0] if moves else None
+
+        best_move = None
+        for current_depth in range(1, max_depth + 1):
+            try:
+                move, score = self.search_root_aspiration(current_depth, best_move, self.best_score)
+            except SearchTimeout:
+                # abandon unfinished iteration and take back its moves
+                while len(self.board_state.moves_history) > history_length:
+                    self.board_state.undo_move()
+                break
+            if move is None:
+                break
+            best_move = move
+            self.best_move = move
+            self.best_score = score
+            self.search_depth = current_depth
+            if statistics is not None:
+                statistics.add_iteration(current_depth, self.nodes, score, self.principal_variation())
+            if self.info_callback is not None:
+                self.info_callback(self)
+            # time and stop requests are not checked during depth 1 search, so there is always move to return
+            self.update_deadline()
+            if self.stop_requested or self.nodes >= self.node_limit or time.perf_counter() >= self.deadline:
+                break
+        self.deadline = None
+        self.stop_requested = False
+        self.pondering = False
+        if best_move is not None:
+            self.ponder_move = self.find_ponder_move(best_move)
+        if statistics is not None:
+            statistics.finish(self.nodes)
+        return best_move
+
+    def update_deadline(self):
+        """Set time when search is stopped. Time is not counted while pondering"""
+        self.deadline = float("inf")
+        if self.time_limit is not None and not self.pondering:
+            self.deadline = self.clock_start_time + self.time_limit
+
+    def ponderhit(self, keep_elapsed=False):
+        """Opponent played expected move (called from other thread). Pondering search continues as normal search,
+        its time budget is counted from now (as UCI requires). If keep_elapsed is set, time spent pondering is
+        counted too, so search ends as soon as the time budget counted from start of pondering is spent"""
+        if not keep_elapsed:
+            self.clock_start_time = time.perf_counter()
+        self.pondering = False
+        if self.deadline is not None:
+            self.update_deadline()
+
+    def find_ponder_move(self, move):
+        """Get expected opponent's reply to move (best move stored in transposition table) or None if it is
+        unknown"""
+        self.board_state.make_move(move)
+        reply = self.transposition_table.get_best_move(self.board_state.zobrist_key)
+        if reply is not None and reply not in self.board_state.legal_moves():
+            reply = None
+        self.board_state.undo_move()
+        return reply
+
+    def principal_variation(self, max_length=32):
+        """Get expected line of play (list of moves) starting with best move of last fully searched depth. Moves after
+        the first are best moves stored in transposition table"""
+        if self.best_move is None:
+            return []
+        variation = [self.best_move]
+        self.board_state.make_move(self.best_move)
+        while len(variation) < max_length and not self.board_state.is_repetition():
+            move = self.transposition_table.get_best_move(self.board_state.zobrist_key)
+            if move is None or move not in self.board_state.legal_moves():
+                break
+            variation.append(move)
+            self.board_state.make_move(move)
+        for _ in variation:
+            self.board_state.undo_move()
+        return variation
 
-    def ai_move(self, depth=3):
-        """Get next AI move. Move searching depth is set by depth"""
+    def stop(self):
+        """Stop search (called from other thread). ai_move returns best move of last fully searched depth.
+        If search has not started yet, it is stopped after depth 1"""
+        self.stop_requested = True
+
+    def search_root_aspiration(self, depth, previous_best_move=None, previous_score=None):
+        """Search all moves to given depth with window around previous_score (score of shallower search).
+        If score falls outside of window, search is repeated with window widened on that side.
+        Returns best move and its evaluation"""
+        if previous_score is None:
+            return self.search_root(depth, previous_best_move)
+        alpha_window = beta_window = ChessAI.ASPIRATION_WINDOW
+        while True:
+            alpha = max(previous_score - alpha_window, -100000)
+            beta = min(previous_score + beta_window, 100000)
+            move, score = self.search_root(depth, previous_best_move, alpha, beta)
+            if score <= alpha and alpha > -100000:
+                alpha_window *= ChessAI.ASPIRATION_GROWTH
+            elif score >= beta and beta < 100000:
+                beta_window *= ChessAI.ASPIRATION_GROWTH
+                # move that failed high is searched first in next try
+                previous_best_move = move
+            else:
+                return move, score
+
+    def search_root(self, depth, previous_best_move=None, alpha=-100000, beta=100000):
+        """Search all moves to given depth. Returns best move and its evaluation. Evaluation not greater than alpha
+        is upper bound and evaluation not less than beta is lower bound of real evaluation.
+        previous_best_move (best move of shallower search) is searched first"""
         best_move = None
-        best_board_evaluation = -99999
-        alpha = -100000
-        beta = 100000
-        for move in self.board_state.legal_moves():
-            self.board_state.board[move[0][0]][move[0][1]].move(move[1])
-            board_evaluation = -self.alphabeta(-beta, -alpha, depth - 1)
+        best_board_evaluation = -100000
+        alpha_original = alpha
+        zobrist_key = self.board_state.zobrist_key
+        if previous_best_move is None:
+            previous_best_move = self.transposition_table.get_best_move(zobrist_key)
+        moves = self.move_orderer.order_moves(self.board_state.legal_moves(), 0, previous_best_move)
+        for move in moves:
+            self.board_state.make_move(move)
+            board_evaluation = self.search_move(alpha, beta, depth, 1, best_move is None)
+            self.board_state.undo_move()
             if board_evaluation > best_board_evaluation:
                 best_board_evaluation = board_evaluation
                 best_move = move
+            if board_evaluation >= beta:
+                if self.statistics is not None:
+                    self.statistics.count_cutoff(move == moves[0])
+                break
             if board_evaluation > alpha:
                 alpha = board_evaluation
-            self.board_state.undo_move()
-        return best_move
+        if best_move is not None:
+            if best_board_evaluation >= beta:
+                bound = transposition.Bound.LOWER
+            elif best_board_evaluation <= alpha_original:
+                bound = transposition.Bound.UPPER
+            else:
+                bound = transposition.Bound.EXACT
+            self.transposition_table.store(zobrist_key, depth, bound, score_to_transposition(best_board_evaluation, 0),
+                                           best_move)
+        return best_move, best_board_evaluation
 
-    def alphabeta(self, alpha, beta, depth):
-        best_board_evaluation = -99999
-        if depth == 0:
-            return self.quiescence_search(alpha, beta)
-        for move in self.board_state.legal_moves():
-            self.board_state.board[move[0][0]][move[0][1]].move(move[1])
-            board_evaluation = -self.alphabeta(-beta, -alpha, depth - 1)
-            self.board_state.undo_move()
-            if board_evaluation >= beta:
+    def search_move(self, alpha, beta, depth, ply, is_first_move, reduction=0):
+        """Search position after move made at ply - 1 (principal variation search). First move is searched with
+        full window, others with null window and searched again only if they turn out to be better than alpha.
+        Move with reduction is first searched that many plies shallower and searched to full depth only if it
+        beats alpha. Returns evaluation of move from point of view of player that made it"""
+        if is_first_move:
+            return -self.alphabeta(-beta, -alpha, depth - 1, ply)
+        if reduction:
+            board_evaluation = -self.alphabeta(-alpha - 1, -alpha, depth - 1 - reduction, ply)
+            if board_evaluation <= alpha:
                 return board_evaluation
+        board_evaluation = -self.alphabeta(-alpha - 1, -alpha, depth - 1, ply)
+        if alpha < board_evaluation < beta:
+            board_evaluation = -self.alphabeta(-beta, -board_evaluation, depth - 1, ply)
+        return board_evaluation
+
+    def search_root_move(self, move, depth, alpha=-100000, beta=100000):
+        """Search single root move to given depth. Returns its evaluation from current player's point of view,
+        evaluation not greater than alpha means that move is not better than alpha"""
+        history_length = len(self.board_state.moves_history)
+        self.board_state.make_move(move)
+        try:
+            board_evaluation = -self.alphabeta(-beta, -alpha, depth - 1, 1)
+        except SearchTimeout:
+            while len(self.board_state.moves_history) > history_length:
+                self.board_state.undo_move()
+            raise
+        self.board_state.undo_move()
+        return board_evaluation
+
+    def count_node(self):
+        """Count searched node and stop search if time budget or node limit is spent or stop is requested"""
+        self.nodes += 1
+        if self.deadline is not None and self.nodes % ChessAI.TIME_CHECK_INTERVAL == 0 and \
+                (self.stop_requested or self.nodes >= self.node_limit or time.perf_counter() >= self.deadline):
+            raise SearchTimeout()
+
+    def alphabeta(self, alpha, beta, depth, ply, null_move_allowed=True):
+        if self.board_state.is_repetition():
+            # repeating position once is enough to draw, as the side that can avoid it would have done so already
+            return 0
+        if self.board_state.halfmove_clock >= 100:
+            # checkmate given by the move reaching fifty moves ends the game before the draw can be claimed
+            return -MATE_SCORE + ply if self.board_state.game_state() == chessboard.GameState.CHECKMATE else 0
+        if self.board_state.halfmove_clock == 0 and self.board_state.is_insufficient_material():
+            # material can become insufficient only by capture
+            return 0
+        if depth <= 0:
+            return self.quiescence_search(alpha, beta, ply)
+        self.count_node()
+        score, hash_move = self.probe_transposition_table(alpha, beta, depth, ply)
+        if score is not None:
+            return score
+        in_check = self.board_state.is_check()
+        if null_move_allowed and self.null_move_pruning and not in_check and beta - alpha == 1 and \
+                depth >= ChessAI.NULL_MOVE_MIN_DEPTH and self.board_state.has_non_pawn_material() and \
+                self.evaluator.evaluate() >= beta:
+            # if passing the turn does not help opponent, real move will not help either. Two null moves in row
+            # are not allowed and positions with only king and pawns are skipped because of zugzwang
+            self.board_state.make_null_move()
+            score = -self.alphabeta(-beta, -beta + 1, depth - 1 - ChessAI.NULL_MOVE_REDUCTION, ply + 1, False)
+            self.board_state.undo_null_move()
+            if score >= beta:
+                return beta
+        reductions_allowed = self.late_move_reductions and not in_check and depth >= ChessAI.LMR_MIN_DEPTH
+        alpha_original = alpha
+        best_board_evaluation = -100000
+        best_move = None
+        moves = self.move_orderer.order_moves(self.board_state.legal_moves(), ply, hash_move)
+        if not moves:
+            # checkmate or stalemate
+            return -MATE_SCORE + ply if in_check else 0
+        for index, move in enumerate(moves):
+            is_quiet = self.move_orderer.is_quiet(move)
+            self.board_state.make_move(move)
+            reduction = 0
+            if reductions_allowed and is_quiet and index >= ChessAI.LMR_MOVES and not self.board_state.is_check():
+                reduction = 1 if index < ChessAI.LMR_DEEP_MOVES else 2
+            board_evaluation = self.search_move(alpha, beta, depth, ply + 1, index == 0, reduction)
+            self.board_state.undo_move()
             if board_evaluation > best_board_evaluation:
                 best_board_evaluation = board_evaluation
+                best_move = move
+            if board_evaluation >= beta:
+                if self.statistics is not None:
+                    self.statistics.count_cutoff(index == 0)
+                if is_quiet:
+                    self.move_orderer.update_cutoff(move, ply, depth)
+                self.transposition_table.store(self.board_state.zobrist_key, depth, transposition.Bound.LOWER,
+                                               score_to_transposition(board_evaluation, ply), move)
+                return board_evaluation
             if board_evaluation > alpha:
                 alpha = board_evaluation
+        bound = transposition.Bound.UPPER if best_board_evaluation <= alpha_original else transposition.Bound.EXACT
+        self.transposition_table.store(self.board_state.zobrist_key, depth, bound,
+                                       score_to_transposition(best_board_evaluation, ply), best_move)
         return best_board_evaluation
 
-    def quiescence_search(self, alpha, beta):
-        evaluation = self.evaluator.evaluate()
-        if evaluation >= beta:
-            return beta
-        if alpha < evaluation:
-            alpha = evaluation
-        for move in self.board_state.legal_moves():
-            if self.board_state.is_capture(move):
-                self.board_state.board[move[0][0]][move[0][1]].move(move[1])
-                score = -self.quiescence_search(-beta, -alpha)
-                self.board_state.undo_move()
-                if score >= beta:
-                    return beta
-                if score > alpha:
-                    alpha = score
-        return alpha
\ No newline at end of file
+    def quiescence_search(self, alpha, beta, ply):
+        self.count_node()
+        if self.statistics is not None:
+            self.statistics.quiescence_nodes += 1
+        score, hash_move = self.probe_transposition_table(alpha, beta, 0, ply)
+        if score is not None:
+            return score
+        alpha_original = alpha
+        in_check = self.board_state.is_check()
+        if in_check:
+            # player in check can not stand pat, so all evasions are searched (no evasion is checkmate)
+            moves = self.move_orderer.order_moves(self.board_state.legal_moves(), None, hash_move)
+            if not moves:
+                return -MATE_SCORE + ply
+        else:
+            evaluation = self.evaluator.evaluate()
+            if evaluation >= beta:
+                self.transposition_table.store(self.board_state.zobrist_key, 0, transposition.Bound.LOWER,
+                                               score_to_transposition(beta, ply), None)
+                return beta
+            if alpha < evaluation:
+                alpha = evaluation
+            # captures losing material (by static exchange evaluation) are not searched
+            moves = self.move_orderer.order_captures(self.board_state.capture_moves(), hash_move)
+        best_move = None
+        for move in moves:
+            if not in_check and evaluation + self.capture_gain(move) + ChessAI.DELTA_MARGIN <= alpha:
+                # delta pruning - capture can not raise alpha
+                continue
+            self.board_state.make_move(move)
+            score = -self.quiescence_search(-beta, -alpha, ply + 1)
+            self.board_state.undo_move()
+            if score >= beta:
+                if self.statistics is not None:
+                    self.statistics.count_cutoff(move == moves[0])
+                self.transposition_table.store(self.board_state.zobrist_key, 0, transposition.Bound.LOWER,
+                                               score_to_transposition(beta, ply), move)
+                return beta
+            if score > alpha:
+                alpha = score
+                best_move = move
+        bound = transposition.Bound.UPPER if alpha <= alpha_original else transposition.Bound.EXACT
+        self.transposition_table.store(self.board_state.zobrist_key, 0, bound, score_to_transposition(alpha, ply),
+                                       best_move)
+        return alpha
+
+    def capture_gain(self, move):
+        """Get maximal material gain of capture or promotion"""
+        values = self.evaluator.values
+        gain = 0
+        if self.board_state.is_capture(move):
+            captured_type = self.board_state.get_piece_type(move >> 6 & 63)
+            # en passant captures pawn standing next to end square
+            gain = values[captured_type if captured_type is not None else chessboard.PieceType.PAWN]
+        if self.move_orderer.is_promotion(move):
+            gain += values[chessboard.move_promotion_type(move)] - values[chessboard.PieceType.PAWN]
+        return gain
+
+    def probe_transposition_table(self, alpha, beta, depth, ply):
+        """Look up current position (found at ply) in transposition table. Returns stored score if it is enough to
+        cut off search at given depth (otherwise None) and stored best move (None if there is no such move)"""
+        entry = self.transposition_table.probe(self.board_state.zobrist_key)
+        if self.statistics is not None:
+            self.statistics.count_probe(entry is not None)
+        if entry is None:
+            return None, None
+        if entry.depth >= depth:
+            score = score_from_transposition(entry.score, ply)
+            if entry.bound == transposition.Bound.EXACT or \
+                    (entry.bound == transposition.Bound.LOWER and score >= beta) or \
+                    (entry.bound == transposition.Bound.UPPER and score <= alpha):
+                return score, entry.best_move
+        return None, entry.best_move
@@ -0,0 +1,195 @@
+"""Bench - search speed and behaviour test. Searches fixed positions suite to fixed depth and reports nodes,
+time and nodes/s. Sum of searched nodes is signature of search - optimisation that only makes search faster must
+not change it. Results can be compared with results of earlier run (saved with --json) to find speed regressions.
+Before benchmark, search results of positions with known outcome (mates, draws) are checked.
+
+Usage: python -m Chess_AI.Engine.Bench [--depth N] [--backend mailbox|bitboard] [--json RESULTS_PATH]
+                                       [--baseline BASELINE_PATH] [--threshold PERCENT] [--check-signature]
+                                       [--profile cprofile|sampling] [--allocations] [--top N]
+                                       [--profile-output COLLAPSED_PATH]
+
+Profiled run is slower, so its nodes/s should not be compared with baseline (signature stays the same)."""
+
+import argparse
+import json
+import time
+
+import Chess_AI.Engine.Chessboard as chessboard
+import Chess_AI.Engine.Bitboard as bitboard
+import Chess_AI.Engine.AI as ai
+import Chess_AI.Engine.Profiling as profiling
+
+BACKENDS = {"mailbox": chessboard.ChessboardState, "bitboard": bitboard.BitboardState}
+
+DEFAULT_DEPTH = 5
+# nodes/s drop (in percent) against baseline reported as regression
+DEFAULT_THRESHOLD = 5.0
+
+BENCH_POSITIONS = [
+    # middlegame
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 10",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 11",
+    "4rrk1/pp1n3p/3q2pQ/2p1pb2/2PP4/2P3N1/P2B2PP/4RRK1 b - - 7 19",
+    "rq3rk1/ppp2ppp/1bnpb3/3N2B1/3NP3/7P/PPPQ1PP1/2KR3R w - - 7 14",
+    "r1bq1r1k/1pp1n1pp/1p1p4/4p2Q/4Pp2/1BNP4/PPP2PPP/3R1RK1 w - - 2 14",
+    "r3r1k1/2p2ppp/p1p1bn2/8/1q2P3/2NPQN2/PPP3PP/R4RK1 b - - 2 15",
+    "r1bbk1nr/pp3p1p/2n5/1N4p1/2Np1B2/8/PPP2PPP/2KR1B1R w kq - 0 13",
+    "r1bq1rk1/ppp1nppp/4n3/3p3Q/3P4/1BP1B3/PP1N2PP/R4RK1 w - - 1 16",
+    "4r1k1/r1q2ppp/ppp2n2/4P3/5Rb1/1N1BQ3/PPP3PP/R5K1 w - - 1 17",
+    "2rqkb1r/ppp2p2/2npb1p1/1N1Nn2p/2P1PP2/8/PP2B1PP/R1BQK2R b KQ - 0 11",
+    "r1bq1r1k/b1p1npp1/p2p3p/1p6/3PP3/1B2NN2/PP3PPP/R2Q1RK1 w - - 1 16",
+    "3r1rk1/p5pp/bpp1pp2/8/q1PP1P2/b3P3/P2NQRPP/1R2B1K1 b - - 6 22",
+    "r1q2rk1/2p1bppp/2Pp4/p6b/Q1PNp3/4B3/PP1R1PPP/2K4R w - - 2 18",
+    "4k2r/1pb2ppp/1p2p3/1R1p4/3P4/2r1PN2/P4PPP/1R4K1 b - - 3 22",
+    "3q2k1/pb3p1p/4pbp1/2r5/PpN2N2/1P2P2P/5PP1/Q2R2K1 b - - 4 26",
+    "6k1/3b3r/1p1p4/p1n2p2/1PPNpP1q/P3Q1p1/1R1RB1P1/5K2 b - - 0 1",
+    "r2r1n2/pp2bk2/2p1p2p/3q4/3PN1QP/2P3R1/P4PP1/5RK1 w - - 0 1",
+    # endgame
+    "6k1/6p1/6Pp/ppp5/3pn2P/1P3K2/1PP2P2/3N4 b - - 0 1",
+    "3b4/5kp1/1p1p1p1p/pP1PpP1P/P1P1P3/3KN3/8/8 w - - 0 1",
+    "2K5/p7/7P/5pR1/8/5k2/r7/8 w - - 0 1",
+    "8/6pk/1p6/8/PP3p1p/5P2/4KP1q/3Q4 w - - 0 1",
+    "7k/3p2pp/4q3/8/4Q3/5Kp1/P6b/8 w - - 0 1",
+    "8/2p5/8/2kPKp1p/2p4P/2P5/3P4/8 w - - 0 1",
+    "8/1p3pp1/7p/5P1P/2k3P1/8/2K2P2/8 w - - 0 1",
+    "8/pp2r1k1/2p1p3/3pP2p/1P1P1P1P/P5KR/8/8 w - - 0 1",
+    "8/3p4/p1bk3p/Pp6/1Kp1PpPp/2P2P1P/2P5/5B2 b - - 0 1",
+    "5k2/7R/4P2p/5K2/p1r2P1p/8/8/8 b - - 0 1",
+    "6k1/6p1/P6p/r1N5/5p2/7P/1b3PP1/4R1K1 w - - 0 1",
+    "1r3k2/4q3/2Pp3b/3Bp3/2Q2p2/1p1P2P1/1P2KP2/3N4 w - - 0 1",
+    "6k1/4pp1p/3p2p1/P1pPb3/R7/1r2P1PP/3B1P2/6K1 w - - 0 1",
+    "8/3p3B/5p2/5P2/p7/PP5b/k7/6K1 w - - 0 1",
+    "8/8/8/8/5kp1/P7/8/1K1N4 w - - 0 1",
+    "8/8/8/5N2/8/p7/8/2NK3k w - - 0 1",
+    "8/3k4/8/8/8/4B3/4KB2/2B5 w - - 0 1",
+    "8/8/1P6/5pr1/8/4R3/7k/2K5 w - - 0 1",
+    "8/2p4P/8/kr6/6R1/8/8/1K6 w - - 0 1",
+    "8/8/3P3k/8/1p6/8/1P6/1K3n2 b - - 0 1",
+    "8/R7/2q5/8/6k1/8/1P5p/K6R w - - 0 124",
+]
+
+# Positions with known search result, score is alphabeta result of given depth from side to move point of view
+# (mate found ply plies from root is scored ai.MATE_SCORE - ply)
+SEARCH_CHECKS = [
+    {"name": "only move walks into mate", "fen": "k7/1r6/8/8/8/7p/r6P/7K w - - 0 1", "depth": 2,
+     "score": -ai.MATE_SCORE + 2},
+    {"name": "checkmate on fiftieth move", "fen": "6k1/5ppp/8/8/8/8/8/R5K1 w - - 99 80", "depth": 1,
+     "score": ai.MATE_SCORE - 1},
+    {"name": "mate in two", "fen": "k7/8/2K5/8/8/8/8/1R6 w - - 0 1", "depth": 5, "score": ai.MATE_SCORE - 3},
+    {"name": "stalemate", "fen": "k7/2Q5/1K6/8/8/8/8/8 b - - 0 1", "depth": 1, "score": 0},
+]
+
+
+def run_checks(backend):
+    """Search every check position and compare its score with expected one"""
+    results = []
+    for check in SEARCH_CHECKS:
+        chess_ai = ai.ChessAI(BACKENDS[backend].from_fen(check["fen"]))
+        score = chess_ai.alphabeta(-100000, 100000, check["depth"], 0)
+        results.append({"name": check["name"], "fen": check["fen"], "score": score, "expected": check["score"],
+                        "passed": score == check["score"]})
+    return results
+
+
+def run_position(backend, fen, depth):
+    """Search position to given depth with new AI (empty transposition table) and get result record"""
+    chess_ai = ai.ChessAI(BACKENDS[backend].from_fen(fen))
+    start_time = time.perf_counter()
+    move = chess_ai.ai_move(depth=depth)
+    elapsed_time = time.perf_counter() - start_time
+    return {"fen": fen, "nodes": chess_ai.nodes, "time": elapsed_time,
+            "nps": chess_ai.nodes / elapsed_time if elapsed_time > 0 else 0.0,
+            "move": chessboard.move_to_str(move) if move is not None else None, "score": chess_ai.best_score}
+
+
+def run_bench(backend, depth):
+    results = [run_position(backend, fen, depth) for fen in BENCH_POSITIONS]
+    total_nodes = sum(result["nodes"] for result in results)
+    total_time = sum(result["time"] for result in results)
+    return {"backend": backend, "depth": depth, "positions": results, "signature": total_nodes,
+            "total_time": total_time, "nps": total_nodes / total_time if total_time > 0 else 0.0}
+
+
+def compare(record, baseline, threshold):
+    """Compare bench record with baseline record. Records of different backends are not compared (nps_regression
+    and signature_matches are None). Signature is compared only if both searched the same depth"""
+    comparison = {"baseline_backend": baseline["backend"], "baseline_nps": baseline["nps"], "nps_change": None,
+                  "nps_regression": None, "baseline_signature": baseline["signature"], "signature_matches": None}
+    if baseline["backend"] != record["backend"]:
+        return comparison
+    nps_change = (record["nps"] / baseline["nps"] - 1) * 100 if baseline["nps"] > 0 else 0.0
+    comparison["nps_change"] = nps_change
+    comparison["nps_regression"] = nps_change < -threshold
+    if baseline["depth"] == record["depth"] and len(baseline["positions"]) == len(record["positions"]):
+        comparison["signature_matches"] = baseline["signature"] == record["signature"]
+        # positions with different node counts show where search changed
+        comparison["changed_positions"] = [result["fen"] for result, baseline_result
+                                           in zip(record["positions"], baseline["positions"])
+                                           if result["nodes"] != baseline_result["nodes"]]
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search benchmark")
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH, help="search depth")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="mailbox")
+    parser.add_argument("--json", dest="json_path", default=None, help="write results to JSON file")
+    parser.add_argument("--baseline", dest="baseline_path", default=None,
+                        help="JSON file with results of earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="nodes/s drop (in percent) reported as regression")
+    parser.add_argument("--check-signature", action="store_true",
+                        help="fail if signature differs from baseline (change should not affect search)")
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+
+    checks = run_checks(args.backend)
+    for check in checks:
+        print(f"{'ok  ' if check['passed'] else 'FAIL'} {check['name']:40} score {check['score']} "
+              f"(expected {check['expected']})")
+
+    profiler = profiling.from_arguments(args)
+    if profiler is not None:
+        profiler.start()
+    record = run_bench(args.backend, args.depth)
+    record["checks"] = checks
+    if profiler is not None:
+        profiler.stop()
+    for result in record["positions"]:
+        print(f"{result['nodes']:9} nodes {result['time']:7.3f} s {result['nps']:8.0f} nodes/s "
+              f"{str(result['move']):6} {result['fen']}")
+    print(f"Signature: {record['signature']}")
+    print(f"Time: {record['total_time']:.3f} s")
+    print(f"Nodes/s: {record['nps']:.0f}")
+    if profiler is not None:
+        profiling.report(profiler, args, record["signature"])
+
+    passed = all(check["passed"] for check in checks)
+    if args.baseline_path is not None:
+        with open(args.baseline_path) as json_file:
+            comparison = compare(record, json.load(json_file), args.threshold)
+        record["comparison"] = comparison
+        if comparison["nps_change"] is None:
+            print(f"Not compared - baseline ran on {comparison['baseline_backend']} backend")
+        else:
+            print(f"Nodes/s change: {comparison['nps_change']:+.1f} % "
+                  f"(baseline {comparison['baseline_nps']:.0f} nodes/s)"
+                  f"{' - REGRESSION' if comparison['nps_regression'] else ''}")
+            if comparison["signature_matches"] is None:
+                print("Signature not compared - baseline searched different depth or positions")
+            elif comparison["signature_matches"]:
+                print("Signature matches baseline")
+            else:
+                print(f"Signature differs from baseline ({comparison['baseline_signature']}), "
+                      f"{len(comparison['changed_positions'])} positions searched differently")
+        passed = passed and not comparison["nps_regression"] and \
+            (not args.check_signature or comparison["signature_matches"] is True)
+    record["passed"] = passed
+    if args.json_path is not None:
+        with open(args.json_path, "w") as json_file:
+            json.dump(record, json_file, indent=2)
+    return 0 if passed else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
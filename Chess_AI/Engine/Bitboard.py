@@ -0,0 +1,798 @@
+"""Bitboard chessboard backend. Exposes the same interface as ChessboardState.
+Squares are indexed row * 8 + column (0 is A8, 63 is H1), bit i of every bitboard is square i and moves are
+encoded the same way as in Chessboard module"""
+
+from Chess_AI.Engine.Chessboard import GameState, Color, PieceType, CastlingRights, Zobrist, PieceSquareTables, \
+    MoveFlag, PROMOTION_TYPES, CASTLING_ROOK_MOVES, CASTLING_RIGHTS_MASK, EXCHANGE_VALUES, parse_fen, format_fen, \
+    encode_snapshot, decode_snapshot, encode_move
+
+
+def _square_bit(row, column):
+    if 7 >= row >= 0 and 7 >= column >= 0:
+        return 1 << (row * 8 + column)
+    return 0
+
+
+def _step_attacks(steps):
+    attacks = [0] * 64
+    for square in range(64):
+        row, column = divmod(square, 8)
+        for step in steps:
+            attacks[square] |= _square_bit(row + step[0], column + step[1])
+    return attacks
+
+
+def _ray(square, step):
+    ray = 0
+    row, column = divmod(square, 8)
+    row += step[0]
+    column += step[1]
+    while 7 >= row >= 0 and 7 >= column >= 0:
+        ray |= 1 << (row * 8 + column)
+        row += step[0]
+        column += step[1]
+    return ray
+
+
+KING_ATTACKS = _step_attacks(((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)))
+KNIGHT_ATTACKS = _step_attacks(((-1, -2), (-2, -1), (-2, 1), (-1, 2), (1, 2), (2, 1), (2, -1), (1, -2)))
+# PAWN_ATTACKS[<pawn color>][<pawn square>]
+PAWN_ATTACKS = [_step_attacks(((-1, -1), (-1, 1))), _step_attacks(((1, -1), (1, 1)))]
+
+# Rays are split by direction of square index growth, so first blocker is lowest or highest set bit
+ROOK_POSITIVE_RAYS = [[_ray(square, step) for square in range(64)] for step in ((1, 0), (0, 1))]
+ROOK_NEGATIVE_RAYS = [[_ray(square, step) for square in range(64)] for step in ((-1, 0), (0, -1))]
+BISHOP_POSITIVE_RAYS = [[_ray(square, step) for square in range(64)] for step in ((1, 1), (1, -1))]
+BISHOP_NEGATIVE_RAYS = [[_ray(square, step) for square in range(64)] for step in ((-1, -1), (-1, 1))]
+# All squares on lines (ranks, files and diagonals) going through square
+QUEEN_LINES = [sum(rays[square] for rays in ROOK_POSITIVE_RAYS + ROOK_NEGATIVE_RAYS + BISHOP_POSITIVE_RAYS +
+                   BISHOP_NEGATIVE_RAYS) for square in range(64)]
+# Squares on ranks and files (ROOK_LINES) and on diagonals (BISHOP_LINES) going through square
+ROOK_LINES = [sum(rays[square] for rays in ROOK_POSITIVE_RAYS + ROOK_NEGATIVE_RAYS) for square in range(64)]
+BISHOP_LINES = [sum(rays[square] for rays in BISHOP_POSITIVE_RAYS + BISHOP_NEGATIVE_RAYS) for square in range(64)]
+# BETWEEN[<square>][<other square>] - squares between two squares on common line (0 if they are not on one line)
+BETWEEN = [[0] * 64 for _ in range(64)]
+for _rays in ROOK_POSITIVE_RAYS + ROOK_NEGATIVE_RAYS + BISHOP_POSITIVE_RAYS + BISHOP_NEGATIVE_RAYS:
+    for _square in range(64):
+        for _other_square in range(64):
+            if _rays[_square] >> _other_square & 1:
+                BETWEEN[_square][_other_square] = _rays[_square] ^ _rays[_other_square] ^ (1 << _other_square)
+LIGHT_SQUARES = sum(1 << square for square in range(64) if (square // 8 + square) % 2 == 0)
+ALL_SQUARES = (1 << 64) - 1
+
+# (right, king start, encoded king move, squares that have to be empty, squares king passes)
+CASTLINGS = ((CastlingRights.WHITE_KINGSIDE, 60, encode_move(60, 62, MoveFlag.CASTLING), (1 << 61) | (1 << 62),
+              (61,)),
+             (CastlingRights.WHITE_QUEENSIDE, 60, encode_move(60, 58, MoveFlag.CASTLING),
+              (1 << 57) | (1 << 58) | (1 << 59), (59,)),
+             (CastlingRights.BLACK_KINGSIDE, 4, encode_move(4, 6, MoveFlag.CASTLING), (1 << 5) | (1 << 6), (5,)),
+             (CastlingRights.BLACK_QUEENSIDE, 4, encode_move(4, 2, MoveFlag.CASTLING),
+              (1 << 1) | (1 << 2) | (1 << 3), (3,)))
+
+PIECE_CODES = [[(color, piece_type) for piece_type in range(6)] for color in range(2)]
+
+
+def rook_attacks(square, occupied):
+    """Get bitboard of squares attacked by rook from square"""
+    attacks = 0
+    for rays in ROOK_POSITIVE_RAYS:
+        ray = rays[square]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= rays[(blockers & -blockers).bit_length() - 1]
+        attacks |= ray
+    for rays in ROOK_NEGATIVE_RAYS:
+        ray = rays[square]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= rays[blockers.bit_length() - 1]
+        attacks |= ray
+    return attacks
+
+
+def bishop_attacks(square, occupied):
+    """Get bitboard of squares attacked by bishop from square"""
+    attacks = 0
+    for rays in BISHOP_POSITIVE_RAYS:
+        ray = rays[square]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= rays[(blockers & -blockers).bit_length() - 1]
+        attacks |= ray
+    for rays in BISHOP_NEGATIVE_RAYS:
+        ray = rays[square]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= rays[blockers.bit_length() - 1]
+        attacks |= ray
+    return attacks
+
+
+def squares_of(bitboard):
+    """Squares generator of set bits in bitboard"""
+    while bitboard:
+        lowest_bit = bitboard & -bitboard
+        yield lowest_bit.bit_length() - 1
+        bitboard ^= lowest_bit
+
+
+class BitboardPiece:
+    """Read-only view of piece standing on BitboardState square"""
+    __slots__ = ("type", "color", "square")
+
+    def __init__(self, piece_type, color, square):
+        self.type = piece_type
+        self.color = color
+        self.square = square
+
+    def __str__(self):
+        return ("w" if self.color == Color.WHITE else "b") + "KQRBNP"[self.type]
+
+
+class BitboardState:
+    def __init__(self):
+        # pieces[<piece color>][<piece type>]
+        self.pieces = [[0] * 6 for _ in range(2)]
+        self.occupancy = [0, 0]
+        # squares[<square>] is (<piece color>, <piece type>) or None
+        self.squares = [None] * 64
+        self.init_board()
+        self.white_to_move = True
+        self.castling_rights = 15
+        # square behind pawn that moved by two in last move, otherwise None
+        self.en_passant_square = None
+        self.move_counter = 0
+        # moves since last capture or pawn move
+        self.halfmove_clock = 0
+        self.moves_history = []
+        self.zobrist_key = self.compute_zobrist_key()
+        # position_counts[<zobrist key>] - how many times position occurred in game (positions which did not occur
+        # are not stored)
+        self.position_counts = {self.zobrist_key: 1}
+        # running totals from white's point of view, updated by moves
+        self.material_score, self.position_score = self.compute_scores()
+        self.clear_position_cache()
+
+    @classmethod
+    def from_fen(cls, fen):
+        """Create position from FEN string"""
+        return cls.from_position_fields(*parse_fen(fen))
+
+    @classmethod
+    def from_snapshot(cls, snapshot, position_counts=None):
+        """Create position from snapshot returned by to_snapshot. position_counts of game position (if given) are
+        copied, so repetitions of positions played before snapshot are detected"""
+        board_state = cls.from_position_fields(*decode_snapshot(snapshot))
+        if position_counts is not None:
+            board_state.position_counts = dict(position_counts)
+        return board_state
+
+    @classmethod
+    def from_position_fields(cls, pieces, white_to_move, castling_rights, en_passant_square, halfmove_clock,
+                             fullmove_number):
+        """Create position from values returned by parse_fen"""
+        # initial position set up by __init__ would be replaced anyway
+        board_state = cls.__new__(cls)
+        board_state.moves_history = []
+        board_state.pieces = [[0] * 6 for _ in range(2)]
+        board_state.occupancy = [0, 0]
+        board_state.squares = [None] * 64
+        for color, piece_type, square in pieces:
+            board_state.put_piece(color, piece_type, square)
+        board_state.white_to_move = white_to_move
+        # rights without king and rook on their initial squares are dropped
+        for square, mask in ((60, CASTLING_RIGHTS_MASK[60]), (63, CASTLING_RIGHTS_MASK[63]),
+                             (56, CASTLING_RIGHTS_MASK[56]), (4, CASTLING_RIGHTS_MASK[4]),
+                             (7, CASTLING_RIGHTS_MASK[7]), (0, CASTLING_RIGHTS_MASK[0])):
+            expected = PIECE_CODES[Color.WHITE if square > 8 else Color.BLACK][PieceType.KING if square % 8 == 4
+                                                                              else PieceType.ROOK]
+            if board_state.squares[square] != expected:
+                castling_rights &= mask
+        board_state.castling_rights = castling_rights
+        board_state.en_passant_square = None
+        if en_passant_square is not None and en_passant_square // 8 == (2 if white_to_move else 5) and \
+                board_state.squares[en_passant_square] is None:
+            # opponent's pawn that moved by two in last move stands in front of en passant square
+            enemy_pawn = PIECE_CODES[Color.BLACK if white_to_move else Color.WHITE][PieceType.PAWN]
+            if board_state.squares[en_passant_square + 8 if white_to_move else en_passant_square - 8] == enemy_pawn:
+                board_state.en_passant_square = en_passant_square
+        board_state.move_counter = 2 * (fullmove_number - 1) + (0 if white_to_move else 1)
+        board_state.halfmove_clock = halfmove_clock
+        board_state.zobrist_key = board_state.compute_zobrist_key()
+        board_state.position_counts = {board_state.zobrist_key: 1}
+        board_state.material_score, board_state.position_score = board_state.compute_scores()
+        board_state.clear_position_cache()
+        return board_state
+
+    def get_position_fields(self):
+        """Get position as the same values as returned by parse_fen"""
+        pieces = [(code[0], code[1], square) for square, code in enumerate(self.squares) if code is not None]
+        return pieces, self.white_to_move, self.castling_rights, self.en_passant_square, self.halfmove_clock, \
+            self.move_counter // 2 + 1
+
+    def to_fen(self):
+        """Get FEN string of position"""
+        return format_fen(*self.get_position_fields())
+
+    def to_snapshot(self):
+        """Get compact snapshot of position (see encode_snapshot). Moves history is not included, repetitions
+        are kept only if position_counts are passed to from_snapshot with snapshot"""
+        return encode_snapshot(*self.get_position_fields())
+
+    def init_board(self):
+        back_row = (PieceType.ROOK, PieceType.KNIGHT, PieceType.BISHOP, PieceType.QUEEN, PieceType.KING,
+                    PieceType.BISHOP, PieceType.KNIGHT, PieceType.ROOK)
+        for color, row, pawns_row in ((Color.BLACK, 0, 1), (Color.WHITE, 7, 6)):
+            for column in range(8):
+                self.put_piece(color, back_row[column], row * 8 + column)
+                self.put_piece(color, PieceType.PAWN, pawns_row * 8 + column)
+
+    def put_piece(self, color, piece_type, square):
+        bit = 1 << square
+        self.pieces[color][piece_type] |= bit
+        self.occupancy[color] |= bit
+        self.squares[square] = PIECE_CODES[color][piece_type]
+
+    def remove_piece(self, color, piece_type, square):
+        bit = 1 << square
+        self.pieces[color][piece_type] ^= bit
+        self.occupancy[color] ^= bit
+        self.squares[square] = None
+
+    def get_current_color(self):
+        if self.white_to_move:
+            return Color.WHITE
+        else:
+            return Color.BLACK
+
+    def get_piece(self, square):
+        """Get piece standing on square. If square is empty returns None"""
+        code = self.squares[square]
+        if code is None:
+            return None
+        return BitboardPiece(code[1], code[0], square)
+
+    def get_piece_type(self, square):
+        """Get type of piece standing on square. If square is empty returns None"""
+        code = self.squares[square]
+        return code[1] if code is not None else None
+
+    def get_king_square(self):
+        """Get square of current player's king"""
+        return self.pieces[self.get_current_color()][PieceType.KING].bit_length() - 1
+
+    def get_castling_rights(self):
+        """Get castling rights as CastlingRights bit mask"""
+        return self.castling_rights
+
+    def compute_zobrist_key(self):
+        """Compute Zobrist key of current position from scratch. Keys match ChessboardState keys"""
+        zobrist_key = 0
+        for square in range(64):
+            code = self.squares[square]
+            if code is not None:
+                zobrist_key ^= Zobrist.pieces[code[0]][code[1]][square]
+        zobrist_key ^= Zobrist.castling[self.castling_rights]
+        if self.en_passant_square is not None:
+            zobrist_key ^= Zobrist.en_passant[self.en_passant_square % 8]
+        if not self.white_to_move:
+            zobrist_key ^= Zobrist.black_to_move
+        return zobrist_key
+
+    def compute_scores(self):
+        """Compute material and position scores (from white's point of view) from scratch"""
+        material_score = 0
+        position_score = 0
+        for square in range(64):
+            code = self.squares[square]
+            if code is not None:
+                material_score += PieceSquareTables.material[code[0]][code[1]]
+                position_score += PieceSquareTables.position[code[0]][code[1]][square]
+        return material_score, position_score
+
+    def is_square_attacked(self, square, color, occupied, excluded=0):
+        """Check if square is attacked by pieces of color. occupied is occupancy used for sliding pieces,
+        pieces standing on excluded squares do not attack"""
+        pieces = self.pieces[color]
+        if KNIGHT_ATTACKS[square] & pieces[PieceType.KNIGHT] & ~excluded:
+            return True
+        if PAWN_ATTACKS[1 - color][square] & pieces[PieceType.PAWN] & ~excluded:
+            return True
+        if KING_ATTACKS[square] & pieces[PieceType.KING]:
+            return True
+        rooks = (pieces[PieceType.ROOK] | pieces[PieceType.QUEEN]) & ~excluded
+        if rooks and rook_attacks(square, occupied) & rooks:
+            return True
+        bishops = (pieces[PieceType.BISHOP] | pieces[PieceType.QUEEN]) & ~excluded
+        if bishops and bishop_attacks(square, occupied) & bishops:
+            return True
+        return False
+
+    def pseudo_legal_moves(self, captures_only=False):
+        """Pseudo legal moves (encoded) generator of current player. Pseudo legal moves do not take into account
+        if king is checked after move. If captures_only is set only captures and promotions to queen are
+        generated"""
+        color = self.get_current_color()
+        pieces = self.pieces[color]
+        own = self.occupancy[color]
+        enemy = self.occupancy[1 - color]
+        occupied = own | enemy
+        not_own = enemy if captures_only else ~own
+
+        for square in squares_of(pieces[PieceType.KNIGHT]):
+            for target in squares_of(KNIGHT_ATTACKS[square] & not_own):
+                yield square | target << 6
+        for square in squares_of(pieces[PieceType.BISHOP]):
+            for target in squares_of(bishop_attacks(square, occupied) & not_own):
+                yield square | target << 6
+        for square in squares_of(pieces[PieceType.ROOK]):
+            for target in squares_of(rook_attacks(square, occupied) & not_own):
+                yield square | target << 6
+        for square in squares_of(pieces[PieceType.QUEEN]):
+            for target in squares_of((rook_attacks(square, occupied) | bishop_attacks(square, occupied)) & not_own):
+                yield square | target << 6
+
+        if color == Color.WHITE:
+            step, double_step_row = -8, 6
+        else:
+            step, double_step_row = 8, 1
+        promotion_types = PROMOTION_TYPES[:1] if captures_only else PROMOTION_TYPES
+        for square in squares_of(pieces[PieceType.PAWN]):
+            target = square + step
+            if target < 8 or target >= 56:
+                if not (occupied >> target) & 1:
+                    for promotion_type in promotion_types:
+                        yield encode_move(square, target, MoveFlag.PROMOTION, promotion_type)
+                for target in squares_of(PAWN_ATTACKS[color][square] & enemy):
+                    for promotion_type in promotion_types:
+                        yield encode_move(square, target, MoveFlag.PROMOTION, promotion_type)
+                continue
+            if not captures_only and not (occupied >> target) & 1:
+                yield square | target << 6
+                if square // 8 == double_step_row and not (occupied >> (target + step)) & 1:
+                    yield square | (target + step) << 6
+            for target in squares_of(PAWN_ATTACKS[color][square] & enemy):
+                yield square | target << 6
+            if self.en_passant_square is not None and PAWN_ATTACKS[color][square] >> self.en_passant_square & 1:
+                yield square | self.en_passant_square << 6 | MoveFlag.EN_PASSANT << 14
+
+        king_square = pieces[PieceType.KING].bit_length() - 1
+        for target in squares_of(KING_ATTACKS[king_square] & not_own):
+            yield king_square | target << 6
+        if self.castling_rights and not captures_only:
+            for right, king_start, castling_move, empty, passed in CASTLINGS:
+                if self.castling_rights & right and king_start == king_square and not occupied & empty and \
+                        not self.is_square_attacked(king_square, 1 - color, occupied) and \
+                        not any(self.is_square_attacked(passed_square, 1 - color, occupied)
+                                for passed_square in passed):
+                    yield castling_move
+
+    def is_legal(self, move, in_check):
+        """Check if pseudo legal move (encoded) of current player does not leave king checked"""
+        color = self.get_current_color()
+        pieces = self.pieces[color]
+        king = pieces[PieceType.KING]
+        king_square = king.bit_length() - 1
+        start = move & 63
+        end = move >> 6 & 63
+        start_bit = 1 << start
+        end_bit = 1 << end
+        is_en_passant = move >> 14 == MoveFlag.EN_PASSANT
+        # piece that is not on any line with king can not uncover check
+        if not in_check and not is_en_passant and start != king_square and not QUEEN_LINES[king_square] & start_bit:
+            return True
+        captured = end_bit
+        if is_en_passant:
+            captured = 1 << (end + 8 if color == Color.WHITE else end - 8)
+        occupied = ((self.occupancy[0] | self.occupancy[1]) & ~start_bit & ~captured) | end_bit
+        if start == king_square:
+            king_square = end
+        return not self.is_square_attacked(king_square, 1 - color, occupied, captured)
+
+    def clear_position_cache(self):
+        """Forget legal moves, check status and game state remembered for current position"""
+        self.cached_legal_moves = None
+        self.cached_check = None
+        self.cached_game_state = None
+
+    def legal_moves(self, captures_only=False):
+        """Get list of all posible moves (encoded) by current player. If captures_only is set only captures and
+        promotions to queen are generated. Full list is remembered until position changes"""
+        if not captures_only and self.cached_legal_moves is not None:
+            return list(self.cached_legal_moves)
+        legal_moves_list = self.generate_legal_moves(captures_only)
+        if not captures_only:
+            self.cached_legal_moves = legal_moves_list
+            return list(legal_moves_list)
+        return legal_moves_list
+
+    def generate_legal_moves(self, captures_only):
+        """Get list of legal moves in the same order as pseudo_legal_moves generates them. Pieces checking king and
+        pinned pieces are found once, so only king moves and en passant captures are tested one by one"""
+        color = Color.WHITE if self.white_to_move else Color.BLACK
+        enemy_color = 1 - color
+        pieces = self.pieces[color]
+        enemy_pieces = self.pieces[enemy_color]
+        own = self.occupancy[color]
+        enemy = self.occupancy[enemy_color]
+        occupied = own | enemy
+        king_square = pieces[PieceType.KING].bit_length() - 1
+        enemy_rooks = enemy_pieces[PieceType.ROOK] | enemy_pieces[PieceType.QUEEN]
+        enemy_bishops = enemy_pieces[PieceType.BISHOP] | enemy_pieces[PieceType.QUEEN]
+        checkers = (KNIGHT_ATTACKS[king_square] & enemy_pieces[PieceType.KNIGHT]) | \
+            (PAWN_ATTACKS[color][king_square] & enemy_pieces[PieceType.PAWN])
+        if ROOK_LINES[king_square] & enemy_rooks:
+            checkers |= rook_attacks(king_square, occupied) & enemy_rooks
+        if BISHOP_LINES[king_square] & enemy_bishops:
+            checkers |= bishop_attacks(king_square, occupied) & enemy_bishops
+        self.cached_check = checkers != 0
+        not_own = enemy if captures_only else ALL_SQUARES & ~own
+        moves = []
+        append = moves.append
+
+        # in double check only king can move
+        if not checkers & (checkers - 1):
+            # pieces can only capture checking piece or block its line
+            mask = not_own
+            if checkers:
+                mask &= checkers | BETWEEN[king_square][checkers.bit_length() - 1]
+            # pin_rays[<square of pinned piece>] - squares it can move to (line between king and pinning piece)
+            pin_rays = {}
+            for pinner in squares_of((ROOK_LINES[king_square] & enemy_rooks) |
+                                     (BISHOP_LINES[king_square] & enemy_bishops)):
+                between = BETWEEN[king_square][pinner]
+                blockers = between & occupied
+                if blockers & own and not blockers & (blockers - 1):
+                    pin_rays[blockers.bit_length() - 1] = between | (1 << pinner)
+
+            for square in squares_of(pieces[PieceType.KNIGHT]):
+                # pinned knight can not move along pin line
+                if square not in pin_rays:
+                    for target in squares_of(KNIGHT_ATTACKS[square] & mask):
+                        append(square | target << 6)
+            for square in squares_of(pieces[PieceType.BISHOP]):
+                for target in squares_of(bishop_attacks(square, occupied) & mask & pin_rays.get(square, ALL_SQUARES)):
+                    append(square | target << 6)
+            for square in squares_of(pieces[PieceType.ROOK]):
+                for target in squares_of(rook_attacks(square, occupied) & mask & pin_rays.get(square, ALL_SQUARES)):
+                    append(square | target << 6)
+            for square in squares_of(pieces[PieceType.QUEEN]):
+                for target in squares_of((rook_attacks(square, occupied) | bishop_attacks(square, occupied)) & mask &
+                                         pin_rays.get(square, ALL_SQUARES)):
+                    append(square | target << 6)
+
+            if color == Color.WHITE:
+                step, double_step_row = -8, 6
+            else:
+                step, double_step_row = 8, 1
+            promotion_types = PROMOTION_TYPES[:1] if captures_only else PROMOTION_TYPES
+            # pushes are not captures, so they are limited by check and pin only
+            push_mask = ALL_SQUARES
+            if checkers:
+                push_mask = BETWEEN[king_square][checkers.bit_length() - 1]
+            for square in squares_of(pieces[PieceType.PAWN]):
+                pin_ray = pin_rays.get(square, ALL_SQUARES)
+                target = square + step
+                if target < 8 or target >= 56:
+                    if not (occupied >> target) & 1 and (push_mask & pin_ray) >> target & 1:
+                        for promotion_type in promotion_types:
+                            append(encode_move(square, target, MoveFlag.PROMOTION, promotion_type))
+                    for target in squares_of(PAWN_ATTACKS[color][square] & enemy & mask & pin_ray):
+                        for promotion_type in promotion_types:
+                            append(encode_move(square, target, MoveFlag.PROMOTION, promotion_type))
+                    continue
+                if not captures_only and not (occupied >> target) & 1:
+                    if (push_mask & pin_ray) >> target & 1:
+                        append(square | target << 6)
+                    if square // 8 == double_step_row and not (occupied >> (target + step)) & 1 and \
+                            (push_mask & pin_ray) >> (target + step) & 1:
+                        append(square | (target + step) << 6)
+                for target in squares_of(PAWN_ATTACKS[color][square] & enemy & mask & pin_ray):
+                    append(square | target << 6)
+                if self.en_passant_square is not None and PAWN_ATTACKS[color][square] >> self.en_passant_square & 1:
+                    # en passant removes two pieces from line, so it is tested by playing it on occupancy
+                    move = square | self.en_passant_square << 6 | MoveFlag.EN_PASSANT << 14
+                    if self.is_legal(move, True):
+                        append(move)
+
+        # king can not stay on line of slider attacking it, so attacks are tested without king on board
+        occupied_without_king = occupied ^ (1 << king_square)
+        for target in squares_of(KING_ATTACKS[king_square] & not_own):
+            if not self.is_square_attacked(target, enemy_color, occupied_without_king):
+                append(king_square | target << 6)
+        if self.castling_rights and not captures_only and not checkers:
+            for right, king_start, castling_move, empty, passed in CASTLINGS:
+                if self.castling_rights & right and king_start == king_square and not occupied & empty and \
+                        not any(self.is_square_attacked(passed_square, enemy_color, occupied)
+                                for passed_square in passed) and \
+                        not self.is_square_attacked(castling_move >> 6 & 63, enemy_color, occupied):
+                    append(castling_move)
+        return moves
+
+    def capture_moves(self):
+        """Get list of all possible captures and promotions to queen by current player"""
+        return self.legal_moves(captures_only=True)
+
+    def legal_moves_from(self, square):
+        """Get list of legal moves (encoded) starting on square. If no legal moves are possible returns None"""
+        legal_moves_list = [move for move in self.legal_moves() if move & 63 == square]
+        if len(legal_moves_list) == 0:
+            return None
+        return legal_moves_list
+
+    def is_capture(self, move):
+        """Check if move is capture"""
+        return self.squares[move >> 6 & 63] is not None or move >> 14 == MoveFlag.EN_PASSANT
+
+    def static_exchange_evaluation(self, move):
+        """Get material gain of move for current player after all captures on its end square are played out. Each
+        side captures with its least valuable piece and can stop when capturing does not pay off. Sliders attacking
+        through pieces that already captured (X-rays) are included, pins are ignored"""
+        start = move & 63
+        end = move >> 6 & 63
+        flag = move >> 14
+        squares = self.squares
+        captured = squares[end]
+        # pieces that left the board or the square they attacked from are removed from occupancy
+        occupied = (self.occupancy[0] | self.occupancy[1]) & ~(1 << start)
+        if flag == MoveFlag.EN_PASSANT:
+            captured_square = end + 8 if self.white_to_move else end - 8
+            captured = squares[captured_square]
+            occupied &= ~(1 << captured_square)
+        gains = [EXCHANGE_VALUES[captured[1]] if captured is not None else 0]
+        piece_type = squares[start][1]
+        if flag == MoveFlag.PROMOTION:
+            piece_type = (move >> 12 & 3) + 1
+            gains[0] += EXCHANGE_VALUES[piece_type] - EXCHANGE_VALUES[PieceType.PAWN]
+        color = Color.BLACK if self.white_to_move else Color.WHITE
+        while True:
+            attacker_square = self.least_valuable_attacker(end, color, occupied)
+            if attacker_square is None:
+                break
+            # gains[i] - gain of i-th capture if opponent does not recapture
+            gains.append(EXCHANGE_VALUES[piece_type] - gains[-1])
+            piece_type = squares[attacker_square][1]
+            occupied &= ~(1 << attacker_square)
+            color = 1 - color
+        while len(gains) > 1:
+            gain = gains.pop()
+            # capture is made only if it is better than stopping
+            gains[-1] = -max(-gains[-1], gain)
+        return gains[0]
+
+    def least_valuable_attacker(self, square, color, occupied):
+        """Get square of least valuable piece of given color attacking square or None if there is no such piece.
+        Only pieces in occupied bitboard attack and block sliders"""
+        pieces = self.pieces[color]
+        attackers = PAWN_ATTACKS[1 - color][square] & pieces[PieceType.PAWN] & occupied
+        if not attackers:
+            attackers = KNIGHT_ATTACKS[square] & pieces[PieceType.KNIGHT] & occupied
+        if not attackers:
+            diagonal_attacks = bishop_attacks(square, occupied)
+            attackers = diagonal_attacks & pieces[PieceType.BISHOP] & occupied
+            if not attackers:
+                straight_attacks = rook_attacks(square, occupied)
+                attackers = straight_attacks & pieces[PieceType.ROOK] & occupied
+                if not attackers:
+                    attackers = (diagonal_attacks | straight_attacks) & pieces[PieceType.QUEEN] & occupied
+                    if not attackers:
+                        attackers = KING_ATTACKS[square] & pieces[PieceType.KING] & occupied
+        if not attackers:
+            return None
+        return (attackers & -attackers).bit_length() - 1
+
+    def game_state(self):
+        """Get current game state. State is remembered until position changes"""
+        if self.cached_game_state is None:
+            self.cached_game_state = self.compute_game_state()
+        return self.cached_game_state
+
+    def compute_game_state(self):
+        if self.is_insufficient_material():
+            return GameState.INSUFFICIENT_MATERIAL
+
+        if self.cached_legal_moves is not None:
+            is_any_move_possible = len(self.cached_legal_moves) > 0
+        else:
+            is_any_move_possible = self.is_any_move_possible()
+        if not is_any_move_possible:
+            if self.is_check():
+                return GameState.CHECKMATE
+            else:
+                return GameState.STALEMATE
+        elif self.position_counts[self.zobrist_key] >= 3:
+            return GameState.THREEFOLD_REPETITION
+        elif self.halfmove_clock >= 100:
+            return GameState.FIFTY_MOVE_RULE
+        elif self.is_check():
+            return GameState.CHECK
+        else:
+            return GameState.CONTINUE
+
+    def is_any_move_possible(self):
+        """Check if current player can make any move"""
+        in_check = self.is_check()
+        for move in self.pseudo_legal_moves():
+            if self.is_legal(move, in_check):
+                return True
+        return False
+
+    def is_insufficient_material(self):
+        """Check if game is over by insufficient material: besides kings there is at most one knight or bishop,
+        or only bishops standing on squares of the same color"""
+        white_pieces = self.pieces[Color.WHITE]
+        black_pieces = self.pieces[Color.BLACK]
+        bishops = white_pieces[PieceType.BISHOP] | black_pieces[PieceType.BISHOP]
+        minor_pieces = bishops | white_pieces[PieceType.KNIGHT] | black_pieces[PieceType.KNIGHT]
+        kings = white_pieces[PieceType.KING] | black_pieces[PieceType.KING]
+        if self.occupancy[Color.WHITE] | self.occupancy[Color.BLACK] != kings | minor_pieces:
+            return False
+        if minor_pieces & (minor_pieces - 1) == 0:
+            # at most one minor piece
+            return True
+        if minor_pieces != bishops:
+            return False
+        return bishops & LIGHT_SQUARES == 0 or bishops & ~LIGHT_SQUARES == 0
+
+    def is_repetition(self):
+        """Check if current position occurred earlier in game"""
+        return self.position_counts[self.zobrist_key] > 1
+
+    def has_non_pawn_material(self):
+        """Check if current player has any piece besides king and pawns. Without them zugzwang is likely"""
+        color = self.get_current_color()
+        return self.occupancy[color] != self.pieces[color][PieceType.PAWN] | self.pieces[color][PieceType.KING]
+
+    def is_check(self):
+        """Check if current player's king is checked"""
+        if self.cached_check is None:
+            color = self.get_current_color()
+            king_square = self.pieces[color][PieceType.KING].bit_length() - 1
+            self.cached_check = self.is_square_attacked(king_square, 1 - color, self.occupancy[0] | self.occupancy[1])
+        return self.cached_check
+
+    def get_pieces_lists(self):
+        """Get lists of pieces on board. Usage: pieces_lists[<piece type>][<piece color>]"""
+        pieces_lists = [None] * 6
+        for piece_type in range(6):
+            pieces_lists[piece_type] = [[BitboardPiece(piece_type, color, square)
+                                         for square in squares_of(self.pieces[color][piece_type])]
+                                        for color in range(2)]
+        return pieces_lists
+
+    def make_move(self, move):
+        """Make move (encoded). Move have to be legal"""
+        start = move & 63
+        end = move >> 6 & 63
+        flag = move >> 14
+        self.clear_position_cache()
+        color, piece_type = self.squares[start]
+        squares = self.squares
+        pieces = self.pieces[color]
+        pieces_keys = Zobrist.pieces[color]
+        captured = squares[end]
+        captured_square = end
+        if flag == MoveFlag.EN_PASSANT:
+            captured_square = end + 8 if color == Color.WHITE else end - 8
+            captured = squares[captured_square]
+        end_type = (move >> 12 & 3) + 1 if flag == MoveFlag.PROMOTION else piece_type
+        self.moves_history.append((start, end, piece_type, end_type, captured, captured_square,
+                                   self.castling_rights, self.en_passant_square, self.zobrist_key,
+                                   self.material_score, self.position_score, self.halfmove_clock))
+        self.move_counter += 1
+        if captured is not None or piece_type == PieceType.PAWN:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        position_scores = PieceSquareTables.position[color]
+        self.position_score += position_scores[end_type][end] - position_scores[piece_type][start]
+        if end_type != piece_type:
+            self.material_score += PieceSquareTables.material[color][end_type] - \
+                PieceSquareTables.material[color][piece_type]
+
+        zobrist_key = self.zobrist_key ^ Zobrist.black_to_move ^ Zobrist.castling[self.castling_rights] ^ \
+            pieces_keys[piece_type][start] ^ pieces_keys[end_type][end]
+        if captured is not None:
+            captured_bit = 1 << captured_square
+            self.pieces[captured[0]][captured[1]] ^= captured_bit
+            self.occupancy[captured[0]] ^= captured_bit
+            squares[captured_square] = None
+            zobrist_key ^= Zobrist.pieces[captured[0]][captured[1]][captured_square]
+            self.material_score -= PieceSquareTables.material[captured[0]][captured[1]]
+            self.position_score -= PieceSquareTables.position[captured[0]][captured[1]][captured_square]
+        start_bit = 1 << start
+        end_bit = 1 << end
+        pieces[piece_type] ^= start_bit
+        pieces[end_type] |= end_bit
+        self.occupancy[color] ^= start_bit | end_bit
+        squares[start] = None
+        squares[end] = PIECE_CODES[color][end_type]
+        if flag == MoveFlag.CASTLING:
+            rook_start, rook_end = CASTLING_ROOK_MOVES[end]
+            rook_bits = (1 << rook_start) | (1 << rook_end)
+            pieces[PieceType.ROOK] ^= rook_bits
+            self.occupancy[color] ^= rook_bits
+            squares[rook_end] = squares[rook_start]
+            squares[rook_start] = None
+            zobrist_key ^= pieces_keys[PieceType.ROOK][rook_start] ^ pieces_keys[PieceType.ROOK][rook_end]
+            self.position_score += position_scores[PieceType.ROOK][rook_end] - \
+                position_scores[PieceType.ROOK][rook_start]
+
+        self.castling_rights &= CASTLING_RIGHTS_MASK[start] & CASTLING_RIGHTS_MASK[end]
+        zobrist_key ^= Zobrist.castling[self.castling_rights]
+        if self.en_passant_square is not None:
+            zobrist_key ^= Zobrist.en_passant[self.en_passant_square & 7]
+        if piece_type == PieceType.PAWN and (end - start == 16 or start - end == 16):
+            self.en_passant_square = (start + end) >> 1
+            zobrist_key ^= Zobrist.en_passant[end & 7]
+        else:
+            self.en_passant_square = None
+        self.zobrist_key = zobrist_key
+        self.position_counts[zobrist_key] = self.position_counts.get(zobrist_key, 0) + 1
+        self.white_to_move = not self.white_to_move
+
+    def make_null_move(self):
+        """Pass the turn to opponent without moving (used by null move pruning). Current player must not be in
+        check. Null move is taken back by undo_null_move or undo_move.
+        Position after null move never occurs in game, so repetitions and fifty-move rule count only positions after
+        it - game position counts are kept in its record (in place of captured piece) and halfmove clock starts
+        again"""
+        self.clear_position_cache()
+        self.moves_history.append((None, None, None, None, self.position_counts, None, self.castling_rights,
+                                   self.en_passant_square, self.zobrist_key, self.material_score, self.position_score,
+                                   self.halfmove_clock))
+        self.move_counter += 1
+        self.halfmove_clock = 0
+        self.zobrist_key ^= Zobrist.black_to_move
+        if self.en_passant_square is not None:
+            self.zobrist_key ^= Zobrist.en_passant[self.en_passant_square & 7]
+            self.en_passant_square = None
+        self.position_counts = {self.zobrist_key: 1}
+        self.white_to_move = not self.white_to_move
+
+    def undo_null_move(self):
+        """Undo null move made by make_null_move"""
+        self.undo_move()
+
+    def undo_move(self):
+        """Undo last move"""
+        if len(self.moves_history) == 0:
+            return
+        self.clear_position_cache()
+        self.move_counter -= 1
+        count = self.position_counts[self.zobrist_key] - 1
+        if count:
+            self.position_counts[self.zobrist_key] = count
+        else:
+            # positions visited only by search are forgotten, so dict does not grow with searched nodes
+            del self.position_counts[self.zobrist_key]
+        start, end, piece_type, end_type, captured, captured_square, self.castling_rights, self.en_passant_square, \
+            self.zobrist_key, self.material_score, self.position_score, self.halfmove_clock = self.moves_history.pop()
+        self.white_to_move = not self.white_to_move
+        if start is None:
+            # null move, its record keeps position counts of game
+            self.position_counts = captured
+            return
+        color = Color.WHITE if self.white_to_move else Color.BLACK
+        squares = self.squares
+        pieces = self.pieces[color]
+
+        start_bit = 1 << start
+        end_bit = 1 << end
+        pieces[end_type] ^= end_bit
+        pieces[piece_type] |= start_bit
+        self.occupancy[color] ^= start_bit | end_bit
+        squares[start] = PIECE_CODES[color][piece_type]
+        squares[end] = None
+        if captured is not None:
+            captured_bit = 1 << captured_square
+            self.pieces[captured[0]][captured[1]] |= captured_bit
+            self.occupancy[captured[0]] |= captured_bit
+            squares[captured_square] = captured
+        if piece_type == PieceType.KING and (end - start == 2 or start - end == 2):
+            rook_start, rook_end = CASTLING_ROOK_MOVES[end]
+            rook_bits = (1 << rook_start) | (1 << rook_end)
+            pieces[PieceType.ROOK] ^= rook_bits
+            self.occupancy[color] ^= rook_bits
+            squares[rook_start] = squares[rook_end]
+            squares[rook_end] = None
@@ -1,5 +1,8 @@
+import random
+
+
 class GameState:
-    CHECKMATE, STALEMATE, CHECK, CONTINUE, INSUFFICIENT_MATERIAL = range(5)
+    CHECKMATE, STALEMATE, CHECK, CONTINUE, INSUFFICIENT_MATERIAL, THREEFOLD_REPETITION, FIFTY_MOVE_RULE = range(7)
 
 
 class Color:
@@ -14,34 +17,406 @@ class PieceType:
         return [PieceType.KING, PieceType.QUEEN, PieceType.ROOK, PieceType.BISHOP, PieceType.KNIGHT, PieceType.PAWN]
 
 
+class CastlingRights:
+    WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE = 1, 2, 4, 8
+
+
+class Zobrist:
+    """Random 64-bit keys used for Zobrist hashing of positions"""
+    pieces = None  # pieces[<piece color>][<piece type>][<square>]
+    castling = None  # castling[<castling rights mask>]
+    en_passant = None  # en_passant[<column of pawn that moved by two>]
+    black_to_move = None
+
+    @staticmethod
+    def init_keys(seed=2021):
+        """Generate keys. Fixed seed keeps keys (and so hashes) the same between runs"""
+        generator = random.Random(seed)
+        Zobrist.pieces = [[[generator.getrandbits(64) for _ in range(64)] for _ in range(6)] for _ in range(2)]
+        Zobrist.castling = [generator.getrandbits(64) for _ in range(16)]
+        Zobrist.en_passant = [generator.getrandbits(64) for _ in range(8)]
+        Zobrist.black_to_move = generator.getrandbits(64)
+
+    @staticmethod
+    def piece_key(piece, square):
+        return Zobrist.pieces[piece.color][piece.type][square]
+
+
+Zobrist.init_keys()
+
+
+class PieceSquareTables:
+    """Piece values and piece-square tables. Tables are from white's point of view (row 0 is 8th rank)"""
+    values = [0, 900, 500, 330, 320, 100]  # indexed by PieceType
+
+    king_table = [[-30, -40, -40, -50, -50, -40, -40, -30],
+                  [-30, -40, -40, -50, -50, -40, -40, -30],
+                  [-30, -40, -40, -50, -50, -40, -40, -30],
+                  [-30, -40, -40, -50, -50, -40, -40, -30],
+                  [-20, -30, -30, -40, -40, -30, -30, -20],
+                  [-10, -20, -20, -20, -20, -20, -20, -10],
+                  [20, 20, 0, 0, 0, 0, 20, 20],
+                  [20, 30, 10, 0, 0, 10, 30, 20]
+                  ]
+    queen_table = [[-20, -10, -10, -5, -5, -10, -10, -20],
+                   [-10, 0, 0, 0, 0, 0, 0, -10],
+                   [-10, 0, 5, 5, 5, 5, 0, -10],
+                   [-5, 0, 5, 5, 5, 5, 0, -5],
+                   [0, 0, 5, 5, 5, 5, 0, -5],
+                   [-10, 5, 5, 5, 5, 5, 0, -10],
+                   [-10, 0, 0, 0, 0, 0, 0, -10],
+                   [-20, -10, -10, -5, -5, -10, -10, -20]
+                   ]
+    rook_table = [[0, 0, 0, 0, 0, 0, 0, 0],
+                  [5, 10, 10, 10, 10, 10, 10, 5],
+                  [-5, 0, 0, 0, 0, 0, 0, -5],
+                  [-5, 0, 0, 0, 0, 0, 0, -5],
+                  [-5, 0, 0, 0, 0, 0, 0, -5],
+                  [-5, 0, 0, 0, 0, 0, 0, -5],
+                  [-5, 0, 0, 0, 0, 0, 0, -5],
+                  [0, 0, 0, 5, 5, 0, 0, 0]
+                  ]
+    bishop_table = [[-20, -10, -10, -10, -10, -10, -10, -20],
+                    [-10, 0, 0, 0, 0, 0, 0, -10],
+                    [-10, 0, 5, 10, 10, 5, 0, -10],
+                    [-10, 5, 5, 10, 10, 5, 5, -10],
+                    [-10, 0, 10, 10, 10, 10, 0, -10],
+                    [-10, 10, 10, 10, 10, 10, 10, -10],
+                    [-10, 5, 0, 0, 0, 0, 5, -10],
+                    [-20, -10, -10, -10, -10, -10, -10, -20]
+                    ]
+    knight_table = [[-50, -40, -30, -30, -30, -30, -40, -50],
+                    [-40, -20, 0, 0, 0, 0, -20, -40],
+                    [-30, 0, 10, 15, 15, 10, 0, -30],
+                    [-30, 5, 15, 20, 20, 15, 5, -30],
+                    [-30, 0, 15, 20, 20, 15, 0, -30],
+                    [-30, 5, 10, 15, 15, 10, 5, -30],
+                    [-40, -20, 0, 5, 5, 0, -20, -40],
+                    [-50, -40, -30, -30, -30, -30, -40, -50]
+                    ]
+    pawn_table = [[0, 0, 0, 0, 0, 0, 0, 0],
+                  [50, 50, 50, 50, 50, 50, 50, 50],
+                  [10, 10, 20, 30, 30, 20, 10, 10],
+                  [5, 5, 10, 25, 25, 10, 5, 5],
+                  [0, 0, 0, 20, 20, 0, 0, 0],
+                  [5, -5, -10, 0, 0, -10, -5, 5],
+                  [5, 10, 10, -20, -20, 10, 10, 5],
+                  [0, 0, 0, 0, 0, 0, 0, 0]
+                  ]
+    tables = [king_table, queen_table, rook_table, bishop_table, knight_table, pawn_table]  # indexed by PieceType
+
+    # Scores of single piece from white's point of view (negative for black pieces):
+    # material[<piece color>][<piece type>], position[<piece color>][<piece type>][<square>]
+    material = None
+    position = None
+
+    @staticmethod
+    def init_scores():
+        PieceSquareTables.material = [PieceSquareTables.values[:], [-value for value in PieceSquareTables.values]]
+        PieceSquareTables.position = [[[table[square // 8][square % 8] for square in range(64)]
+                                       for table in PieceSquareTables.tables],
+                                      [[-table[7 - square // 8][square % 8] for square in range(64)]
+                                       for table in PieceSquareTables.tables]]
+
+
+PieceSquareTables.init_scores()
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+PIECES_LETTERS = "KQRBNP"  # indexed by PieceType
+CASTLING_LETTERS = {"K": CastlingRights.WHITE_KINGSIDE, "Q": CastlingRights.WHITE_QUEENSIDE,
+                    "k": CastlingRights.BLACK_KINGSIDE, "q": CastlingRights.BLACK_QUEENSIDE}
+ROOK_STEPS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+BISHOP_STEPS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+KING_STEPS = ROOK_STEPS + BISHOP_STEPS
+KNIGHT_STEPS = ((-1, -2), (-2, -1), (-2, 1), (-1, 2), (1, 2), (2, 1), (2, -1), (1, -2))
+PROMOTION_TYPES = (PieceType.QUEEN, PieceType.ROOK, PieceType.BISHOP, PieceType.KNIGHT)
+
+
+def _step_targets(square, steps):
+    row, column = divmod(square, 8)
+    return tuple((row + step[0]) * 8 + column + step[1] for step in steps
+                 if 7 >= row + step[0] >= 0 and 7 >= column + step[1] >= 0)
+
+
+def _ray_squares(square, step):
+    ray = []
+    row, column = divmod(square, 8)
+    row += step[0]
+    column += step[1]
+    while 7 >= row >= 0 and 7 >= column >= 0:
+        ray.append(row * 8 + column)
+        row += step[0]
+        column += step[1]
+    return tuple(ray)
+
+
+def _rays(steps):
+    return [tuple(ray for ray in (_ray_squares(square, step) for step in steps) if ray) for square in range(64)]
+
+
+# Squares are indexed row * 8 + column (0 is A8, 63 is H1).
+# Squares reachable from square by one step: KING_TARGETS[<square>], KNIGHT_TARGETS[<square>],
+# squares attacked by pawn: PAWN_CAPTURES[<pawn color>][<pawn square>]
+KING_TARGETS = [_step_targets(square, KING_STEPS) for square in range(64)]
+KNIGHT_TARGETS = [_step_targets(square, KNIGHT_STEPS) for square in range(64)]
+PAWN_CAPTURES = [[_step_targets(square, ((-1, -1), (-1, 1))) for square in range(64)],
+                 [_step_targets(square, ((1, -1), (1, 1))) for square in range(64)]]
+# Rays of sliding pieces: <piece>_RAYS[<square>] is tuple of rays, every ray lists squares going away from square
+ROOK_RAYS = _rays(ROOK_STEPS)
+BISHOP_RAYS = _rays(BISHOP_STEPS)
+QUEEN_RAYS = [ROOK_RAYS[square] + BISHOP_RAYS[square] for square in range(64)]
+# rook move made by castling king move: king end square -> (rook start, rook end)
+CASTLING_ROOK_MOVES = {62: (63, 61), 58: (56, 59), 6: (7, 5), 2: (0, 3)}
+# Castling rights remaining after move from or to square
+CASTLING_RIGHTS_MASK = [15] * 64
+CASTLING_RIGHTS_MASK[60] = 15 & ~(CastlingRights.WHITE_KINGSIDE | CastlingRights.WHITE_QUEENSIDE)
+CASTLING_RIGHTS_MASK[63] = 15 & ~CastlingRights.WHITE_KINGSIDE
+CASTLING_RIGHTS_MASK[56] = 15 & ~CastlingRights.WHITE_QUEENSIDE
+CASTLING_RIGHTS_MASK[4] = 15 & ~(CastlingRights.BLACK_KINGSIDE | CastlingRights.BLACK_QUEENSIDE)
+CASTLING_RIGHTS_MASK[7] = 15 & ~CastlingRights.BLACK_KINGSIDE
+CASTLING_RIGHTS_MASK[0] = 15 & ~CastlingRights.BLACK_QUEENSIDE
+# piece values used by static exchange evaluation, capturing king outweighs any exchange
+EXCHANGE_VALUES = [20000] + PieceSquareTables.values[1:]
+
+
+class MoveFlag:
+    """Kind of move, stored in bits 14-15 of encoded move"""
+    NORMAL, PROMOTION, EN_PASSANT, CASTLING = range(4)
+
+
+# Moves are encoded as 16-bit integers: bits 0-5 start square, bits 6-11 end square, bits 12-13 type of piece
+# after promotion (PieceType - 1, so queen is 0) and bits 14-15 MoveFlag. Move generators build normal moves
+# directly as start | end << 6
+def encode_move(start, end, flag=MoveFlag.NORMAL, promotion_type=PieceType.QUEEN):
+    """Get encoded move. promotion_type is used only by MoveFlag.PROMOTION moves"""
+    return start | end << 6 | (promotion_type - 1) << 12 | flag << 14
+
+
+def move_start(move):
+    return move & 63
+
+
+def move_end(move):
+    return move >> 6 & 63
+
+
+def move_flag(move):
+    return move >> 14
+
+
+def move_promotion_type(move):
+    """Get type of piece after promotion. Meaningful only for MoveFlag.PROMOTION moves"""
+    return (move >> 12 & 3) + 1
+
+
+def square_to_str(square):
+    """Get square name, for example e4"""
+    return "abcdefgh"[square % 8] + str(8 - square // 8)
+
+
+def move_to_str(move):
+    """Get move string in coordinate notation, for example e2e4 or e7e8q"""
+    move_str = square_to_str(move & 63) + square_to_str(move >> 6 & 63)
+    if move >> 14 == MoveFlag.PROMOTION:
+        move_str += PIECES_LETTERS[move_promotion_type(move)].lower()
+    return move_str
+
+
+def parse_fen(fen):
+    """Parse FEN string. Returns (pieces, white_to_move, castling_rights, en_passant_square, halfmove_clock,
+    fullmove_number), where pieces is list of (<piece color>, <piece type>, <square>)"""
+    fields = fen.split()
+    if len(fields) < 4:
+        raise ValueError(f"Invalid FEN: {fen}")
+    halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+    fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+
+    rows = fields[0].split("/")
+    if len(rows) != 8:
+        raise ValueError(f"Invalid FEN placement: {fields[0]}")
+    pieces = []
+    for row, fen_row in enumerate(rows):
+        column = 0
+        for char in fen_row:
+            if char.isdigit():
+                column += int(char)
+            elif char.upper() in PIECES_LETTERS and column < 8:
+                color = Color.WHITE if char.isupper() else Color.BLACK
+                pieces.append((color, PIECES_LETTERS.index(char.upper()), row * 8 + column))
+                column += 1
+            else:
+                raise ValueError(f"Invalid FEN placement: {fields[0]}")
+        if column != 8:
+            raise ValueError(f"Invalid FEN placement: {fields[0]}")
+    for color in (Color.WHITE, Color.BLACK):
+        if sum(1 for piece in pieces if piece[:2] == (color, PieceType.KING)) != 1:
+            raise ValueError(f"Invalid FEN placement (each side needs one king): {fields[0]}")
+
+    if fields[1] not in ("w", "b"):
+        raise ValueError(f"Invalid FEN side to move: {fields[1]}")
+    castling_rights = 0
+    if fields[2] != "-":
+        for char in fields[2]:
+            if char not in CASTLING_LETTERS:
+                raise ValueError(f"Invalid FEN castling rights: {fields[2]}")
+            castling_rights |= CASTLING_LETTERS[char]
+    en_passant_square = None
+    if fields[3] != "-":
+        if len(fields[3]) != 2 or fields[3][0] not in "abcdefgh" or fields[3][1] not in "36":
+            raise ValueError(f"Invalid FEN en passant square: {fields[3]}")
+        en_passant_square = (8 - int(fields[3][1])) * 8 + "abcdefgh".index(fields[3][0])
+    return pieces, fields[1] == "w", castling_rights, en_passant_square, halfmove_clock, fullmove_number
+
+
+def encode_snapshot(pieces, white_to_move, castling_rights, en_passant_square, halfmove_clock, fullmove_number):
+    """Get snapshot of position - immutable, hashable and picklable tuple (placement, white_to_move,
+    castling_rights, en_passant_square, halfmove_clock, fullmove_number), where placement is 64 bytes with
+    1 + <piece color> * 6 + <piece type> for every occupied square and 0 for empty square.
+    Arguments are the same as values returned by parse_fen"""
+    placement = bytearray(64)
+    for color, piece_type, square in pieces:
+        placement[square] = 1 + color * 6 + piece_type
+    return bytes(placement), white_to_move, castling_rights, en_passant_square, halfmove_clock, fullmove_number
+
+
+def decode_snapshot(snapshot):
+    """Get position from snapshot. Returns the same values as parse_fen"""
+    placement, white_to_move, castling_rights, en_passant_square, halfmove_clock, fullmove_number = snapshot
+    pieces = [((code - 1) // 6, (code - 1) % 6, square) for square, code in enumerate(placement) if code]
+    return pieces, white_to_move, castling_rights, en_passant_square, halfmove_clock, fullmove_number
+
+
+def format_fen(pieces, white_to_move, castling_rights, en_passant_square, halfmove_clock, fullmove_number):
+    """Get FEN string of position. Arguments are the same as values returned by parse_fen"""
+    board = [None] * 64
+    for color, piece_type, square in pieces:
+        letter = PIECES_LETTERS[piece_type]
+        board[square] = letter if color == Color.WHITE else letter.lower()
+    fen_rows = []
+    for row in range(8):
+        fen_row = ""
+        empty = 0
+        for letter in board[row * 8:row * 8 + 8]:
+            if letter is None:
+                empty += 1
+            else:
+                if empty:
+                    fen_row += str(empty)
+                    empty = 0
+                fen_row += letter
+        if empty:
+            fen_row += str(empty)
+        fen_rows.append(fen_row)
+    castling = "".join(char for char, right in CASTLING_LETTERS.items() if castling_rights & right) or "-"
+    en_passant = square_to_str(en_passant_square) if en_passant_square is not None else "-"
+    return f"{'/'.join(fen_rows)} {'w' if white_to_move else 'b'} {castling} {en_passant} {halfmove_clock} " \
+           f"{fullmove_number}"
+
+
 class ChessboardState:
     def __init__(self):
-        self.board = [[None] * 8 for _ in range(8)]
+        # board[<square>] is Piece or None
+        self.board = [None] * 64
         self.init_board()
         self.white_to_move = True
-        self.white_king = self.board[7][4]
-        self.black_king = self.board[0][4]
+        self.white_king = self.board[60]
+        self.black_king = self.board[4]
+        self.castling_rights = 15
+        # square behind pawn that moved by two in last move, otherwise None
+        self.en_passant_square = None
         self.move_counter = 0
+        # moves since last capture or pawn move
+        self.halfmove_clock = 0
+        # undo records: (move, moved piece, captured piece, castling rights, en passant square, zobrist key,
+        # material score, position score, halfmove clock), values are from before move. Null move record has None
+        # as move and pieces
         self.moves_history = []
+        self.zobrist_key = self.compute_zobrist_key()
+        # position_counts[<zobrist key>] - how many times position occurred in game (positions which did not occur
+        # are not stored)
+        self.position_counts = {self.zobrist_key: 1}
+        # running totals from white's point of view, updated by moves
+        self.material_score, self.position_score = self.compute_scores()
+        self.clear_position_cache()
+
+    @classmethod
+    def from_fen(cls, fen):
+        """Create position from FEN string"""
+        return cls.from_position_fields(*parse_fen(fen))
+
+    @classmethod
+    def from_snapshot(cls, snapshot, position_counts=None):
+        """Create position from snapshot returned by to_snapshot. position_counts of game position (if given) are
+        copied, so repetitions of positions played before snapshot are detected"""
+        board_state = cls.from_position_fields(*decode_snapshot(snapshot))
+        if position_counts is not None:
+            board_state.position_counts = dict(position_counts)
+        return board_state
+
+    @classmethod
+    def from_position_fields(cls, pieces, white_to_move, castling_rights, en_passant_square, halfmove_clock,
+                             fullmove_number):
+        """Create position from values returned by parse_fen"""
+        # initial position set up by __init__ would be replaced anyway
+        board_state = cls.__new__(cls)
+        board_state.moves_history = []
+        board_state.board = [None] * 64
+        for color, piece_type, square in pieces:
+            piece = PIECES_CLASSES[piece_type](square, color, board_state)
+            board_state.board[square] = piece
+            if piece_type == PieceType.KING:
+                if color == Color.WHITE:
+                    board_state.white_king = piece
+                else:
+                    board_state.black_king = piece
+
+        # rights without king and rook on their initial squares are dropped
+        for square, piece_type, color in ((60, PieceType.KING, Color.WHITE), (63, PieceType.ROOK, Color.WHITE),
+                                          (56, PieceType.ROOK, Color.WHITE), (4, PieceType.KING, Color.BLACK),
+                                          (7, PieceType.ROOK, Color.BLACK), (0, PieceType.ROOK, Color.BLACK)):
+            piece = board_state.board[square]
+            if piece is None or piece.type != piece_type or piece.color != color:
+                castling_rights &= CASTLING_RIGHTS_MASK[square]
+        board_state.castling_rights = castling_rights
+
+        board_state.white_to_move = white_to_move
+        board_state.move_counter = 2 * (fullmove_number - 1) + (0 if white_to_move else 1)
+        board_state.halfmove_clock = halfmove_clock
+        board_state.en_passant_square = None
+        if en_passant_square is not None and en_passant_square // 8 == (2 if white_to_move else 5) and \
+                board_state.board[en_passant_square] is None:
+            # opponent's pawn that moved by two in last move stands in front of en passant square
+            pawn = board_state.board[en_passant_square + 8 if white_to_move else en_passant_square - 8]
+            if pawn is not None and pawn.type == PieceType.PAWN and pawn.color != (Color.WHITE if white_to_move
+                                                                                   else Color.BLACK):
+                board_state.en_passant_square = en_passant_square
+        board_state.zobrist_key = board_state.compute_zobrist_key()
+        board_state.position_counts = {board_state.zobrist_key: 1}
+        board_state.material_score, board_state.position_score = board_state.compute_scores()
+        board_state.clear_position_cache()
+        return board_state
+
+    def get_position_fields(self):
+        """Get position as the same values as returned by parse_fen"""
+        pieces = [(piece.color, piece.type, square) for square, piece in enumerate(self.board) if piece is not None]
+        return pieces, self.white_to_move, self.castling_rights, self.en_passant_square, self.halfmove_clock, \
+            self.move_counter // 2 + 1
+
+    def to_fen(self):
+        """Get FEN string of position"""
+        return format_fen(*self.get_position_fields())
+
+    def to_snapshot(self):
+        """Get compact snapshot of position (see encode_snapshot). Moves history is not included, repetitions
+        are kept only if position_counts are passed to from_snapshot with snapshot"""
+        return encode_snapshot(*self.get_position_fields())
 
     def init_board(self):
-        for row in (0, 7):
-            if row == 0:
-                color = Color.BLACK
-                pawns_row = row + 1
-            else:
-                color = Color.WHITE
-                pawns_row = row - 1
-            self.board[row][0] = Rook([row, 0], color, self)
-            self.board[row][1] = Knight([row, 1], color, self)
-            self.board[row][2] = Bishop([row, 2], color, self)
-            self.board[row][3] = Queen([row, 3], color, self)
-            self.board[row][4] = King([row, 4], color, self)
-            self.board[row][5] = Bishop([row, 5], color, self)
-            self.board[row][6] = Knight([row, 6], color, self)
-            self.board[row][7] = Rook([row, 7], color, self)
-            for pawns_column in range(8):
-                self.board[pawns_row][pawns_column] = Pawn([pawns_row, pawns_column], color, self)
+        back_row = (Rook, Knight, Bishop, Queen, King, Bishop, Knight, Rook)
+        for color, row, pawns_row in ((Color.BLACK, 0, 1), (Color.WHITE, 7, 6)):
+            for column in range(8):
+                self.board[row * 8 + column] = back_row[column](row * 8 + column, color, self)
+                self.board[pawns_row * 8 + column] = Pawn(pawns_row * 8 + column, color, self)
 
     def get_current_color(self):
         if self.white_to_move:
@@ -49,41 +424,267 @@ class ChessboardState:
         else:
             return Color.BLACK
 
-    def legal_moves(self):
-        """Get list of all posible moves by current player"""
+    def clear_position_cache(self):
+        """Forget legal moves, check status and game state remembered for current position"""
+        self.cached_legal_moves = None
+        self.cached_check = None
+        self.cached_game_state = None
+
+    def legal_moves(self, captures_only=False):
+        """Get list of all posible moves (encoded) by current player. If captures_only is set only captures and
+        promotions to queen are generated. Full list is remembered until position changes"""
+        if not captures_only and self.cached_legal_moves is not None:
+            return list(self.cached_legal_moves)
         color = self.get_current_color()
+        restrictions = self.get_move_restrictions()
         legal_moves_list = []
-        for row in range(8):
-            for column in range(8):
-                piece = self.board[row][column]
-                if piece is not None and piece.color == color:
-                    moves_list = piece.get_legal_moves_list()
-                    if moves_list is not None:
-                        for new_position in moves_list:
-                            move = [piece.position.copy(), new_position.copy()]
-                            legal_moves_list.append(move)
+        for piece in self.board:
+            if piece is not None and piece.color == color:
+                legal_moves_list.extend(piece.legal_moves(restrictions, captures_only))
+        if not captures_only:
+            self.cached_legal_moves = legal_moves_list
+            self.cached_check = restrictions[0] is not None
+            return list(legal_moves_list)
         return legal_moves_list
 
+    def capture_moves(self):
+        """Get list of all possible captures and promotions to queen by current player"""
+        return self.legal_moves(captures_only=True)
+
+    def get_castling_rights(self):
+        """Get castling rights as CastlingRights bit mask"""
+        return self.castling_rights
+
+    def compute_zobrist_key(self):
+        """Compute Zobrist key of current position from scratch"""
+        zobrist_key = 0
+        for square, piece in enumerate(self.board):
+            if piece is not None:
+                zobrist_key ^= Zobrist.piece_key(piece, square)
+        zobrist_key ^= Zobrist.castling[self.castling_rights]
+        if self.en_passant_square is not None:
+            zobrist_key ^= Zobrist.en_passant[self.en_passant_square % 8]
+        if not self.white_to_move:
+            zobrist_key ^= Zobrist.black_to_move
+        return zobrist_key
+
+    def compute_scores(self):
+        """Compute material and position scores (from white's point of view) from scratch"""
+        material_score = 0
+        position_score = 0
+        for square, piece in enumerate(self.board):
+            if piece is not None:
+                material_score += PieceSquareTables.material[piece.color][piece.type]
+                position_score += PieceSquareTables.position[piece.color][piece.type][square]
+        return material_score, position_score
+
+    def update_piece_added(self, piece, square):
+        """Update Zobrist key and scores after piece is put on square"""
+        self.zobrist_key ^= Zobrist.pieces[piece.color][piece.type][square]
+        self.material_score += PieceSquareTables.material[piece.color][piece.type]
+        self.position_score += PieceSquareTables.position[piece.color][piece.type][square]
+
+    def update_piece_removed(self, piece, square):
+        """Update Zobrist key and scores after piece is taken from square"""
+        self.zobrist_key ^= Zobrist.pieces[piece.color][piece.type][square]
+        self.material_score -= PieceSquareTables.material[piece.color][piece.type]
+        self.position_score -= PieceSquareTables.position[piece.color][piece.type][square]
+
+    def update_zobrist_key(self, castling_rights, en_passant_square=None):
+        """Set castling rights and en passant square after move and update Zobrist key with them and with change
+        of side to move. Pieces keys have to be updated by move itself"""
+        self.zobrist_key ^= Zobrist.black_to_move ^ Zobrist.castling[self.castling_rights] ^ \
+            Zobrist.castling[castling_rights]
+        self.castling_rights = castling_rights
+        if self.en_passant_square is not None:
+            self.zobrist_key ^= Zobrist.en_passant[self.en_passant_square % 8]
+        self.en_passant_square = en_passant_square
+        if en_passant_square is not None:
+            self.zobrist_key ^= Zobrist.en_passant[en_passant_square % 8]
+
+    def get_piece(self, square):
+        """Get piece standing on square. If square is empty returns None"""
+        return self.board[square]
+
+    def get_piece_type(self, square):
+        """Get type of piece standing on square. If square is empty returns None"""
+        piece = self.board[square]
+        return piece.type if piece is not None else None
+
+    def get_king_square(self):
+        """Get square of current player's king"""
+        return self.white_king.square if self.white_to_move else self.black_king.square
+
+    def legal_moves_from(self, square):
+        """Get list of legal moves (encoded) starting on square. If no legal moves are possible returns None"""
+        legal_moves_list = [move for move in self.legal_moves() if move & 63 == square]
+        if len(legal_moves_list) == 0:
+            return None
+        return legal_moves_list
+
+    def make_move(self, move):
+        """Make move (encoded). Move have to be legal"""
+        start = move & 63
+        end = move >> 6 & 63
+        flag = move >> 14
+        board = self.board
+        piece = board[start]
+        self.clear_position_cache()
+        captured_square = end
+        if flag == MoveFlag.EN_PASSANT:
+            captured_square = end + 8 if piece.color == Color.WHITE else end - 8
+        captured_piece = board[captured_square]
+        self.moves_history.append((move, piece, captured_piece, self.castling_rights, self.en_passant_square,
+                                   self.zobrist_key, self.material_score, self.position_score, self.halfmove_clock))
+        self.move_counter += 1
+        if captured_piece is not None or piece.type == PieceType.PAWN:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+
+        if captured_piece is not None:
+            board[captured_square] = None
+            self.update_piece_removed(captured_piece, captured_square)
+        board[start] = None
+        self.update_piece_removed(piece, start)
+        en_passant_square = None
+        if flag == MoveFlag.PROMOTION:
+            # pawn is kept in undo record, so undo_move puts it back
+            end_piece = PIECES_CLASSES[(move >> 12 & 3) + 1](end, piece.color, self)
+        else:
+            end_piece = piece
+            piece.square = end
+            if piece.type == PieceType.PAWN and (end - start == 16 or start - end == 16):
+                en_passant_square = (start + end) >> 1
+        board[end] = end_piece
+        self.update_piece_added(end_piece, end)
+        if flag == MoveFlag.CASTLING:
+            rook_start, rook_end = CASTLING_ROOK_MOVES[end]
+            rook = board[rook_start]
+            board[rook_start] = None
+            board[rook_end] = rook
+            rook.square = rook_end
+            self.update_piece_removed(rook, rook_start)
+            self.update_piece_added(rook, rook_end)
+
+        self.update_zobrist_key(self.castling_rights & CASTLING_RIGHTS_MASK[start] & CASTLING_RIGHTS_MASK[end],
+                                en_passant_square)
+        self.position_counts[self.zobrist_key] = self.position_counts.get(self.zobrist_key, 0) + 1
+        self.white_to_move = not self.white_to_move
+
+    def make_null_move(self):
+        """Pass the turn to opponent without moving (used by null move pruning). Current player must not be in
+        check. Null move is taken back by undo_null_move or undo_move.
+        Position after null move never occurs in game, so repetitions and fifty-move rule count only positions after
+        it - game position counts are kept in its record (in place of moved piece) and halfmove clock starts again"""
+        self.clear_position_cache()
+        self.moves_history.append((None, self.position_counts, None, self.castling_rights, self.en_passant_square,
+                                   self.zobrist_key, self.material_score, self.position_score, self.halfmove_clock))
+        self.move_counter += 1
+        self.halfmove_clock = 0
+        self.update_zobrist_key(self.castling_rights)
+        self.position_counts = {self.zobrist_key: 1}
+        self.white_to_move = not self.white_to_move
+
+    def undo_null_move(self):
+        """Undo null move made by make_null_move"""
+        self.undo_move()
+
     def is_capture(self, move):
         """Check if move is capture"""
-        if self.board[move[1][0]][move[1][1]] is not None:
-            return True
-        if self.board[move[0][0]][move[0][1]].type == PieceType.PAWN and self.board[move[1][0]][move[1][1]] is None and\
-                abs(move[1][1] - move[0][1]) == 1:
-            return True
-        return False
+        return self.board[move >> 6 & 63] is not None or move >> 14 == MoveFlag.EN_PASSANT
+
+    def static_exchange_evaluation(self, move):
+        """Get material gain of move for current player after all captures on its end square are played out. Each
+        side captures with its least valuable piece and can stop when capturing does not pay off. Sliders attacking
+        through pieces that already captured (X-rays) are included, pins are ignored"""
+        start = move & 63
+        end = move >> 6 & 63
+        flag = move >> 14
+        board = self.board
+        captured_piece = board[end]
+        # squares of pieces that left the board or the square they attacked from
+        removed = {start}
+        if flag == MoveFlag.EN_PASSANT:
+            captured_square = end + 8 if self.white_to_move else end - 8
+            captured_piece = board[captured_square]
+            removed.add(captured_square)
+        gains = [EXCHANGE_VALUES[captured_piece.type] if captured_piece is not None else 0]
+        piece_type = board[start].type
+        if flag == MoveFlag.PROMOTION:
+            piece_type = (move >> 12 & 3) + 1
+            gains[0] += EXCHANGE_VALUES[piece_type] - EXCHANGE_VALUES[PieceType.PAWN]
+        color = Color.BLACK if self.white_to_move else Color.WHITE
+        while True:
+            attacker_square = self.least_valuable_attacker(end, color, removed)
+            if attacker_square is None:
+                break
+            # gains[i] - gain of i-th capture if opponent does not recapture
+            gains.append(EXCHANGE_VALUES[piece_type] - gains[-1])
+            piece_type = board[attacker_square].type
+            removed.add(attacker_square)
+            color = 1 - color
+        while len(gains) > 1:
+            gain = gains.pop()
+            # capture is made only if it is better than stopping
+            gains[-1] = -max(-gains[-1], gain)
+        return gains[0]
+
+    def least_valuable_attacker(self, square, color, removed):
+        """Get square of least valuable piece of given color attacking square or None if there is no such piece.
+        Pieces standing on removed squares are skipped, so sliders behind them attack through"""
+        board = self.board
+        for targets, piece_type in ((PAWN_CAPTURES[1 - color][square], PieceType.PAWN),
+                                    (KNIGHT_TARGETS[square], PieceType.KNIGHT)):
+            for target in targets:
+                piece = board[target]
+                if piece is not None and piece.type == piece_type and piece.color == color and \
+                        target not in removed:
+                    return target
+        queen_square = None
+        for rays, slider_type in ((BISHOP_RAYS[square], PieceType.BISHOP), (ROOK_RAYS[square], PieceType.ROOK)):
+            for ray in rays:
+                for target in ray:
+                    piece = board[target]
+                    if piece is None or target in removed:
+                        continue
+                    if piece.color == color:
+                        if piece.type == slider_type:
+                            return target
+                        if piece.type == PieceType.QUEEN:
+                            queen_square = target
+                    break
+        if queen_square is not None:
+            return queen_square
+        for target in KING_TARGETS[square]:
+            piece = board[target]
+            if piece is not None and piece.type == PieceType.KING and piece.color == color and target not in removed:
+                return target
+        return None
 
     def game_state(self):
-        """Get current game state"""
+        """Get current game state. State is remembered until position changes"""
+        if self.cached_game_state is None:
+            self.cached_game_state = self.compute_game_state()
+        return self.cached_game_state
+
+    def compute_game_state(self):
         if self.is_insufficient_material():
             return GameState.INSUFFICIENT_MATERIAL
 
-        is_any_move_possible = self.is_any_move_possible()
+        if self.cached_legal_moves is not None:
+            is_any_move_possible = len(self.cached_legal_moves) > 0
+        else:
+            is_any_move_possible = self.is_any_move_possible()
         if not is_any_move_possible:
             if self.is_check():
                 return GameState.CHECKMATE
             else:
                 return GameState.STALEMATE
+        elif self.position_counts[self.zobrist_key] >= 3:
+            return GameState.THREEFOLD_REPETITION
+        elif self.halfmove_clock >= 100:
+            return GameState.FIFTY_MOVE_RULE
         elif self.is_check():
             return GameState.CHECK
         else:
@@ -92,197 +693,172 @@ class ChessboardState:
     def is_any_move_possible(self):
         """Check if current player can make any move"""
         color = self.get_current_color()
-
-        for row in range(8):
-            for column in range(8):
-                piece = self.board[row][column]
-                if piece is not None and piece.color == color:
-                    if piece.get_legal_moves_list() is not None:
-                        return True
+        restrictions = self.get_move_restrictions()
+        for piece in self.board:
+            if piece is not None and piece.color == color:
+                for _ in piece.legal_moves(restrictions):
+                    return True
         return False
 
     def is_insufficient_material(self):
-        """Check if game is over by insufficient material"""
-        for row in range(8):
-            for column in range(8):
-                piece = self.board[row][column]
-                if piece is not None and piece.type != PieceType.KING:
+        """Check if game is over by insufficient material: besides kings there is at most one knight or bishop,
+        or only bishops standing on squares of the same color"""
+        minor_pieces = []
+        for piece in self.board:
+            if piece is not None and piece.type != PieceType.KING:
+                if piece.type != PieceType.BISHOP and piece.type != PieceType.KNIGHT:
                     return False
-        return True
+                minor_pieces.append(piece)
+        if len(minor_pieces) <= 1:
+            return True
+        if any(piece.type == PieceType.KNIGHT for piece in minor_pieces):
+            return False
+        return len({(piece.square // 8 + piece.square) % 2 for piece in minor_pieces}) == 1
+
+    def is_repetition(self):
+        """Check if current position occurred earlier in game"""
+        return self.position_counts[self.zobrist_key] > 1
+
+    def has_non_pawn_material(self):
+        """Check if current player has any piece besides king and pawns. Without them zugzwang is likely"""
+        color = self.get_current_color()
+        for piece in self.board:
+            if piece is not None and piece.color == color and piece.type != PieceType.PAWN and \
+                    piece.type != PieceType.KING:
+                return True
+        return False
 
     def is_check(self):
         """Check if current player's king is checked"""
-        if self.white_to_move:
-            if self.is_move_valid(self.white_king.position, self.white_king.position):
-                return False
+        if self.cached_check is None:
+            if self.white_to_move:
+                self.cached_check = self.is_square_attacked(self.white_king.square, Color.BLACK)
             else:
-                return True
-        else:
-            if self.is_move_valid(self.black_king.position, self.black_king.position):
-                return False
-            else:
-                return True
-
-    def is_move_valid(self, old_position, new_position):
-        """Check if move is valid. Check if king is checked after move"""
-        def undo():
-            self.board[old_position[0]][old_position[1]] = old_position_piece
-            self.board[new_position[0]][new_position[1]] = new_position_piece
-            old_position_piece.position = old_position
-            if en_passant:
-                self.board[pawn.position[0]][pawn.position[1]] = pawn
-
-        old_position_piece = self.board[old_position[0]][old_position[1]]
-        new_position_piece = self.board[new_position[0]][new_position[1]]
-
-        self.board[old_position[0]][old_position[1]] = None
-        self.board[new_position[0]][new_position[1]] = old_position_piece
-        old_position_piece.position = new_position
-
-        if self.white_to_move:
-            king = self.white_king
-            pawn_row_step = -1
-        else:
-            king = self.black_king
-            pawn_row_step = 1
-
-        en_passant = False
-        pawn = None
-        if old_position_piece.type == PieceType.PAWN and new_position_piece is None and \
-                abs(new_position[1] - old_position[1]) == 1:
-            pawn = self.board[new_position[0] - pawn_row_step][new_position[1]]
-            self.board[new_position[0] - pawn_row_step][new_position[1]] = None
-            en_passant = True
-
-        for step in ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)):
-            threat_position = [king.position[0] + step[0], king.position[1] + step[1]]
-            if not ChessboardState.is_move_out_of_board(threat_position):
-                threat_position_piece = self.board[threat_position[0]][threat_position[1]]
-                if threat_position_piece is not None and not king.is_same_color(threat_position_piece) \
-                        and threat_position_piece.type == PieceType.KING:
-                    undo()
-                    return False
-
-        for step in ((-1, 0), (1, 0), (0, -1), (0, 1)):
-            threat_position = [king.position[0] + step[0], king.position[1] + step[1]]
-            while not ChessboardState.is_move_out_of_board(threat_position):
-                threat_position_piece = self.board[threat_position[0]][threat_position[1]]
-                if threat_position_piece is not None:
-                    if not king.is_same_color(threat_position_piece) and \
-                            (threat_position_piece.type == PieceType.ROOK or threat_position_piece.type == PieceType.QUEEN):
-                        undo()
-                        return False
-                    break
-                else:
-                    threat_position[0] += step[0]
-                    threat_position[1] += step[1]
-
-        for step in ((-1, -1), (-1, 1), (1, -1), (1, 1)):
-            threat_position = [king.position[0] + step[0], king.position[1] + step[1]]
-            while not ChessboardState.is_move_out_of_board(threat_position):
-                threat_position_piece = self.board[threat_position[0]][threat_position[1]]
-                if threat_position_piece is not None:
-                    if not king.is_same_color(threat_position_piece) and \
-                            (threat_position_piece.type == PieceType.BISHOP or threat_position_piece.type == PieceType.QUEEN):
-                        undo()
-                        return False
-                    break
-                else:
-                    threat_position[0] += step[0]
-                    threat_position[1] += step[1]
-
-        for step in ((-1, -2), (-2, -1), (-2, 1), (-1, 2), (1, 2), (2, 1), (2, -1), (1, -2)):
-            threat_position = [king.position[0] + step[0], king.position[1] + step[1]]
-            if not ChessboardState.is_move_out_of_board(threat_position):
-                threat_position_piece = self.board[threat_position[0]][threat_position[1]]
-                if threat_position_piece is not None and not king.is_same_color(threat_position_piece) \
-                        and threat_position_piece.type == PieceType.KNIGHT:
-                    undo()
-                    return False
-
-        for step in ((pawn_row_step, -1), (pawn_row_step, 1)):
-            threat_position = [king.position[0] + step[0], king.position[1] + step[1]]
-            if not ChessboardState.is_move_out_of_board(threat_position):
-                threat_position_piece = self.board[threat_position[0]][threat_position[1]]
-                if threat_position_piece is not None and not king.is_same_color(threat_position_piece) \
-                        and threat_position_piece.type == PieceType.PAWN:
-                    undo()
-                    return False
+                self.cached_check = self.is_square_attacked(self.black_king.square, Color.WHITE)
+        return self.cached_check
+
+    def is_square_attacked(self, square, color, ignored_squares=(), blocking_square=None):
+        """Check if square is attacked by any piece of given color. Pieces standing on ignored_squares are
+        treated as removed from board and blocking_square is treated as occupied"""
+        board = self.board
+        for rays, slider_type in ((ROOK_RAYS[square], PieceType.ROOK), (BISHOP_RAYS[square], PieceType.BISHOP)):
+            for ray in rays:
+                for target in ray:
+                    if target == blocking_square:
+                        break
+                    piece = board[target]
+                    if piece is not None and target not in ignored_squares:
+                        if piece.color == color and (piece.type == slider_type or piece.type == PieceType.QUEEN):
+                            return True
+                        break
+
+        for targets, attacker_type in ((KNIGHT_TARGETS[square], PieceType.KNIGHT),
+                                       (KING_TARGETS[square], PieceType.KING),
+                                       (PAWN_CAPTURES[1 - color][square], PieceType.PAWN)):
+            for target in targets:
+                piece = board[target]
+                if piece is not None and piece.color == color and piece.type == attacker_type and \
+                        target not in ignored_squares:
+                    return True
+        return False
 
-        undo()
-        return True
+    def get_move_restrictions(self):
+        """Find checks and pins of current player's pieces. Returns (check_evasions, pins), where check_evasions is
+        set of squares on which non-king move ends check (checking piece and squares between it and king) or None
+        if king is not checked, and pins maps square of pinned piece to set of squares of its pin ray (including
+        pinning piece)"""
+        board = self.board
+        king = self.white_king if self.white_to_move else self.black_king
+        color = king.color
+        check_evasions = None
+        checkers_count = 0
+        pins = {}
+
+        for rays, slider_type in ((ROOK_RAYS[king.square], PieceType.ROOK),
+                                  (BISHOP_RAYS[king.square], PieceType.BISHOP)):
+            for ray in rays:
+                pinned_square = None
+                for index, square in enumerate(ray):
+                    piece = board[square]
+                    if piece is not None:
+                        if piece.color == color:
+                            if pinned_square is not None:
+                                break
+                            pinned_square = square
+                        else:
+                            if piece.type == slider_type or piece.type == PieceType.QUEEN:
+                                if pinned_square is None:
+                                    checkers_count += 1
+                                    check_evasions = set(ray[:index + 1])
+                                else:
+                                    pins[pinned_square] = set(ray[:index + 1])
+                            break
+
+        # enemy pawns attacking king stand on squares attacked by pawn of king's color standing on king's square
+        for targets, attacker_type in ((KNIGHT_TARGETS[king.square], PieceType.KNIGHT),
+                                       (PAWN_CAPTURES[color][king.square], PieceType.PAWN)):
+            for square in targets:
+                piece = board[square]
+                if piece is not None and piece.color != color and piece.type == attacker_type:
+                    checkers_count += 1
+                    check_evasions = {square}
+
+        if checkers_count > 1:
+            # double check - only king can move
+            check_evasions = set()
+        return check_evasions, pins
 
     def get_pieces_lists(self):
         """Get lists of pieces on board. Usage: pieces_lists[<piece type>][<piece color>]"""
         pieces_lists = [None] * 6
         for i in range(6):
             pieces_lists[i] = [[], []]
-        for row in range(8):
-            for column in range(8):
-                piece = self.board[row][column]
-                if piece is not None:
-                    pieces_lists[piece.type][piece.color].append(piece)
+        for piece in self.board:
+            if piece is not None:
+                pieces_lists[piece.type][piece.color].append(piece)
         return pieces_lists
 
     def undo_move(self):
         """Undo last move"""
         if len(self.moves_history) == 0:
             return
+        self.clear_position_cache()
         self.move_counter -= 1
-        move = self.moves_history.pop()
-
-        start_position = move.start_position
-        end_position = move.end_position
-        moved_piece = move.moved_piece
-        captured_piece = move.captured_piece
-
-        moved_piece.position = start_position
-        self.board[start_position[0]][start_position[1]] = moved_piece
-        self.board[end_position[0]][end_position[1]] = None
-        if captured_piece is not None:
-            self.board[captured_piece.position[0]][captured_piece.position[1]] = captured_piece
-            # undo castled rook
-            if captured_piece.color == moved_piece.color:
-                if captured_piece.position == [7, 7]:
-                    self.board[7][5] = None
-                elif captured_piece.position == [7, 0]:
-                    self.board[7][3] = None
-                elif captured_piece.position == [0, 7]:
-                    self.board[0][5] = None
-                elif captured_piece.position == [0, 0]:
-                    self.board[0][3] = None
-
-        if moved_piece.type == PieceType.KING:
-            if moved_piece.color == Color.WHITE:
-                self.white_king = moved_piece
-            else:
-                self.black_king = moved_piece
-
-        if self.white_to_move:
-            self.white_to_move = False
+        count = self.position_counts[self.zobrist_key] - 1
+        if count:
+            self.position_counts[self.zobrist_key] = count
         else:
-            self.white_to_move = True
-
-    @staticmethod
-    def is_move_out_of_board(position):
-        if 7 >= position[0] >= 0 and 7 >= position[1] >= 0:
-            return False
-        else:
-            return True
-
+            # positions visited only by search are forgotten, so dict does not grow with searched nodes
+            del self.position_counts[self.zobrist_key]
+        move, piece, captured_piece, self.castling_rights, self.en_passant_square, self.zobrist_key, \
+            self.material_score, self.position_score, self.halfmove_clock = self.moves_history.pop()
+        if move is None:
+            # null move, its record keeps position counts of game
+            self.position_counts = piece
+            self.white_to_move = not self.white_to_move
+            return
+        start = move & 63
+        end = move >> 6 & 63
+        board = self.board
 
-class Move:
-    def __init__(self, start_position, end_position, moved_piece, captured_piece):
-        self.start_position = start_position
-        self.end_position = end_position
-        self.moved_piece = moved_piece
-        # if captured_piece is same color as moved_piece it is castled rook
-        self.captured_piece = captured_piece
+        board[end] = None
+        board[start] = piece
+        piece.square = start
+        if captured_piece is not None:
+            # captured piece keeps its square (it differs from end square after en passant)
+            board[captured_piece.square] = captured_piece
+        if move >> 14 == MoveFlag.CASTLING:
+            rook_start, rook_end = CASTLING_ROOK_MOVES[end]
+            rook = board[rook_end]
+            board[rook_end] = None
+            board[rook_start] = rook
+            rook.square = rook_start
+        self.white_to_move = not self.white_to_move
 
 
 class Piece:
-    def __init__(self, position, color, board_state):
-        self.position = position
+    def __init__(self, square, color, board_state):
+        self.square = square
         self.color = color
         self.board_state = board_state
 
@@ -293,354 +869,219 @@ class Piece:
         else:
             return False
 
-    def legal_moves(self):
-        """Legal moves generator"""
-        if (self.board_state.white_to_move and self.color == Color.WHITE) \
-                or (not self.board_state.white_to_move and self.color == Color.BLACK):
-            for move in self.pseudo_legal_moves():
-                if self.board_state.is_move_valid(self.position, move):
-                    yield move
+    def is_color_to_move(self):
+        """Check if it is this piece's player turn"""
+        return self.board_state.white_to_move == (self.color == Color.WHITE)
+
+    def legal_moves(self, restrictions=None, captures_only=False):
+        """Legal moves (encoded) generator. restrictions are checks and pins of current position returned by
+        ChessboardState.get_move_restrictions, they are found if not given. If captures_only is set only captures
+        and promotions to queen are generated"""
+        if self.is_color_to_move():
+            if restrictions is None:
+                restrictions = self.board_state.get_move_restrictions()
+            check_evasions, pins = restrictions
+            start = self.square
+            pin_ray = pins.get(start)
+            for end in (self.pseudo_legal_captures() if captures_only else self.pseudo_legal_moves()):
+                if (check_evasions is None or end in check_evasions) and (pin_ray is None or end in pin_ray):
+                    yield start | end << 6
 
     def get_legal_moves_list(self):
-        """Get list of legal moves. If no legal moves are possible returns None"""
-        legal_moves_list = []
-        for move in self.legal_moves():
-            new_move = move.copy()
-            legal_moves_list.append(new_move)
-        if len(legal_moves_list) == 0:
-            return None
-        return legal_moves_list
-
-    def move(self, new_position):
-        """Make move to new position. New position have to be legal"""
-        self.board_state.moves_history.append(Move(self.position.copy(), new_position.copy(), self, self.board_state.board[new_position[0]][new_position[1]]))
-        self.board_state.move_counter += 1
-        self.board_state.board[self.position[0]][self.position[1]] = None
-        self.board_state.board[new_position[0]][new_position[1]] = self
-        self.position = new_position
-        if self.board_state.white_to_move:
-            self.board_state.white_to_move = False
-        else:
-            self.board_state.white_to_move = True
+        """Get list of legal moves (encoded). If no legal moves are possible returns None"""
+        return self.board_state.legal_moves_from(self.square)
 
     def pseudo_legal_moves(self):
         raise NotImplementedError("Method is not implemented")
 
+    def pseudo_legal_captures(self):
+        """Pseudo legal captures generator"""
+        board = self.board_state.board
+        for square in self.pseudo_legal_moves():
+            if board[square] is not None:
+                yield square
+
+    def step_moves(self, targets):
+        """Pseudo legal moves generator of piece moving by one step to one of targets squares"""
+        board = self.board_state.board
+        for square in targets:
+            target_piece = board[square]
+            if target_piece is None or target_piece.color != self.color:
+                yield square
+
+    def sliding_moves(self, rays):
+        """Pseudo legal moves generator of piece sliding along rays"""
+        board = self.board_state.board
+        for ray in rays:
+            for square in ray:
+                target_piece = board[square]
+                if target_piece is not None:
+                    if target_piece.color != self.color:
+                        yield square
+                    break
+                yield square
+
     def __str__(self):
         raise NotImplementedError("Method is not implemented")
 
 
 class King(Piece):
-    def __init__(self, position, color, board_state):
-        super().__init__(position, color, board_state)
-        self.first_move = True
+    def __init__(self, square, color, board_state):
+        super().__init__(square, color, board_state)
         self.type = PieceType.KING
 
     def pseudo_legal_moves(self):
         """Pseudo legal moves generator. Pseudo legal moves do not take into account if king is checked after move"""
-        for step in ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)):
-            new_position = [self.position[0] + step[0], self.position[1] + step[1]]
-            if not ChessboardState.is_move_out_of_board(new_position):
-                new_position_piece = self.board_state.board[new_position[0]][new_position[1]]
-                if new_position_piece is not None:
-                    if not self.is_same_color(new_position_piece):
-                        yield new_position
-                else:
-                    yield new_position
+        yield from self.step_moves(KING_TARGETS[self.square])
 
-        # castling
+        # castling, rights are lost when king or rook leaves its initial square
+        board = self.board_state.board
+        castling_rights = self.board_state.castling_rights
         if self.color == Color.WHITE:
-            row = 7
-        else:
-            row = 0
-        piece = self.board_state.board[row][7]
-        if self.first_move and piece is not None:
-            if piece.type == PieceType.ROOK:
-                if piece.first_move and self.board_state.board[row][5] is None and \
-                        self.board_state.board[row][6] is None:
-                    if self.board_state.is_move_valid([row, 4], [row, 5]) and \
-                            self.board_state.is_move_valid([row, 7], [row, 5]):
-                        yield [row, 6]
-
-        piece = self.board_state.board[row][0]
-        if self.first_move and piece is not None:
-            if piece.type == PieceType.ROOK:
-                if piece.first_move and self.board_state.board[row][3] is None and \
-                        self.board_state.board[row][2] is None and self.board_state.board[row][1] is None:
-                    if self.board_state.is_move_valid([row, 4], [row, 3]) and \
-                            self.board_state.is_move_valid([row, 0], [row, 3]):
-                        yield [row, 2]
-
-    def move(self, new_position):
-        """Make move to new position. New position have to be legal"""
-        def append_move_history(rook):
-            """Add castling to moves history. Takes castled rook"""
-            king = King(self.position.copy(), self.color, self.board_state)
-            king.first_move = self.first_move
-            rook_copy = Rook(rook.position.copy(), self.color, self.board_state)
-            rook_copy.first_move = rook.first_move
-            self.board_state.moves_history.append(Move(self.position.copy(), new_position.copy(), king, rook_copy))
-
-        self.board_state.move_counter += 1
-
-        # castling
-        castling = False
-        if abs(self.position[1] - new_position[1]) == 2:
-            castling = True
-            rook = None
-            rook_new_position = None
-            if new_position == [7, 6]:
-                rook = self.board_state.board[7][7]
-                rook_new_position = [7, 5]
-            elif new_position == [7, 2]:
-                rook = self.board_state.board[7][0]
-                rook_new_position = [7, 3]
-            elif new_position == [0, 6]:
-                rook = self.board_state.board[0][7]
-                rook_new_position = [0, 5]
-            elif new_position == [0, 2]:
-                rook = self.board_state.board[0][0]
-                rook_new_position = [0, 3]
-            append_move_history(rook)
-            self.board_state.board[rook_new_position[0]][rook_new_position[1]] = rook
-            self.board_state.board[rook.position[0]][rook.position[1]] = None
-            rook.position = rook_new_position
-            rook.first_move = False
-
-        king = King(self.position.copy(), self.color, self.board_state)
-        king.first_move = self.first_move
-        if not castling:
-            self.board_state.moves_history.append(Move(self.position.copy(), new_position.copy(), king, self.board_state.board[new_position[0]][new_position[1]]))
-
-        self.board_state.board[self.position[0]][self.position[1]] = None
-        self.board_state.board[new_position[0]][new_position[1]] = self
-        self.position = new_position
-
-        if self.first_move:
-            self.first_move = False
-
-        if self.board_state.white_to_move:
-            self.board_state.white_to_move = False
+            row_start, kingside, queenside = 56, CastlingRights.WHITE_KINGSIDE, CastlingRights.WHITE_QUEENSIDE
         else:
-            self.board_state.white_to_move = True
+            row_start, kingside, queenside = 0, CastlingRights.BLACK_KINGSIDE, CastlingRights.BLACK_QUEENSIDE
+        if castling_rights & kingside and board[row_start + 5] is None and board[row_start + 6] is None:
+            yield row_start + 6
+        if castling_rights & queenside and board[row_start + 3] is None and board[row_start + 2] is None and \
+                board[row_start + 1] is None:
+            yield row_start + 2
+
+    def legal_moves(self, restrictions=None, captures_only=False):
+        """Legal moves (encoded) generator. King cannot move to attacked square and cannot castle out of check or
+        through attacked square. Arguments are the same as in Piece.legal_moves"""
+        if self.is_color_to_move():
+            opponent_color = 1 - self.color
+            start = self.square
+            if restrictions is None:
+                in_check = self.board_state.is_square_attacked(start, opponent_color)
+            else:
+                in_check = restrictions[0] is not None
+            ignored_squares = (start,)
+            for end in (self.pseudo_legal_captures() if captures_only else self.pseudo_legal_moves()):
+                if end - start == 2 or start - end == 2:
+                    if in_check or self.board_state.is_square_attacked((start + end) // 2, opponent_color):
+                        continue
+                    if not self.board_state.is_square_attacked(end, opponent_color, ignored_squares):
+                        yield start | end << 6 | MoveFlag.CASTLING << 14
+                elif not self.board_state.is_square_attacked(end, opponent_color, ignored_squares):
+                    yield start | end << 6
 
     def __str__(self):
         return "wK" if self.color == Color.WHITE else "bK"
 
 
 class Queen(Piece):
-    def __init__(self, position, color, board_state):
-        super().__init__(position, color, board_state)
+    def __init__(self, square, color, board_state):
+        super().__init__(square, color, board_state)
         self.type = PieceType.QUEEN
 
     def pseudo_legal_moves(self):
         """Pseudo legal moves generator. Pseudo legal moves do not take into account if king is checked after move"""
-        for step in ((-1, -1), (-1, 1), (1, -1), (1, 1), (-1, 0), (1, 0), (0, -1), (0, 1)):
-            new_position = [self.position[0] + step[0], self.position[1] + step[1]]
-            while not ChessboardState.is_move_out_of_board(new_position):
-                new_position_piece = self.board_state.board[new_position[0]][new_position[1]]
-                if new_position_piece is not None:
-                    if not self.is_same_color(new_position_piece):
-                        yield new_position
-                    break
-                else:
-                    yield new_position
-                    new_position[0] += step[0]
-                    new_position[1] += step[1]
+        return self.sliding_moves(QUEEN_RAYS[self.square])
 
     def __str__(self):
         return "wQ" if self.color == Color.WHITE else "bQ"
 
 
 class Rook(Piece):
-    def __init__(self, position, color, board_state):
-        super().__init__(position, color, board_state)
-        self.first_move = True
+    def __init__(self, square, color, board_state):
+        super().__init__(square, color, board_state)
         self.type = PieceType.ROOK
 
     def pseudo_legal_moves(self):
         """Pseudo legal moves generator. Pseudo legal moves do not take into account if king is checked after move"""
-        for step in ((-1, 0), (1, 0), (0, -1), (0, 1)):
-            new_position = [self.position[0] + step[0], self.position[1] + step[1]]
-            while not ChessboardState.is_move_out_of_board(new_position):
-                new_position_piece = self.board_state.board[new_position[0]][new_position[1]]
-                if new_position_piece is not None:
-                    if not self.is_same_color(new_position_piece):
-                        yield new_position
-                    break
-                else:
-                    yield new_position
-                    new_position[0] += step[0]
-                    new_position[1] += step[1]
-
-    def move(self, new_position):
-        """Make move to new position. New position have to be legal"""
-        rook = Rook(self.position.copy(), self.color, self.board_state)
-        rook.first_move = self.first_move
-        self.board_state.moves_history.append(Move(self.position.copy(), new_position.copy(), rook,
-                                                   self.board_state.board[new_position[0]][new_position[1]]))
-        self.board_state.move_counter += 1
-
-        self.board_state.board[self.position[0]][self.position[1]] = None
-        self.board_state.board[new_position[0]][new_position[1]] = self
-        self.position = new_position
-
-        if self.first_move:
-            self.first_move = False
-
-        if self.board_state.white_to_move:
-            self.board_state.white_to_move = False
-        else:
-            self.board_state.white_to_move = True
+        return self.sliding_moves(ROOK_RAYS[self.square])
 
     def __str__(self):
         return "wR" if self.color == Color.WHITE else "bR"
 
 
 class Bishop(Piece):
-    def __init__(self, position, color, board_state):
-        super().__init__(position, color, board_state)
+    def __init__(self, square, color, board_state):
+        super().__init__(square, color, board_state)
         self.type = PieceType.BISHOP
 
     def pseudo_legal_moves(self):
         """Pseudo legal moves generator. Pseudo legal moves do not take into account if king is checked after move"""
-        for step in ((-1, -1), (-1, 1), (1, -1), (1, 1)):
-            new_position = [self.position[0] + step[0], self.position[1] + step[1]]
-            while not ChessboardState.is_move_out_of_board(new_position):
-                new_position_piece = self.board_state.board[new_position[0]][new_position[1]]
-                if new_position_piece is not None:
-                    if not self.is_same_color(new_position_piece):
-                        yield new_position
-                    break
-                else:
-                    yield new_position
-                    new_position[0] += step[0]
-                    new_position[1] += step[1]
+        return self.sliding_moves(BISHOP_RAYS[self.square])
 
     def __str__(self):
         return "wB" if self.color == Color.WHITE else "bB"
 
 
 class Knight(Piece):
-    def __init__(self, position, color, board_state):
-        super().__init__(position, color, board_state)
+    def __init__(self, square, color, board_state):
+        super().__init__(square, color, board_state)
         self.type = PieceType.KNIGHT
 
     def pseudo_legal_moves(self):
         """Pseudo legal moves generator. Pseudo legal moves do not take into account if king is checked after move"""
-        for step in ((-1, -2), (-2, -1), (-2, 1), (-1, 2), (1, 2), (2, 1), (2, -1), (1, -2)):
-            new_position = [self.position[0] + step[0], self.position[1] + step[1]]
-            if not ChessboardState.is_move_out_of_board(new_position):
-                new_position_piece = self.board_state.board[new_position[0]][new_position[1]]
-                if new_position_piece is not None:
-                    if not self.is_same_color(new_position_piece):
-                        yield new_position
-                else:
-                    yield new_position
+        return self.step_moves(KNIGHT_TARGETS[self.square])
 
     def __str__(self):
         return "wN" if self.color == Color.WHITE else "bN"
 
 
 class Pawn(Piece):
-    def __init__(self, position, color, board_state):
-        super().__init__(position, color, board_state)
-        self.first_move = True
-        self.last_move_number = None
-        self.moved_by_two = False
+    def __init__(self, square, color, board_state):
+        super().__init__(square, color, board_state)
         self.type = PieceType.PAWN
-        self.row_step = -1 if color == Color.WHITE else 1
+        self.step = -8 if color == Color.WHITE else 8
+        self.start_row = 6 if color == Color.WHITE else 1
 
     def pseudo_legal_moves(self):
         """Pseudo legal moves generator. Pseudo legal moves do not take into account if king is checked after move"""
-        new_position = [self.position[0] + self.row_step, self.position[1]]
-        if not ChessboardState.is_move_out_of_board(new_position):
-            new_position_piece = self.board_state.board[new_position[0]][new_position[1]]
-            if new_position_piece is None:
-                yield new_position
-                new_position[0] += self.row_step
-                if not ChessboardState.is_move_out_of_board(new_position) and self.first_move:
-                    new_position_piece = self.board_state.board[new_position[0]][new_position[1]]
-                    if new_position_piece is None:
-                        yield new_position
-
-        for step in ((self.row_step, -1), (self.row_step, 1)):
-            new_position = [self.position[0] + step[0], self.position[1] + step[1]]
-            if not ChessboardState.is_move_out_of_board(new_position):
-                new_position_piece = self.board_state.board[new_position[0]][new_position[1]]
-                if new_position_piece is not None:
-                    if not self.is_same_color(new_position_piece):
-                        yield new_position
-
-        for step in ((0, -1), (0, 1)):
-            new_position = [self.position[0] + step[0], self.position[1] + step[1]]
-            if not ChessboardState.is_move_out_of_board(new_position):
-                new_position_piece = self.board_state.board[new_position[0]][new_position[1]]
-                if new_position_piece is not None:
-                    if not self.is_same_color(new_position_piece) and new_position_piece.type == PieceType.PAWN:
-                        if new_position_piece.last_move_number == self.board_state.move_counter and \
-                                new_position_piece.moved_by_two:
-                            new_position[0] += self.row_step
-                            yield new_position
-
-    def move(self, new_position, promotion_choice=Queen):
-        """Make move to new position. New position have to be legal.
-        promotion_choice is type of piece after pawn promotion."""
-        pawn = Pawn(self.position.copy(), self.color, self.board_state)
-        pawn.first_move = self.first_move
-        pawn.moved_by_two = self.moved_by_two
-        pawn.last_move_number = self.last_move_number
-
-        self.board_state.move_counter += 1
-        self.last_move_number = self.board_state.move_counter
-        if abs(self.position[0] - new_position[0]) == 2:
-            self.moved_by_two = True
-        else:
-            self.moved_by_two = False
-
-        en_passant = False
-        # en_passant
-        if self.board_state.board[new_position[0]][new_position[1]] is None and \
-                abs(new_position[1] - self.position[1]) == 1:
-            en_passant = True
-            self.board_state.moves_history.append(Move(self.position.copy(), new_position.copy(), pawn,
-                                                       self.board_state.board[new_position[0] - self.row_step][new_position[1]]))
-            self.board_state.board[new_position[0] - self.row_step][new_position[1]] = None
-
-
-        pawn_promotion = False
-        # pawn promotion
-        if self.color == Color.WHITE and new_position[0] == 0 or self.color == Color.BLACK and new_position[0] == 7:
-            pawn_promotion = True
-            self.board_state.moves_history.append(Move(self.position.copy(), new_position.copy(), pawn,
-                                                       self.board_state.board[new_position[0]][new_position[1]]))
-            promoted_pawn = None
-            if promotion_choice is Knight:
-                promoted_pawn = Knight(new_position, self.color, self.board_state)
-            elif promotion_choice is Rook:
-                promoted_pawn = Rook(new_position, self.color, self.board_state)
-            elif promotion_choice is Bishop:
-                promoted_pawn = Bishop(new_position, self.color, self.board_state)
-            else:
-                promoted_pawn = Queen(new_position, self.color, self.board_state)
-            self.board_state.board[new_position[0]][new_position[1]] = promoted_pawn
-
-        if not en_passant and not pawn_promotion:
-            self.board_state.moves_history.append(Move(self.position.copy(), new_position.copy(), pawn,
-                                                       self.board_state.board[new_position[0]][new_position[1]]))
-
-        self.board_state.board[self.position[0]][self.position[1]] = None
-        if not pawn_promotion:
-            self.board_state.board[new_position[0]][new_position[1]] = self
-        self.position = new_position
+        board = self.board_state.board
+        # pawn never stands on last row, so square in front of it is always on board
+        new_square = self.square + self.step
+        if board[new_square] is None:
+            yield new_square
+            new_square += self.step
+            if self.square // 8 == self.start_row and board[new_square] is None:
+                yield new_square
+
+        for new_square in PAWN_CAPTURES[self.color][self.square]:
+            new_square_piece = board[new_square]
+            if new_square_piece is not None:
+                if not self.is_same_color(new_square_piece):
+                    yield new_square
+            elif new_square == self.board_state.en_passant_square:
+                yield new_square
+
+    def pseudo_legal_captures(self):
+        """Pseudo legal captures (including en passant) and promotions generator"""
+        column = self.square % 8
+        for square in self.pseudo_legal_moves():
+            if square % 8 != column or square < 8 or square >= 56:
+                yield square
+
+    def legal_moves(self, restrictions=None, captures_only=False):
+        """Legal moves (encoded) generator. Promotion to every piece type is separate move (only promotion to queen
+        if captures_only is set). En passant removes two pieces from king's lines, so it is verified separately.
+        Arguments are the same as in Piece.legal_moves"""
+        if self.is_color_to_move():
+            if restrictions is None:
+                restrictions = self.board_state.get_move_restrictions()
+            check_evasions, pins = restrictions
+            start = self.square
+            pin_ray = pins.get(start)
+            for end in (self.pseudo_legal_captures() if captures_only else self.pseudo_legal_moves()):
+                if end % 8 != start % 8 and self.board_state.board[end] is None:
+                    king = self.board_state.white_king if self.color == Color.WHITE else self.board_state.black_king
+                    if not self.board_state.is_square_attacked(king.square, 1 - self.color,
+                                                               (start, end - self.step), end):
+                        yield start | end << 6 | MoveFlag.EN_PASSANT << 14
+                    continue
+                if (check_evasions is None or end in check_evasions) and (pin_ray is None or end in pin_ray):
+                    if end < 8 or end >= 56:
+                        for promotion_type in (PROMOTION_TYPES[:1] if captures_only else PROMOTION_TYPES):
+                            yield encode_move(start, end, MoveFlag.PROMOTION, promotion_type)
+                    else:
+                        yield start | end << 6
 
-        if self.first_move:
-            self.first_move = False
+    def __str__(self):
+        return "wP" if self.color == Color.WHITE else "bP"
 
-        if self.board_state.white_to_move:
-            self.board_state.white_to_move = False
-        else:
-            self.board_state.white_to_move = True
 
-    def __str__(self):
-        return "wP" if self.color == Color.WHITE else "bP"
\ No newline at end of file
+PIECES_CLASSES = [King, Queen, Rook, Bishop, Knight, Pawn]  # indexed by PieceType
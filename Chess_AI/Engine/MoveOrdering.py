@@ -0,0 +1,85 @@
+import Chess_AI.Engine.Chessboard as chessboard
+
+
+class MoveOrderer:
+    """Sorts moves so that moves likely to cause cutoff are searched first:
+    hash move, captures not losing material (most valuable victim / least valuable attacker), promotions to queen,
+    killer moves, quiet moves (and underpromotions) by history heuristic and losing captures (by static exchange
+    evaluation)"""
+    HASH_MOVE_SCORE = 10000000
+    CAPTURE_SCORE = 1000000
+    PROMOTION_SCORE = 900000
+    KILLER_SCORES = (800000, 700000)
+    MAX_PLY = 128
+
+    def __init__(self, board_state, values):
+        self.board_state = board_state
+        # values[<piece type>]
+        self.values = [values[piece_type] for piece_type in chessboard.PieceType.piece_type_list()]
+        # killers[<ply>] - two last quiet moves that caused beta cutoff at ply
+        self.killers = [[None, None] for _ in range(MoveOrderer.MAX_PLY)]
+        # history[<color>][<start square> + 64 * <end square>] - butterfly table of quiet moves cutoffs
+        self.history = [[0] * 4096 for _ in range(2)]
+
+    def new_search(self):
+        """Forget killer moves and age history scores before new search"""
+        self.killers = [[None, None] for _ in range(MoveOrderer.MAX_PLY)]
+        self.history = [[score // 2 for score in color_history] for color_history in self.history]
+
+    @staticmethod
+    def is_promotion(move):
+        return move >> 14 == chessboard.MoveFlag.PROMOTION
+
+    def is_quiet(self, move):
+        """Check if move is neither capture nor promotion"""
+        return not self.board_state.is_capture(move) and not self.is_promotion(move)
+
+    def score_move(self, move, ply, hash_move):
+        if move == hash_move:
+            return MoveOrderer.HASH_MOVE_SCORE
+        score = 0
+        if self.board_state.is_capture(move):
+            victim = self.board_state.get_piece_type(move >> 6 & 63)
+            if victim is None:
+                # en passant
+                victim = chessboard.PieceType.PAWN
+            attacker_value = self.values[self.board_state.get_piece_type(move & 63)]
+            if attacker_value > self.values[victim]:
+                # only capture by more valuable piece can lose material
+                exchange = self.board_state.static_exchange_evaluation(move)
+                if exchange < 0:
+                    return exchange
+            score = MoveOrderer.CAPTURE_SCORE + 10 * self.values[victim] - attacker_value
+        if move >> 12 == chessboard.MoveFlag.PROMOTION << 2:
+            # promotion to queen (promotion type bits are 0)
+            score += MoveOrderer.PROMOTION_SCORE
+        if score:
+            return score
+        if ply is not None and ply < MoveOrderer.MAX_PLY:
+            killers = self.killers[ply]
+            if move == killers[0]:
+                return MoveOrderer.KILLER_SCORES[0]
+            if move == killers[1]:
+                return MoveOrderer.KILLER_SCORES[1]
+        history_score = self.history[self.board_state.get_current_color()][move & 4095]
+        return min(history_score, MoveOrderer.KILLER_SCORES[1] - 1)
+
+    def order_moves(self, moves, ply=None, hash_move=None):
+        """Sort moves from most to least promising. Killer moves are used only if ply is given"""
+        moves.sort(key=lambda move: self.score_move(move, ply, hash_move), reverse=True)
+        return moves
+
+    def order_captures(self, moves, hash_move=None):
+        """Sort captures (and promotions) from most to least promising and drop captures losing material"""
+        scored_moves = [(self.score_move(move, None, hash_move), move) for move in moves]
+        scored_moves.sort(reverse=True)
+        return [move for score, move in scored_moves if score >= 0]
+
+    def update_cutoff(self, move, ply, depth):
+        """Remember quiet move that caused beta cutoff at ply with remaining depth"""
+        if ply < MoveOrderer.MAX_PLY:
+            killers = self.killers[ply]
+            if move != killers[0]:
+                killers[1] = killers[0]
+                killers[0] = move
+        self.history[self.board_state.get_current_color()][move & 4095] += depth * depth
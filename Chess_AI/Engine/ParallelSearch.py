@@ -0,0 +1,210 @@
+"""Parallel search - root moves are split between worker processes.
+
+Every worker process keeps its own ChessAI (with its own transposition table) for the whole game. Position is sent
+to workers as compact snapshot and the best evaluation found so far at root is shared between workers as alpha bound.
+Stop requests are shared with workers as flag"""
+
+import concurrent.futures
+import multiprocessing
+import os
+import time
+
+import Chess_AI.Engine.AI as ai
+import Chess_AI.Engine.MoveOrdering as ordering
+
+# state of worker process, set by init_worker
+worker_ai = None
+worker_backend = None
+worker_alpha = None
+worker_stop = None
+worker_search_id = None
+
+
+class WorkerChessAI(ai.ChessAI):
+    """ChessAI of worker process. It is stopped by flag shared with main process"""
+    @property
+    def stop_requested(self):
+        return worker_stop.value != 0
+
+    @stop_requested.setter
+    def stop_requested(self, value):
+        # flag is set and cleared only by main process
+        pass
+
+
+def init_worker(backend, hash_size_mb, shared_alpha, shared_stop):
+    global worker_ai, worker_backend, worker_alpha, worker_stop
+    worker_backend = backend
+    worker_alpha = shared_alpha
+    worker_stop = shared_stop
+    worker_ai = WorkerChessAI(backend(), hash_size_mb)
+
+
+def search_move(search_id, snapshot, position_counts, move, depth, deadline, null_move_pruning=True,
+                late_move_reductions=True):
+    """Search root move in worker process. position_counts are occurrences of game positions (to detect
+    repetitions). deadline is time.time() value or None (search is not stopped, not even
+    by stop request). Returns (evaluation, nodes, principal variation starting with move), evaluation and variation are
+    None if search was stopped before it finished"""
+    global worker_search_id
+    if search_id != worker_search_id:
+        worker_search_id = search_id
+        worker_ai.transposition_table.new_search()
+        worker_ai.move_orderer.new_search()
+    worker_ai.set_board_state(worker_backend.from_snapshot(snapshot, position_counts))
+    worker_ai.nodes = 0
+    worker_ai.null_move_pruning = null_move_pruning
+    worker_ai.late_move_reductions = late_move_reductions
+    worker_ai.deadline = time.perf_counter() + (deadline - time.time()) if deadline is not None else None
+    try:
+        board_evaluation = worker_ai.search_root_move(move, depth, worker_alpha.value)
+    except ai.SearchTimeout:
+        return None, worker_ai.nodes, None
+    with worker_alpha.get_lock():
+        if board_evaluation > worker_alpha.value:
+            worker_alpha.value = board_evaluation
+    # line after move is read from transposition table of this worker
+    worker_ai.best_move = move
+    return board_evaluation, worker_ai.nodes, worker_ai.principal_variation()
+
+
+class ParallelChessAI:
+    """Chess AI searching root moves in worker processes. Has the same ai_move interface as ChessAI, except that it
+    can not ponder (there is no ponder argument and no ponderhit). Worker processes are kept until close is called.
+    hash_size_mb is total size of transposition tables, it is split between workers"""
+    def __init__(self, board_state, workers=None, hash_size_mb=16):
+        self.board_state = board_state
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.shared_alpha = multiprocessing.Value("i", -100000)
+        self.shared_stop = multiprocessing.Value("b", 0)
+        self.executor = concurrent.futures.ProcessPoolExecutor(self.workers, initializer=init_worker,
+                                                               initargs=(type(board_state),
+                                                                         max(hash_size_mb // self.workers, 1),
+                                                                         self.shared_alpha, self.shared_stop))
+        # worker processes are started now, as forking them later from search thread would copy locks held by
+        # other threads (for example stdin lock of UCI input loop)
+        self.executor.submit(os.getpid).result()
+        self.move_orderer = ordering.MoveOrderer(board_state, ai.BoardEvaluation(board_state).values)
+        self.nodes = 0
+        self.search_id = 0
+        self.null_move_pruning = True
+        self.late_move_reductions = True
+        # progress of current search, the same as in ChessAI
+        self.search_start_time = None
+        self.search_depth = 0
+        self.best_move = None
+        self.best_score = None
+        # principal variation of best move, reported by worker which searched it
+        self.variation = []
+        self.ponder_move = None
+        self.info_callback = None
+
+    def set_board_state(self, board_state):
+        """Search another position object"""
+        self.board_state = board_state
+        self.move_orderer.board_state = board_state
+
+    def ai_move(self, depth=3, time_limit=None, max_depth=None, null_move_pruning=True, late_move_reductions=True,
+                statistics=None):
+        """Get next AI move. Arguments are the same as in ChessAI.ai_move. Workers do not report their counters,
+        so statistics contain only nodes and fully searched depths"""
+        if max_depth is None:
+            max_depth = depth
+        self.search_id += 1
+        self.nodes = 0
+        self.search_start_time = time.perf_counter()
+        self.search_depth = 0
+        self.best_move = None
+        self.best_score = None
+        self.variation = []
+        self.ponder_move = None
+        self.null_move_pruning = null_move_pruning
+        self.late_move_reductions = late_move_reductions
+        start_time = time.time()
+        deadline = None
+
+        moves = self.board_state.legal_moves()
+        if len(moves) <= 1:
+            self.shared_stop.value = 0
+            if statistics is not None:
+                statistics.finish(0)
+            return moves[0] if moves else None
+        snapshot = self.board_state.to_snapshot()
+        position_counts = dict(self.board_state.position_counts)
+        moves = self.move_orderer.order_moves(moves)
+
+        best_move = None
+        for current_depth in range(1, max_depth + 1):
+            evaluations, variations = self.search_root(snapshot, position_counts, moves, current_depth, deadline)
+            if evaluations[0] is None:
+                break
+            # next iteration searches moves in order of their evaluations, best move first
+            ordered = sorted(zip(evaluations, range(len(moves))),
+                             key=lambda item: (item[0] if item[0] is not None else -100000, -item[1]), reverse=True)
+            moves = [moves[index] for _, index in ordered]
+            best_move = moves[0]
+            variation = variations[ordered[0][1]]
+            if None in evaluations:
+                break
+            self.best_move = best_move
+            self.variation = variation
+            self.best_score = ordered[0][0]
+            self.search_depth = current_depth
+            if statistics is not None:
+                statistics.add_iteration(current_depth, self.nodes, self.best_score, self.principal_variation())
+            if self.info_callback is not None:
+                self.info_callback(self)
+            # time and stop requests are not checked during depth 1 search, so there is always move to return
+            deadline = start_time + time_limit if time_limit is not None else float("inf")
+            if self.shared_stop.value or time.time() >= deadline:
+                break
+        self.shared_stop.value = 0
+        if best_move is not None:
+            self.ponder_move = variation[1] if len(variation) > 1 else None
+        if statistics is not None:
+            statistics.finish(self.nodes)
+        return best_move
+
+    def principal_variation(self):
+        """Get expected line of play starting with best move of last fully searched depth"""
+        return list(self.variation)
+
+    @property
+    def stop_requested(self):
+        """Stop request flag shared with workers, the same as ChessAI.stop_requested"""
+        return self.shared_stop.value != 0
+
+    @stop_requested.setter
+    def stop_requested(self, value):
+        self.shared_stop.value = 1 if value else 0
+
+    def stop(self):
+        """Stop search (called from other thread), the same as ChessAI.stop"""
+        self.stop_requested = True
+
+    def search_root(self, snapshot, position_counts, moves, depth, deadline):
+        """Search all root moves to given depth in worker processes. Returns lists of moves evaluations and principal
+        variations (None if search of move was not finished). Evaluation of move other than first is exact only if it
+        is greater than evaluation of first move"""
+        self.shared_alpha.value = -100000
+        evaluations = [None] * len(moves)
+        variations = [None] * len(moves)
+        # first move is searched alone, so other moves are searched with its evaluation as alpha
+        evaluations[0], nodes, variations[0] = self.executor.submit(search_move, self.search_id, snapshot,
+                                                                    position_counts, moves[0], depth, deadline,
+                                                                    self.null_move_pruning,
+                                                                    self.late_move_reductions).result()
+        self.nodes += nodes
+        if evaluations[0] is None:
+            return evaluations, variations
+        futures = {self.executor.submit(search_move, self.search_id, snapshot, position_counts, move, depth,
+                                        deadline, self.null_move_pruning, self.late_move_reductions): index
+                   for index, move in enumerate(moves[1:], 1)}
+        for future in concurrent.futures.as_completed(futures):
+            evaluations[futures[future]], nodes, variations[futures[future]] = future.result()
+            self.nodes += nodes
+        return evaluations, variations
+
+    def close(self):
+        """Stop worker processes"""
+        self.executor.shutdown()
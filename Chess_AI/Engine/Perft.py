@@ -0,0 +1,241 @@
+"""Perft - move generator correctness and speed test.
+
+Usage: python -m Chess_AI.Engine.Perft [--fen FEN] [--depth N] [--divide] [--backend mailbox|bitboard]
+                                       [--suite] [--compare-backends] [--json RESULTS_PATH]
+                                       [--profile cprofile|sampling] [--allocations] [--top N]
+                                       [--profile-output COLLAPSED_PATH]"""
+
+import argparse
+import json
+import time
+
+import Chess_AI.Engine.Chessboard as chessboard
+import Chess_AI.Engine.Bitboard as bitboard
+import Chess_AI.Engine.Profiling as profiling
+
+BACKENDS = {"mailbox": chessboard.ChessboardState, "bitboard": bitboard.BitboardState}
+
+# Positions with known node counts. nodes[i] is node count at depth i + 1
+PERFT_SUITE = [
+    {"name": "start position", "fen": chessboard.START_FEN,
+     "nodes": [20, 400, 8902, 197281, 4865609]},
+    {"name": "kiwipete", "fen": "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     "nodes": [48, 2039, 97862, 4085603]},
+    {"name": "rook endgame with en passant", "fen": "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     "nodes": [14, 191, 2812, 43238, 674624]},
+    {"name": "promotions and castling", "fen": "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     "nodes": [6, 264, 9467, 422333]},
+    {"name": "promotion with capture", "fen": "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     "nodes": [44, 1486, 62379, 2103487]},
+    {"name": "illegal en passant (pinned on rank)", "fen": "3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1",
+     "nodes": [18, 92, 1670, 10138, 185429, 1134888]},
+    {"name": "illegal en passant (pinned on diagonal)", "fen": "8/8/4k3/8/2p5/8/B2P2K1/8 w - - 0 1",
+     "nodes": [13, 102, 1266, 10276, 135655, 1015133]},
+    {"name": "en passant capture checks opponent", "fen": "8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1",
+     "nodes": [15, 126, 1928, 13931, 206379, 1440467]},
+    {"name": "short castling gives check", "fen": "5k2/8/8/8/8/8/8/4K2R w K - 0 1",
+     "nodes": [15, 66, 1198, 6399, 120330, 661072]},
+    {"name": "long castling gives check", "fen": "3k4/8/8/8/8/8/8/R3K3 w Q - 0 1",
+     "nodes": [16, 71, 1286, 7418, 141077, 803711]},
+    {"name": "castling rights", "fen": "r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1",
+     "nodes": [26, 1141, 27826, 1274206]},
+    {"name": "castling prevented", "fen": "r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1",
+     "nodes": [44, 1494, 50509, 1720476]},
+    {"name": "promote out of check", "fen": "2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1",
+     "nodes": [11, 133, 1442, 19174, 266199, 3821001]},
+    {"name": "discovered check", "fen": "8/8/1P2K3/8/2n5/1q6/8/5k2 b - - 0 1",
+     "nodes": [29, 165, 5160, 31961, 1004658]},
+    {"name": "promote to give check", "fen": "4k3/1P6/8/8/8/8/K7/8 w - - 0 1",
+     "nodes": [9, 40, 472, 2661, 38983, 217342]},
+    {"name": "underpromote to check", "fen": "8/P1k5/K7/8/8/8/8/8 w - - 0 1",
+     "nodes": [6, 27, 273, 1329, 18135, 92683]},
+    {"name": "self stalemate", "fen": "K1k5/8/P7/8/8/8/8/8 w - - 0 1",
+     "nodes": [2, 6, 13, 63, 382, 2217]},
+    {"name": "stalemate and checkmate", "fen": "8/k1P5/8/1K6/8/8/8/8 w - - 0 1",
+     "nodes": [10, 25, 268, 926, 10857, 43261, 567584]},
+    {"name": "stalemate and checkmate (black)", "fen": "8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1",
+     "nodes": [37, 183, 6559, 23527]},
+]
+
+# Positions with unusual FEN fields, which both backends have to read the same way (checked with suite positions by
+# --compare-backends)
+EDGE_FENS = [
+    # en passant square without pawn that moved by two
+    "4k3/8/8/4P3/8/8/8/4K3 w - f6 0 1",
+    "4k3/8/8/8/8/8/8/4K3 w - e6 0 1",
+    # own pawn behind en passant square
+    "4k3/8/8/4PP2/8/8/8/4K3 w - f6 0 1",
+    # en passant square on rank of player to move
+    "4k3/8/8/8/4pP2/8/8/4K3 w - f3 0 1",
+    # en passant square occupied
+    "4k3/8/5p2/4Pp2/8/8/8/4K3 w - f6 0 1",
+    # castling rights without king or rooks on their initial squares
+    "r3k2r/8/8/8/8/8/8/4K3 w KQkq - 0 1",
+    "4k3/8/8/8/8/8/8/R3K2R b KQkq - 0 1",
+    "1r2k1r1/8/8/8/8/8/8/R4K1R w KQkq - 0 1",
+    # fifty-move rule reached
+    "r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 100 90",
+    # bare kings
+    "8/8/8/3k4/8/8/8/K7 b - - 0 1",
+]
+
+
+def perft(board_state, depth):
+    """Count leaf nodes of legal moves tree of given depth"""
+    if depth == 0:
+        return 1
+    moves = board_state.legal_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        board_state.make_move(move)
+        nodes += perft(board_state, depth - 1)
+        board_state.undo_move()
+    return nodes
+
+
+def divide(board_state, depth):
+    """Get perft node count of every move in position. Returns dict: move string -> nodes"""
+    nodes = {}
+    for move in board_state.legal_moves():
+        board_state.make_move(move)
+        nodes[chessboard.move_to_str(move)] = perft(board_state, depth - 1)
+        board_state.undo_move()
+    return nodes
+
+
+def run_position(backend, fen, depth, divide_mode=False, expected=None):
+    """Run perft of position and get result record"""
+    board_state = BACKENDS[backend].from_fen(fen)
+    start_time = time.perf_counter()
+    moves_nodes = None
+    if divide_mode:
+        moves_nodes = divide(board_state, depth)
+        nodes = sum(moves_nodes.values())
+    else:
+        nodes = perft(board_state, depth)
+    elapsed_time = time.perf_counter() - start_time
+    result = {"fen": fen, "depth": depth, "nodes": nodes, "time": elapsed_time,
+              "nps": nodes / elapsed_time if elapsed_time > 0 else 0.0}
+    if moves_nodes is not None:
+        result["divide"] = moves_nodes
+    if expected is not None:
+        result["expected"] = expected
+        result["passed"] = nodes == expected
+    return result
+
+
+def run_suite(backend, max_depth, max_nodes=None):
+    """Run perft of every suite position at its deepest known depth not greater than max_depth.
+    Depths with more than max_nodes known nodes are skipped"""
+    results = []
+    for position in PERFT_SUITE:
+        depth = min(max_depth, len(position["nodes"]))
+        while max_nodes is not None and depth > 1 and position["nodes"][depth - 1] > max_nodes:
+            depth -= 1
+        result = run_position(backend, position["fen"], depth, expected=position["nodes"][depth - 1])
+        result["name"] = position["name"]
+        results.append(result)
+    return results
+
+
+def compare_backends(fen, depth):
+    """Walk legal moves tree of position to given depth with all backends. Legal moves, FEN and Zobrist key are
+    compared in every node. Returns description of first difference or None if backends agree"""
+    board_states = [backend.from_fen(fen) for backend in BACKENDS.values()]
+    return compare_nodes(board_states, depth, [])
+
+
+def compare_nodes(board_states, depth, line):
+    for name, get_value in (("FEN", lambda board_state: board_state.to_fen()),
+                            ("Zobrist key", lambda board_state: board_state.zobrist_key),
+                            ("legal moves", lambda board_state: sorted(map(chessboard.move_to_str,
+                                                                           board_state.legal_moves())))):
+        values = [get_value(board_state) for board_state in board_states]
+        if any(value != values[0] for value in values):
+            return f"{name} after [{' '.join(line)}]: " + \
+                ", ".join(f"{backend} {value}" for backend, value in zip(BACKENDS, values))
+    if depth == 0:
+        return None
+    for move in board_states[0].legal_moves():
+        line.append(chessboard.move_to_str(move))
+        for board_state in board_states:
+            board_state.make_move(move)
+        difference = compare_nodes(board_states, depth - 1, line)
+        for board_state in board_states:
+            board_state.undo_move()
+        line.pop()
+        if difference is not None:
+            return difference
+    return None
+
+
+def summary(backend, results):
+    total_nodes = sum(result["nodes"] for result in results)
+    total_time = sum(result["time"] for result in results)
+    return {"backend": backend, "positions": results, "total_nodes": total_nodes, "total_time": total_time,
+            "nps": total_nodes / total_time if total_time > 0 else 0.0,
+            "passed": all(result.get("passed", True) for result in results)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perft move generator test")
+    parser.add_argument("--fen", default=chessboard.START_FEN, help="position to test")
+    parser.add_argument("--depth", type=int, default=3, help="search depth (maximal depth in suite mode)")
+    parser.add_argument("--divide", action="store_true", help="print node count of every move")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="mailbox")
+    parser.add_argument("--suite", action="store_true", help="run standard positions suite")
+    parser.add_argument("--max-nodes", type=int, default=None, help="skip suite depths with more nodes")
+    parser.add_argument("--compare-backends", action="store_true",
+                        help="check that backends agree on suite and edge case positions up to depth")
+    parser.add_argument("--json", dest="json_path", default=None, help="write results to JSON file")
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.compare_backends:
+        passed = True
+        for fen in [position["fen"] for position in PERFT_SUITE] + EDGE_FENS:
+            difference = compare_backends(fen, args.depth)
+            passed = passed and difference is None
+            print(f"{'ok  ' if difference is None else 'FAIL'} {fen}" +
+                  (f" - {difference}" if difference is not None else ""))
+        print("Backends agree" if passed else "Backends DIFFER")
+        return 0 if passed else 1
+
+    profiler = profiling.from_arguments(args)
+    if profiler is not None:
+        profiler.start()
+    if args.suite:
+        results = run_suite(args.backend, args.depth, args.max_nodes)
+    else:
+        results = [run_position(args.backend, args.fen, args.depth, args.divide)]
+    if profiler is not None:
+        profiler.stop()
+
+    if args.suite:
+        for result in results:
+            print(f"{'ok  ' if result['passed'] else 'FAIL'} {result['name']:40} depth {result['depth']}: "
+                  f"{result['nodes']} nodes (expected {result['expected']}), {result['nps']:.0f} nodes/s")
+    else:
+        if args.divide:
+            for move_str, nodes in sorted(results[0]["divide"].items()):
+                print(f"{move_str}: {nodes}")
+        print(f"Nodes: {results[0]['nodes']}")
+        print(f"Time: {results[0]['time']:.3f} s")
+        print(f"Nodes/s: {results[0]['nps']:.0f}")
+
+    record = summary(args.backend, results)
+    if args.suite:
+        print(f"Total: {record['total_nodes']} nodes in {record['total_time']:.3f} s, {record['nps']:.0f} nodes/s"
+              f" - {'passed' if record['passed'] else 'FAILED'}")
+    if profiler is not None:
+        profiling.report(profiler, args, record["total_nodes"])
+    if args.json_path is not None:
+        with open(args.json_path, "w") as json_file:
+            json.dump(record, json_file, indent=2)
+    return 0 if record["passed"] else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
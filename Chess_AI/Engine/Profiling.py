@@ -0,0 +1,236 @@
+"""Profiling of engine - where search (or perft, bench) spends its time and memory.
+
+Modes: cprofile - deterministic, every function call is measured (slows code down several times),
+sampling - stack of profiled thread is recorded every interval (low overhead, full stacks).
+Memory retained by run (allocated and not freed before its end) and peak memory are traced by tracemalloc in
+either mode. Retained memory is mostly long-lived tables (transposition table, position counts) - memory allocated
+and freed within search nodes (move lists, undo records) is not retained, so it shows only in peak memory.
+Profile is written as collapsed stacks (one "frame;frame;frame weight" line per stack), which flame graph tools
+(flamegraph.pl, speedscope, inferno) read, and summarized as top N functions.
+
+Usage: python -m Chess_AI.Engine.Profiling [--fen FEN] [--depth N] [--backend mailbox|bitboard]
+                                           [--profile cprofile|sampling] [--interval SECONDS] [--allocations]
+                                           [--top N] [--profile-output COLLAPSED_PATH]"""
+
+import argparse
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+
+import Chess_AI.Engine.Chessboard as chessboard
+import Chess_AI.Engine.Bitboard as bitboard
+import Chess_AI.Engine.AI as ai
+
+BACKENDS = {"mailbox": chessboard.ChessboardState, "bitboard": bitboard.BitboardState}
+
+MODES = ("cprofile", "sampling")
+DEFAULT_INTERVAL = 0.001
+DEFAULT_TOP = 20
+
+
+def function_label(filename, name, line=None):
+    """Get function name used in reports: <module>.<function>[:<line>] (built-in functions keep their own names)"""
+    if filename == "~":
+        return name
+    label = f"{os.path.splitext(os.path.basename(filename))[0]}.{name}"
+    return f"{label}:{line}" if line is not None else label
+
+
+class Profiler:
+    """Profiles code run in thread which called start, until stop is called (or in with block).
+    mode is "cprofile", "sampling" or None (only allocations are traced if allocations is True).
+    interval is time between samples (in seconds) in sampling mode"""
+    def __init__(self, mode="sampling", interval=DEFAULT_INTERVAL, allocations=False):
+        if mode is not None and mode not in MODES:
+            raise ValueError(f"Unknown profiling mode: {mode}")
+        self.mode = mode
+        self.interval = interval
+        self.allocations = allocations
+        self.profile = None
+        # samples[<stack>] - number of samples of stack (tuple of function labels, outermost first)
+        self.samples = {}
+        self.sampler_thread = None
+        self.sampler_stop = threading.Event()
+        self.switch_interval = None
+        self.start_snapshot = None
+        self.end_snapshot = None
+        self.peak_memory = 0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        if self.allocations:
+            tracemalloc.start()
+            self.start_snapshot = tracemalloc.take_snapshot()
+        if self.mode == "cprofile":
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        elif self.mode == "sampling":
+            self.samples = {}
+            self.sampler_stop.clear()
+            # sampler thread has to get GIL to take sample, so thread switching must be at least as frequent
+            self.switch_interval = sys.getswitchinterval()
+            sys.setswitchinterval(min(self.interval, self.switch_interval))
+            self.sampler_thread = threading.Thread(target=self.sample, args=(threading.get_ident(),), daemon=True)
+            self.sampler_thread.start()
+
+    def stop(self):
+        if self.mode == "cprofile":
+            self.profile.disable()
+        elif self.mode == "sampling":
+            self.sampler_stop.set()
+            self.sampler_thread.join()
+            sys.setswitchinterval(self.switch_interval)
+        if self.allocations:
+            self.end_snapshot = tracemalloc.take_snapshot()
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    def sample(self, thread_id):
+        """Record stack of profiled thread every interval until stop (in sampler thread)"""
+        while not self.sampler_stop.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(function_label(code.co_filename, getattr(code, "co_qualname", code.co_name)))
+                frame = frame.f_back
+            if stack:
+                stack = tuple(reversed(stack))
+                self.samples[stack] = self.samples.get(stack, 0) + 1
+
+    def collapsed_stacks(self):
+        """Get dict: stack (frames separated by ;) -> weight. Weight is number of samples in sampling mode and
+        own time in microseconds in cprofile mode. cProfile knows only direct callers of functions,
+        so its stacks have two frames - caller and function. cProfile does not know classes of methods,
+        so their labels contain line number"""
+        if self.mode == "sampling":
+            return {";".join(stack): count for stack, count in self.samples.items()}
+        stacks = {}
+        if self.mode == "cprofile":
+            for (filename, line, name), (_, _, own_time, _, callers) in pstats.Stats(self.profile).stats.items():
+                label = function_label(filename, name, line)
+                if not callers:
+                    stacks[label] = stacks.get(label, 0) + int(own_time * 1000000)
+                for (caller_filename, caller_line, caller_name), caller_stats in callers.items():
+                    stack = f"{function_label(caller_filename, caller_name, caller_line)};{label}"
+                    # own time of function spent in calls from this caller
+                    stacks[stack] = stacks.get(stack, 0) + int(caller_stats[2] * 1000000)
+        return {stack: weight for stack, weight in stacks.items() if weight > 0}
+
+    def write_collapsed(self, path):
+        with open(path, "w") as collapsed_file:
+            for stack, weight in sorted(self.collapsed_stacks().items()):
+                collapsed_file.write(f"{stack} {weight}\n")
+
+    def top_functions(self, count=DEFAULT_TOP):
+        """Get list of (function, own time, total time, calls) of count functions with most own time.
+        In sampling mode times are parts of all samples and calls are not known (None)"""
+        functions = []
+        if self.mode == "cprofile":
+            for (filename, line, name), (_, calls, own_time, total_time, _) in \
+                    pstats.Stats(self.profile).stats.items():
+                functions.append((function_label(filename, name, line), own_time, total_time, calls))
+        elif self.mode == "sampling":
+            total_samples = sum(self.samples.values())
+            own_samples = {}
+            total_function_samples = {}
+            for stack, samples in self.samples.items():
+                own_samples[stack[-1]] = own_samples.get(stack[-1], 0) + samples
+                # recursive function is counted once per stack
+                for label in set(stack):
+                    total_function_samples[label] = total_function_samples.get(label, 0) + samples
+            for label, samples in total_function_samples.items():
+                functions.append((label, own_samples.get(label, 0) / total_samples, samples / total_samples, None))
+        functions.sort(key=lambda function: function[1], reverse=True)
+        return functions[:count]
+
+    def allocation_report(self, count=DEFAULT_TOP):
+        """Get (retained size, retained blocks, list of statistics of count source lines which retained most)
+        of memory allocated and not freed during profiling. Memory used by profiler itself is not counted"""
+        profiler_filter = [tracemalloc.Filter(False, __file__), tracemalloc.Filter(False, tracemalloc.__file__)]
+        differences = self.end_snapshot.filter_traces(profiler_filter).compare_to(
+            self.start_snapshot.filter_traces(profiler_filter), "lineno")
+        size = sum(difference.size_diff for difference in differences)
+        blocks = sum(difference.count_diff for difference in differences)
+        return size, blocks, differences[:count]
+
+    def summary(self, count=DEFAULT_TOP, nodes=None):
+        """Get text report: top count functions and retained memory (also per node if number of searched nodes is
+        given)"""
+        lines = []
+        if self.mode == "cprofile":
+            lines.append(f"{'own time':>10} {'total time':>10} {'calls':>10}  function")
+            for label, own_time, total_time, calls in self.top_functions(count):
+                lines.append(f"{own_time:10.3f} {total_time:10.3f} {calls:10}  {label}")
+        elif self.mode == "sampling":
+            lines.append(f"{'own':>7} {'total':>7}  function ({sum(self.samples.values())} samples)")
+            for label, own_part, total_part, _ in self.top_functions(count):
+                lines.append(f"{own_part:7.1%} {total_part:7.1%}  {label}")
+        if self.allocations:
+            size, blocks, differences = self.allocation_report(count)
+            lines.append(f"Retained (allocated and not freed): {size} B in {blocks} blocks, "
+                         f"peak traced memory {self.peak_memory} B")
+            if nodes:
+                lines.append(f"Retained per node: {size / nodes:.2f} B in {blocks / nodes:.3f} blocks ({nodes} nodes)")
+            for difference in differences:
+                frame = difference.traceback[0]
+                lines.append(f"{difference.size_diff:10} B {difference.count_diff:8} blocks  "
+                             f"{os.path.basename(frame.filename)}:{frame.lineno}")
+        return "\n".join(lines)
+
+
+def add_arguments(parser):
+    """Add profiling options to command line tool arguments parser"""
+    group = parser.add_argument_group("profiling")
+    group.add_argument("--profile", choices=MODES, default=None, help="profile run (slows it down)")
+    group.add_argument("--interval", type=float, default=DEFAULT_INTERVAL,
+                       help="time between samples (in seconds) in sampling mode")
+    group.add_argument("--allocations", action="store_true",
+                       help="trace retained and peak memory by tracemalloc")
+    group.add_argument("--top", type=int, default=DEFAULT_TOP, help="number of functions in profile summary")
+    group.add_argument("--profile-output", dest="profile_path", default=None,
+                       help="write profile as collapsed stacks (flame graph input)")
+
+
+def from_arguments(args):
+    """Get Profiler set by command line arguments, None if run is not profiled"""
+    if args.profile is None and not args.allocations:
+        return None
+    return Profiler(args.profile, args.interval, args.allocations)
+
+
+def report(profiler, args, nodes=None):
+    """Print profile summary and write collapsed stacks if command line arguments ask for it"""
+    print(profiler.summary(args.top, nodes))
+    if args.profile_path is not None and profiler.mode is not None:
+        profiler.write_collapsed(args.profile_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile AI search")
+    parser.add_argument("--fen", default=chessboard.START_FEN, help="position to search")
+    parser.add_argument("--depth", type=int, default=5, help="search depth")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="mailbox")
+    add_arguments(parser)
+    parser.set_defaults(profile="sampling")
+    args = parser.parse_args()
+
+    chess_ai = ai.ChessAI(BACKENDS[args.backend].from_fen(args.fen))
+    with from_arguments(args) as profiler:
+        move = chess_ai.ai_move(depth=args.depth)
+    print(f"Move: {chessboard.move_to_str(move) if move is not None else None}, {chess_ai.nodes} nodes")
+    report(profiler, args, chess_ai.nodes)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
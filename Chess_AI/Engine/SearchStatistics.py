@@ -0,0 +1,112 @@
+import time
+
+import Chess_AI.Engine.Chessboard as chessboard
+
+
+class IterationStatistics:
+    """Result of one fully searched depth of iterative deepening"""
+    __slots__ = ("depth", "nodes", "time", "score", "principal_variation")
+
+    def __init__(self, depth, nodes, elapsed_time, score, principal_variation):
+        self.depth = depth
+        # nodes and time spent on this depth only
+        self.nodes = nodes
+        self.time = elapsed_time
+        self.score = score
+        self.principal_variation = principal_variation
+
+    def to_dict(self):
+        return {"depth": self.depth, "nodes": self.nodes, "time": self.time, "score": self.score,
+                "pv": [chessboard.move_to_str(move) for move in self.principal_variation]}
+
+
+class SearchStatistics:
+    """Counters of single search. Passed to ChessAI.ai_move, which fills it - search without statistics object
+    does not count anything beyond nodes. callback (if given) is called with statistics after every fully searched
+    depth"""
+    def __init__(self, callback=None):
+        self.callback = callback
+        # nodes - all searched nodes, quiescence_nodes - part of them searched by quiescence search
+        self.nodes = 0
+        self.quiescence_nodes = 0
+        self.beta_cutoffs = 0
+        # cutoffs caused by first searched move (measure of move ordering quality)
+        self.first_move_cutoffs = 0
+        self.transposition_probes = 0
+        self.transposition_hits = 0
+        self.iterations = []
+        self.start_time = time.perf_counter()
+        self.time = 0.0
+
+    def count_cutoff(self, is_first_move):
+        self.beta_cutoffs += 1
+        if is_first_move:
+            self.first_move_cutoffs += 1
+
+    def count_probe(self, is_hit):
+        self.transposition_probes += 1
+        if is_hit:
+            self.transposition_hits += 1
+
+    def add_iteration(self, depth, nodes, score, principal_variation):
+        """Record fully searched depth. nodes is count of all nodes searched so far"""
+        elapsed_time = time.perf_counter() - self.start_time
+        previous_nodes = sum(iteration.nodes for iteration in self.iterations)
+        previous_time = sum(iteration.time for iteration in self.iterations)
+        self.iterations.append(IterationStatistics(depth, nodes - previous_nodes, elapsed_time - previous_time, score,
+                                                   principal_variation))
+        self.nodes = nodes
+        self.time = elapsed_time
+        if self.callback is not None:
+            self.callback(self)
+
+    def finish(self, nodes):
+        """Record end of search. nodes is count of all searched nodes (including unfinished depth)"""
+        self.nodes = nodes
+        self.time = time.perf_counter() - self.start_time
+
+    @property
+    def nodes_per_second(self):
+        return self.nodes / self.time if self.time > 0 else 0.0
+
+    @property
+    def first_move_cutoff_rate(self):
+        """Part of beta cutoffs caused by first move, None if there were no cutoffs"""
+        return self.first_move_cutoffs / self.beta_cutoffs if self.beta_cutoffs else None
+
+    @property
+    def transposition_hit_rate(self):
+        """Part of transposition table probes that found position, None if table was not probed"""
+        return self.transposition_hits / self.transposition_probes if self.transposition_probes else None
+
+    @property
+    def effective_branching_factor(self):
+        """Ratio of nodes searched by last two depths, None if less than two depths were searched"""
+        if len(self.iterations) < 2 or self.iterations[-2].nodes == 0:
+            return None
+        return self.iterations[-1].nodes / self.iterations[-2].nodes
+
+    def to_dict(self):
+        return {"nodes": self.nodes, "quiescence_nodes": self.quiescence_nodes, "time": self.time,
+                "nps": self.nodes_per_second, "beta_cutoffs": self.beta_cutoffs,
+                "first_move_cutoff_rate": self.first_move_cutoff_rate,
+                "effective_branching_factor": self.effective_branching_factor,
+                "transposition_hit_rate": self.transposition_hit_rate,
+                "iterations": [iteration.to_dict() for iteration in self.iterations]}
+
+    def format_iteration(self):
+        """Get one line description of last fully searched depth"""
+        if not self.iterations:
+            return "no depth searched"
+        iteration = self.iterations[-1]
+        return f"depth {iteration.depth} score {iteration.score} nodes {iteration.nodes} " \
+               f"time {iteration.time:.3f} s pv {' '.join(map(chessboard.move_to_str, iteration.principal_variation))}"
+
+    def __str__(self):
+        def rate(value):
+            return f"{value:.2f}" if value is not None else "-"
+
+        return f"{self.nodes} nodes ({self.quiescence_nodes} quiescence) in {self.time:.3f} s, " \
+               f"{self.nodes_per_second:.0f} nodes/s, depth {self.iterations[-1].depth if self.iterations else 0}, " \
+               f"EBF {rate(self.effective_branching_factor)}, " \
+               f"first move cutoffs {rate(self.first_move_cutoff_rate)}, TT hits {rate(self.transposition_hit_rate)}"
@@ -0,0 +1,64 @@
+class Bound:
+    EXACT, LOWER, UPPER = range(3)
+
+
+class TranspositionEntry:
+    __slots__ = ("key", "depth", "bound", "score", "best_move", "age")
+
+    def __init__(self, key, depth, bound, score, best_move, age):
+        self.key = key
+        self.depth = depth
+        self.bound = bound
+        self.score = score
+        self.best_move = best_move
+        self.age = age
+
+
+class TranspositionTable:
+    """Fixed-size hash table of searched positions indexed by Zobrist key.
+    Every bucket has two slots: depth-preferred slot and always-replace slot"""
+    # approximate size of one slot in bytes (entry object, its fields and list reference)
+    ENTRY_SIZE = 160
+    BUCKET_SIZE = 2
+
+    def __init__(self, size_mb=16):
+        self.buckets_count = max(1, size_mb * 1024 * 1024 // (TranspositionTable.ENTRY_SIZE *
+                                                              TranspositionTable.BUCKET_SIZE))
+        self.entries = [None] * (self.buckets_count * TranspositionTable.BUCKET_SIZE)
+        self.age = 0
+
+    def clear(self):
+        """Remove all entries"""
+        self.entries = [None] * (self.buckets_count * TranspositionTable.BUCKET_SIZE)
+        self.age = 0
+
+    def new_search(self):
+        """Mark entries stored so far as coming from previous search. They are replaced first"""
+        self.age += 1
+
+    def probe(self, key):
+        """Get entry of position with given key. If there is no such entry returns None"""
+        index = (key % self.buckets_count) * TranspositionTable.BUCKET_SIZE
+        entry = self.entries[index]
+        if entry is not None and entry.key == key:
+            return entry
+        entry = self.entries[index + 1]
+        if entry is not None and entry.key == key:
+            return entry
+        return None
+
+    def store(self, key, depth, bound, score, best_move):
+        """Store search result of position with given key"""
+        index = (key % self.buckets_count) * TranspositionTable.BUCKET_SIZE
+        entry = self.entries[index]
+        if entry is None or depth >= entry.depth or entry.age != self.age:
+            if best_move is None and entry is not None and entry.key == key:
+                best_move = entry.best_move
+            self.entries[index] = TranspositionEntry(key, depth, bound, score, best_move, self.age)
+        else:
+            self.entries[index + 1] = TranspositionEntry(key, depth, bound, score, best_move, self.age)
+
+    def get_best_move(self, key):
+        """Get best move stored for position with given key. If there is no such move returns None"""
+        entry = self.probe(key)
+        return entry.best_move if entry is not None else None
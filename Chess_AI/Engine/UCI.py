@@ -0,0 +1,276 @@
+"""UCI (Universal Chess Interface) front end - lets chess GUIs and tournament managers run the engine without
+pygame. Commands are read from standard input while search runs in background thread, so stop is handled mid-search.
+
+Usage: python -m Chess_AI.Engine.UCI [--backend mailbox|bitboard]"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+import Chess_AI.Engine.Chessboard as chessboard
+import Chess_AI.Engine.Bitboard as bitboard
+import Chess_AI.Engine.AI as ai
+import Chess_AI.Engine.ParallelSearch as parallel
+
+BACKENDS = {"mailbox": chessboard.ChessboardState, "bitboard": bitboard.BitboardState}
+
+ENGINE_NAME = "Chess_AI"
+ENGINE_AUTHOR = "Chess_AI_agh_2021 authors"
+# depth searched by go infinite (and go without limits) until stop
+MAX_DEPTH = 64
+DEFAULT_HASH_MB = 16
+MAX_HASH_MB = 1024
+# expected number of moves to play when time control does not tell it (movestogo)
+DEFAULT_MOVES_TO_GO = 30
+# time (in milliseconds) kept for communication overhead
+MOVE_OVERHEAD_MS = 50
+
+
+def parse_go_arguments(tokens):
+    """Get dict of go command arguments: infinite, ponder (True/False) and other given values (int)"""
+    arguments = {"infinite": False, "ponder": False}
+    index = 0
+    while index < len(tokens):
+        token = tokens[index]
+        if token in ("infinite", "ponder"):
+            arguments[token] = True
+        elif token in ("depth", "movetime", "wtime", "btime", "winc", "binc", "movestogo", "nodes", "mate") and \
+                index + 1 < len(tokens):
+            arguments[token] = int(tokens[index + 1])
+            index += 1
+        index += 1
+    return arguments
+
+
+def get_time_limit(arguments, white_to_move):
+    """Get search time limit (in seconds) from go command arguments. None if search is not limited by time"""
+    if "movetime" in arguments:
+        return max(arguments["movetime"] - MOVE_OVERHEAD_MS, 1) / 1000
+    remaining = arguments.get("wtime" if white_to_move else "btime")
+    if remaining is None:
+        return None
+    increment = arguments.get("winc" if white_to_move else "binc", 0)
+    moves_to_go = arguments.get("movestogo", DEFAULT_MOVES_TO_GO)
+    time_limit = remaining / moves_to_go + increment * 3 // 4
+    # single move never uses more than third of remaining time
+    time_limit = min(time_limit, remaining // 3) - MOVE_OVERHEAD_MS
+    return max(time_limit, 1) / 1000
+
+
+def format_score(score):
+    """Get UCI score string. Mate score tells distance to mate in plies, UCI mate is counted in moves"""
+    if score > ai.MATE_BOUND:
+        return f"mate {(ai.MATE_SCORE - score + 1) // 2}"
+    if score < -ai.MATE_BOUND:
+        return f"mate -{(ai.MATE_SCORE + score) // 2}"
+    return f"cp {score}"
+
+
+class UCIEngine:
+    """Handles UCI commands. Search runs in background thread, only one search runs at once"""
+    def __init__(self, backend, output=sys.stdout):
+        self.backend = backend
+        self.output = output
+        self.output_lock = threading.Lock()
+        self.board_state = backend()
+        self.hash_size_mb = DEFAULT_HASH_MB
+        self.threads = 1
+        self.chess_ai = None
+        self.parallel_ai = None
+        self.search_thread = None
+        self.searching_ai = None
+        # ai_move of current search returned, so it must not be stopped (stop would apply to next search)
+        self.search_finished = False
+        self.search_lock = threading.Lock()
+        # set when search may send bestmove (go infinite and pondering wait for stop or ponderhit)
+        self.bestmove_allowed = threading.Event()
+
+    def send(self, line):
+        with self.output_lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def get_ai(self, ponder, node_limit=None):
+        """Get AI for next search. Parallel search is used if more threads are set. It can not ponder or count nodes
+        of workers during search, so go ponder (and the search continued by ponderhit) and go nodes run in single
+        thread"""
+        if self.threads > 1 and not ponder and node_limit is None:
+            if self.parallel_ai is None:
+                self.parallel_ai = parallel.ParallelChessAI(self.board_state, self.threads, self.hash_size_mb)
+            self.parallel_ai.set_board_state(self.board_state)
+            return self.parallel_ai
+        if self.chess_ai is None:
+            self.chess_ai = ai.ChessAI(self.board_state, self.hash_size_mb)
+        self.chess_ai.set_board_state(self.board_state)
+        return self.chess_ai
+
+    def close_parallel_ai(self):
+        if self.parallel_ai is not None:
+            self.parallel_ai.close()
+            self.parallel_ai = None
+
+    def handle(self, line):
+        """Handle single command line. Returns False if engine should quit"""
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, arguments = tokens[0], tokens[1:]
+        if command == "quit":
+            self.stop_search()
+            self.close_parallel_ai()
+            return False
+        handler = getattr(self, "command_" + command, None)
+        if handler is not None:
+            try:
+                handler(arguments)
+            except (ValueError, IndexError, KeyError) as error:
+                # malformed command is ignored, engine has to keep running
+                self.send(f"info string invalid command {line.strip()}: {error}")
+        else:
+            self.send(f"info string unknown command {command}")
+        return True
+
+    def command_uci(self, arguments):
+        self.send(f"id name {ENGINE_NAME}")
+        self.send(f"id author {ENGINE_AUTHOR}")
+        self.send(f"option name Hash type spin default {DEFAULT_HASH_MB} min 1 max {MAX_HASH_MB}")
+        self.send(f"option name Threads type spin default 1 min 1 max {os.cpu_count() or 1}")
+        self.send("option name Ponder type check default true")
+        self.send("uciok")
+
+    def command_isready(self, arguments):
+        self.send("readyok")
+
+    def command_setoption(self, arguments):
+        # setoption name <name> [value <value>], name can contain spaces
+        if "name" not in arguments:
+            return
+        value_index = arguments.index("value") if "value" in arguments else len(arguments)
+        name = " ".join(arguments[arguments.index("name") + 1:value_index]).lower()
+        value = " ".join(arguments[value_index + 1:])
+        self.stop_search()
+        if name == "hash":
+            self.hash_size_mb = min(max(int(value), 1), MAX_HASH_MB)
+            self.chess_ai = None
+            self.close_parallel_ai()
+        elif name == "threads":
+            self.threads = max(int(value), 1)
+            self.close_parallel_ai()
+
+    def command_ucinewgame(self, arguments):
+        self.stop_search()
+        # forget transposition tables and move ordering data of previous game
+        self.chess_ai = None
+        self.close_parallel_ai()
+
+    def command_position(self, arguments):
+        self.stop_search()
+        if arguments[:1] == ["startpos"]:
+            board_state = self.backend()
+            moves_index = 1
+        elif arguments[:1] == ["fen"]:
+            moves_index = arguments.index("moves") if "moves" in arguments else len(arguments)
+            board_state = self.backend.from_fen(" ".join(arguments[1:moves_index]))
+        else:
+            return
+        for move_str in arguments[moves_index + 1:]:
+            move = next((move for move in board_state.legal_moves() if chessboard.move_to_str(move) == move_str),
+                        None)
+            if move is None:
+                self.send(f"info string illegal move {move_str}")
+                break
+            board_state.make_move(move)
+        self.board_state = board_state
+
+    def command_go(self, arguments):
+        self.stop_search()
+        arguments = parse_go_arguments(arguments)
+        ponder = arguments["ponder"]
+        time_limit = None if arguments["infinite"] else get_time_limit(arguments, self.board_state.white_to_move)
+        max_depth = arguments.get("depth", MAX_DEPTH)
+        node_limit = arguments.get("nodes")
+        if "mate" in arguments:
+            self.send("info string go mate is not supported, searching without it")
+        if arguments["infinite"] or ponder:
+            self.bestmove_allowed.clear()
+        else:
+            self.bestmove_allowed.set()
+        chess_ai = self.get_ai(ponder, node_limit)
+        chess_ai.info_callback = self.send_info
+        search_kwargs = {"depth": max_depth, "time_limit": time_limit}
+        if ponder:
+            search_kwargs["ponder"] = True
+        if node_limit is not None:
+            search_kwargs["node_limit"] = node_limit
+        self.searching_ai = chess_ai
+        self.search_finished = False
+        self.search_thread = threading.Thread(target=self.search, args=(chess_ai, search_kwargs), daemon=True)
+        self.search_thread.start()
+
+    def search(self, chess_ai, search_kwargs):
+        """Run search and send its best move (in search thread)"""
+        move = chess_ai.ai_move(**search_kwargs)
+        with self.search_lock:
+            self.search_finished = True
+            # forget stop requested after ai_move cleared its flag, but before search was marked as finished
+            chess_ai.stop_requested = False
+        # go infinite and ponder searches can finish early (for example with only one legal move), but bestmove
+        # must not be sent before stop or ponderhit
+        self.bestmove_allowed.wait()
+        if move is None:
+            self.send("bestmove 0000")
+        elif chess_ai.ponder_move is not None:
+            self.send(f"bestmove {chessboard.move_to_str(move)} ponder {chessboard.move_to_str(chess_ai.ponder_move)}")
+        else:
+            self.send(f"bestmove {chessboard.move_to_str(move)}")
+
+    def send_info(self, chess_ai):
+        """Send info line about fully searched depth (in search thread)"""
+        elapsed_time = time.perf_counter() - chess_ai.search_start_time
+        variation = chess_ai.principal_variation()
+        nps = int(chess_ai.nodes / elapsed_time) if elapsed_time > 0 else 0
+        self.send(f"info depth {chess_ai.search_depth} score {format_score(chess_ai.best_score)} "
+                  f"nodes {chess_ai.nodes} nps {nps} time {int(elapsed_time * 1000)} "
+                  f"pv {' '.join(chessboard.move_to_str(move) for move in variation)}")
+
+    def command_stop(self, arguments):
+        self.stop_search()
+
+    def command_ponderhit(self, arguments):
+        if self.searching_ai is not None and self.search_thread.is_alive():
+            # opponent played expected move, search continues with normal time limit
+            self.searching_ai.ponderhit()
+            self.bestmove_allowed.set()
+
+    def stop_search(self):
+        """Stop running search and wait until it sends its best move"""
+        if self.search_thread is None:
+            return
+        with self.search_lock:
+            if not self.search_finished:
+                self.searching_ai.stop()
+        self.bestmove_allowed.set()
+        self.search_thread.join()
+        self.search_thread = None
+        self.searching_ai = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="UCI chess engine")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="mailbox")
+    args = parser.parse_args()
+
+    engine = UCIEngine(BACKENDS[args.backend])
+    for line in sys.stdin:
+        if not engine.handle(line):
+            break
+    else:
+        engine.stop_search()
+        engine.close_parallel_ai()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
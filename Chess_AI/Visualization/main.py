@@ -1,10 +1,14 @@
 """Main driver file - visualization and user interaction"""
 
+import os
 import pygame as p
 import threading
+import time
 
 import Chess_AI.Engine.Chessboard as chessboard
+import Chess_AI.Engine.Bitboard as bitboard
 import Chess_AI.Engine.AI as ai
+import Chess_AI.Engine.SearchStatistics as statistics
 
 """Global variables/constants concerning visualization"""
 
@@ -12,12 +16,27 @@ import Chess_AI.Engine.AI as ai
 CHESSBOARD_WIDTH, CHESSBOARD_HEIGHT = 512, 512
 BORDER_WIDTH = 32
 
+# Scaled piece images and fonts, created once when game starts
 PIECES = {}
+FONTS = {}
+PIECES_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pieces")
 WIDTH, HEIGHT = CHESSBOARD_WIDTH + BORDER_WIDTH, CHESSBOARD_HEIGHT + BORDER_WIDTH
-SCREEN = p.display.set_mode((WIDTH, HEIGHT))
+# Display surface, created by main, so importing this module does not open window
+SCREEN = None
 SQUARE_SIZE = CHESSBOARD_HEIGHT // 8
 FPS = 12
 
+# Position representation used by game and AI: chessboard.ChessboardState or bitboard.BitboardState
+CHESSBOARD_BACKEND = chessboard.ChessboardState
+
+# AI thinking time per move (in seconds) and maximal search depth
+AI_TIME_LIMIT = 5
+AI_MAX_DEPTH = 10
+# AI searches position after expected player's move while player is thinking
+AI_PONDER = True
+# collect and print search statistics (nodes, cutoffs, transposition table hits...) after every AI move
+AI_STATISTICS = False
+
 BUTTON_WIDTH, BUTTON_HEIGHT = WIDTH // 3, HEIGHT // 8
 BUTTONS_X = (WIDTH // 2 - BUTTON_WIDTH // 2, WIDTH // 2 + BUTTON_WIDTH // 2)
 BUTTON_1_Y = (HEIGHT // 8 - BUTTON_HEIGHT // 2, HEIGHT // 8 + BUTTON_HEIGHT // 2)
@@ -46,6 +65,9 @@ COLOR_CHECK = p.Color((200, 40, 65))
 COLOR_STALEMATE = p.Color((50, 180, 57))
 COLOR_BORDER = p.Color(173, 116, 59)
 
+# Square highlights (king highlights are chessboard.GameState values)
+HIGHLIGHT_SELECTED, HIGHLIGHT_MOVE = "selected", "move"
+
 BOARD_RANKS = ['1', '2', '3', '4', '5', '6', '7', '8']
 BOARD_FILES = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H']
 
@@ -67,12 +89,86 @@ class ThreadAI(threading.Thread):
         return self._return
 
 
+class AISearch:
+    """AI search of next move running in background thread. AI searches its own copy of position,
+    so game position can be drawn (and changed) during search. If ponder_move is given, AI searches (ponders)
+    position after this expected player's move"""
+    def __init__(self, chess_ai, chessboard_state, ponder_move=None):
+        self.chess_ai = chess_ai
+        self.ponder_move = ponder_move
+        search_state = type(chessboard_state).from_snapshot(chessboard_state.to_snapshot(),
+                                                             chessboard_state.position_counts)
+        if ponder_move is not None:
+            search_state.make_move(ponder_move)
+        chess_ai.set_board_state(search_state)
+        self.statistics = statistics.SearchStatistics() if AI_STATISTICS else None
+        # ai_move returned, so search must not be stopped (stop would apply to next search of the same AI)
+        self.search_finished = False
+        self.search_lock = threading.Lock()
+        self.thread = ThreadAI(target=self.search,
+                               kwargs={"time_limit": AI_TIME_LIMIT, "max_depth": AI_MAX_DEPTH,
+                                       "ponder": ponder_move is not None, "statistics": self.statistics})
+        self.thread.daemon = True
+        self.thread.start()
+
+    def search(self, **search_kwargs):
+        """Run search (in search thread)"""
+        move = self.chess_ai.ai_move(**search_kwargs)
+        with self.search_lock:
+            self.search_finished = True
+            # forget stop requested after ai_move cleared its flag, but before search was marked as finished
+            self.chess_ai.stop_requested = False
+        return move
+
+    def stop(self):
+        with self.search_lock:
+            if not self.search_finished:
+                self.chess_ai.stop()
+
+    def is_finished(self):
+        return not self.thread.is_alive()
+
+    def is_pondering(self):
+        return self.ponder_move is not None
+
+    def ponderhit(self):
+        """Player made expected move - pondering search continues as normal search. Time spent pondering is
+        counted, so AI moves at once if it has already searched for AI_TIME_LIMIT"""
+        self.ponder_move = None
+        self.chess_ai.ponderhit(keep_elapsed=True)
+
+    def result(self):
+        """Get found move. Search has to be finished"""
+        return self.thread.join()
+
+    def move_now(self):
+        """Make AI return best move found so far"""
+        self.stop()
+
+    def cancel(self):
+        """Stop search and wait for it to end. Found move is discarded"""
+        self.stop()
+        self.thread.join()
+
+    def info(self):
+        """Get search progress description: depth, best move and speed"""
+        elapsed_time = time.perf_counter() - self.chess_ai.search_start_time if self.chess_ai.search_start_time \
+            else 0
+        nps = self.chess_ai.nodes / elapsed_time if elapsed_time > 0 else 0
+        best_move = self.chess_ai.best_move
+        best_move_str = get_move_str(best_move) if best_move is not None else "-"
+        return f"depth {self.chess_ai.search_depth}, best {best_move_str}, {nps:.0f} nodes/s"
+
+
 def main():
+    global SCREEN
     p.init()
+    SCREEN = p.display.set_mode((WIDTH, HEIGHT))
     p.display.set_caption("Chess")
     clock = p.time.Clock()
     SCREEN.fill(COLOR_DARK)
     load_pieces()
+    board_view = BoardView()
     running = True
     quit_after_loop = False
     selected_tile = None
@@ -81,14 +177,16 @@ def main():
     tiles_clicked_on = []
     king_pos = None
     player_is_white = True
-    first_white_ai_move_made = False
     view_promotion_box = False
     promotion_choice = None
     view_ending_box = False
     white_won = None
     end_state = None
 
-    chessboard_state = chessboard.ChessboardState()
+    chessboard_state = CHESSBOARD_BACKEND()
+    chess_ai = ai.ChessAI(chessboard_state)
+    # AISearch of running AI search, None if AI is not thinking
+    ai_search = None
     play_against_ai = False
 
     def reset_move_attempt():
@@ -101,11 +199,15 @@ def main():
 
     def init_game(is_fist_init):
         nonlocal running, quit_after_loop, play_against_ai, position, view_ending_box, white_won, player_is_white, \
-            view_promotion_box, promotion_choice, chessboard_state, first_white_ai_move_made, selected_tile, end_state
+            view_promotion_box, promotion_choice, chessboard_state, chess_ai, selected_tile, end_state
+        cancel_ai_move()
+        drawn_player_is_white = None
         while running:
             clock.tick(FPS)
             for e in p.event.get():
-                if e.type == p.QUIT:
+                if e.type == p.VIDEOEXPOSE:
+                    drawn_player_is_white = None
+                elif e.type == p.QUIT:
                     quit_after_loop = True
                     running = False
                 elif e.type == p.MOUSEBUTTONDOWN:
@@ -124,8 +226,10 @@ def main():
                             elif BUTTON_4_Y[0] <= position[1] <= BUTTON_4_Y[1]:
                                 quit_after_loop = True
                                 running = False
-            draw_init_window(player_is_white)
-            p.display.flip()
+            if player_is_white != drawn_player_is_white:
+                draw_init_window(player_is_white)
+                p.display.flip()
+                drawn_player_is_white = player_is_white
 
         if quit_after_loop and is_fist_init:
             p.quit()
@@ -134,54 +238,86 @@ def main():
         else:
             running = True
             SCREEN.fill(COLOR_DARK)
-            first_white_ai_move_made = False
             selected_tile = None
             view_ending_box = False
             view_promotion_box = False
             promotion_choice = None
             white_won = None
             end_state = None
-            chessboard_state = chessboard.ChessboardState()
-
-    def make_ai_move():
-        nonlocal chessboard_state, king_pos, view_ending_box, white_won, end_state
-
-        ai_thread = ThreadAI(target=ai.ChessAI(chessboard_state).ai_move, args=(3,))
-        ai_thread.start()
-
-        while ai_thread.is_alive():
-            clock.tick(FPS)
-
-        ai_move = ai_thread.join()
+            board_view.invalidate()
+            chessboard_state = CHESSBOARD_BACKEND()
+            chess_ai = ai.ChessAI(chessboard_state)
+
+    def start_ai_move(ponder_move=None):
+        nonlocal ai_search
+        ai_search = AISearch(chess_ai, chessboard_state, ponder_move)
+
+    def check_ponder_move(move):
+        """Continue pondering search if player made expected move, otherwise stop it"""
+        if ai_search is not None and ai_search.is_pondering():
+            if move == ai_search.ponder_move:
+                print("[AISearch]: Expected move played")
+                ai_search.ponderhit()
+            else:
+                cancel_ai_move()
+
+    def cancel_ai_move():
+        """Stop AI search (if AI is thinking) without making move"""
+        nonlocal ai_search
+        if ai_search is not None:
+            ai_search.cancel()
+            ai_search = None
+            p.display.set_caption("Chess")
+
+    def finish_ai_move():
+        nonlocal chessboard_state, king_pos, view_ending_box, white_won, end_state, ai_search
+
+        ai_move = ai_search.result()
+        print(f"[AISearch]: {ai_search.info()}")
+        if ai_search.statistics is not None:
+            print(f"[AIStatistics]: {ai_search.statistics}")
+        ai_search = None
+        p.display.set_caption("Chess")
 
         if ai_move is None:
             return
-        chessboard_state.board[ai_move[0][0]][ai_move[0][1]].move(ai_move[1])
-        king_pos = chessboard_state.white_king.position if chessboard_state.white_to_move \
-            else chessboard_state.black_king.position
-        draw_chessboard_state(chessboard_state, selected_tile, possible_moves, king_pos, view_promotion_box=False)
-        p.display.flip()
-
-        print(f"[AIMove]: {get_tile_str(ai_move[0])} --> {get_tile_str(ai_move[1])}")
-        if chessboard_state.game_state() == chessboard.GameState.CHECK:
+        chessboard_state.make_move(ai_move)
+        king_pos = square_to_tile(chessboard_state.get_king_square())
+
+        print(f"[AIMove]: {get_move_str(ai_move)}")
+        game_state = chessboard_state.game_state()
+        if game_state == chessboard.GameState.CHECK:
             print("[GameState]: Check")
-        elif chessboard_state.game_state() == chessboard.GameState.CHECKMATE:
+        elif game_state == chessboard.GameState.CHECKMATE:
             print("[GameState]: Checkmate")
             view_ending_box = True
             white_won = not chessboard_state.white_to_move
             end_state = chessboard.GameState.CHECKMATE
-        elif chessboard_state.game_state() == chessboard.GameState.STALEMATE:
+        elif game_state == chessboard.GameState.STALEMATE:
             print("[GameState]: Stalemate")
             view_ending_box = True
             white_won = None
             end_state = chessboard.GameState.STALEMATE
-        elif chessboard_state.game_state() == chessboard.GameState.CONTINUE:
+        elif game_state == chessboard.GameState.CONTINUE:
             print("[GameState]: Continue")
-        elif chessboard_state.game_state() == chessboard.GameState.INSUFFICIENT_MATERIAL:
+        elif game_state == chessboard.GameState.INSUFFICIENT_MATERIAL:
             print("[GameState]: Insufficient material")
             view_ending_box = True
             white_won = None
             end_state = chessboard.GameState.INSUFFICIENT_MATERIAL
+        elif game_state == chessboard.GameState.THREEFOLD_REPETITION:
+            print("[GameState]: Threefold repetition")
+            view_ending_box = True
+            white_won = None
+            end_state = chessboard.GameState.THREEFOLD_REPETITION
+        elif game_state == chessboard.GameState.FIFTY_MOVE_RULE:
+            print("[GameState]: Fifty-move rule")
+            view_ending_box = True
+            white_won = None
+            end_state = chessboard.GameState.FIFTY_MOVE_RULE
+
+        if AI_PONDER and not view_ending_box and chess_ai.ponder_move is not None:
+            start_ai_move(chess_ai.ponder_move)
 
     # Initial window
     init_game(True)
@@ -193,15 +329,17 @@ def main():
             if event.type == p.QUIT:
                 running = False
 
+            elif event.type == p.VIDEOEXPOSE:
+                board_view.invalidate()
+
             elif event.type == p.KEYDOWN:
                 if event.key == p.K_ESCAPE:
                     print("------------")
                     print("Go back to the menu")
                     init_game(False)
-
-            if play_against_ai and not player_is_white and not first_white_ai_move_made:
-                make_ai_move()
-                first_white_ai_move_made = True
+                elif event.key == p.K_SPACE and ai_search is not None and not ai_search.is_pondering():
+                    print("[AISearch]: Move now")
+                    ai_search.move_now()
 
             elif event.type == p.MOUSEBUTTONDOWN:
                 position = p.mouse.get_pos()
@@ -214,10 +352,17 @@ def main():
                 elif not view_ending_box and not view_promotion_box and event.button == 2:
                     reset_move_attempt()
                     # Undo move
-                    if play_against_ai:
-                        if (chessboard_state.game_state() == chessboard.GameState.CHECKMATE or
-                                chessboard_state.game_state() == chessboard.GameState.STALEMATE or
-                                chessboard_state.game_state() == chessboard.GameState.INSUFFICIENT_MATERIAL) and \
+                    if play_against_ai and ai_search is not None and not ai_search.is_pondering():
+                        # take back player's move which AI is answering
+                        cancel_ai_move()
+                        chessboard_state.undo_move()
+                    elif play_against_ai:
+                        cancel_ai_move()
+                        if chessboard_state.game_state() in (chessboard.GameState.CHECKMATE,
+                                                             chessboard.GameState.STALEMATE,
+                                                             chessboard.GameState.INSUFFICIENT_MATERIAL,
+                                                             chessboard.GameState.THREEFOLD_REPETITION,
+                                                             chessboard.GameState.FIFTY_MOVE_RULE) and \
                                 player_is_white != chessboard_state.white_to_move:
                             chessboard_state.undo_move()
                         else:
@@ -225,8 +370,7 @@ def main():
                             chessboard_state.undo_move()
                     else:
                         chessboard_state.undo_move()
-                    king_pos = chessboard_state.white_king.position if chessboard_state.white_to_move \
-                        else chessboard_state.black_king.position
+                    king_pos = square_to_tile(chessboard_state.get_king_square())
 
                 # Promotion choice left click
                 if view_promotion_box:
@@ -238,22 +382,22 @@ def main():
                             top_left_coords[1] <= position[1] <= bottom_left_coords[1]:
 
                         if top_left_coords[1] <= position[1] <= top_left_coords[1] + SQUARE_SIZE:
-                            promotion_choice = chessboard.Queen
+                            promotion_choice = chessboard.PieceType.QUEEN
                         elif top_left_coords[1] + SQUARE_SIZE <= position[1] <= top_left_coords[1] + 2 * SQUARE_SIZE:
-                            promotion_choice = chessboard.Knight
+                            promotion_choice = chessboard.PieceType.KNIGHT
                         elif top_left_coords[1] + 2 * SQUARE_SIZE <= position[1] \
                                 <= top_left_coords[1] + 3 * SQUARE_SIZE:
-                            promotion_choice = chessboard.Rook
+                            promotion_choice = chessboard.PieceType.ROOK
                         elif top_left_coords[1] + 3 * SQUARE_SIZE <= position[1] <= bottom_left_coords[1]:
-                            promotion_choice = chessboard.Bishop
+                            promotion_choice = chessboard.PieceType.BISHOP
                         else:
-                            promotion_choice = chessboard.Queen
+                            promotion_choice = chessboard.PieceType.QUEEN
 
-                        chessboard_state.board[tiles_clicked_on[0][0]][tiles_clicked_on[0][1]] \
-                            .move(tiles_clicked_on[1], promotion_choice=promotion_choice)
+                        move = get_move(chessboard_state, tiles_clicked_on[0], tiles_clicked_on[1], promotion_choice)
+                        chessboard_state.make_move(move)
+                        check_ponder_move(move)
 
-                        king_pos = chessboard_state.white_king.position if chessboard_state.white_to_move \
-                            else chessboard_state.black_king.position
+                        king_pos = square_to_tile(chessboard_state.get_king_square())
 
                         view_promotion_box = False
                         reset_move_attempt()
@@ -273,6 +417,7 @@ def main():
 
                 # Left click
                 if not view_ending_box and not view_promotion_box and event.button == 1 and \
+                        (ai_search is None or ai_search.is_pondering()) and \
                         position[0] <= CHESSBOARD_WIDTH and position[1] <= CHESSBOARD_HEIGHT:
                     mouse_row = position[1] // SQUARE_SIZE
                     mouse_col = position[0] // SQUARE_SIZE
@@ -287,9 +432,9 @@ def main():
 
                         # First position selected v1
                         if len(tiles_clicked_on) == 1:
-                            selected_piece = chessboard_state.board[mouse_row][mouse_col]
+                            selected_piece = chessboard_state.get_piece(tile_to_square(selected_tile))
                             if selected_piece is not None:
-                                possible_moves = get_legal_moves_list(selected_piece)
+                                possible_moves = get_legal_moves_list(chessboard_state, selected_tile)
                                 print_possible_moves(possible_moves)
                                 if possible_moves is None:
                                     reset_move_attempt()
@@ -299,153 +444,214 @@ def main():
                         # Second position selected
                         elif len(tiles_clicked_on) == 2:
                             if selected_tile in possible_moves:
-                                if isinstance(selected_piece, chessboard.Pawn) and selected_tile[0] in [0, 7]:
+                                if selected_piece.type == chessboard.PieceType.PAWN and selected_tile[0] in [0, 7]:
                                     # View promotion box
                                     view_promotion_box = True
                                 else:
-                                    chessboard_state.board[tiles_clicked_on[0][0]][tiles_clicked_on[0][1]] \
-                                        .move(tiles_clicked_on[1])
+                                    move = get_move(chessboard_state, tiles_clicked_on[0], tiles_clicked_on[1])
+                                    chessboard_state.make_move(move)
+                                    check_ponder_move(move)
 
-                                king_pos = chessboard_state.white_king.position if chessboard_state.white_to_move \
-                                    else chessboard_state.black_king.position
+                                king_pos = square_to_tile(chessboard_state.get_king_square())
 
                                 if not view_promotion_box:
                                     print(f"[HumanMove]: {get_tile_str(tiles_clicked_on[0])} -->"
                                           f" {get_tile_str(tiles_clicked_on[1])}")
-                                    if chessboard_state.game_state() == chessboard.GameState.CHECK:
+                                    game_state = chessboard_state.game_state()
+                                    if game_state == chessboard.GameState.CHECK:
                                         print("[GameState]: Check")
-                                    elif chessboard_state.game_state() == chessboard.GameState.CHECKMATE:
+                                    elif game_state == chessboard.GameState.CHECKMATE:
                                         print("[GameState]: Checkmate")
                                         view_ending_box = True
                                         white_won = not chessboard_state.white_to_move
                                         end_state = chessboard.GameState.CHECKMATE
-                                    elif chessboard_state.game_state() == chessboard.GameState.STALEMATE:
+                                    elif game_state == chessboard.GameState.STALEMATE:
                                         print("[GameState]: Stalemate")
                                         view_ending_box = True
                                         white_won = None
                                         end_state = chessboard.GameState.STALEMATE
-                                    elif chessboard_state.game_state() == chessboard.GameState.CONTINUE:
+                                    elif game_state == chessboard.GameState.CONTINUE:
                                         print("[GameState]: Continue")
-                                    elif chessboard_state.game_state() == chessboard.GameState.INSUFFICIENT_MATERIAL:
+                                    elif game_state == chessboard.GameState.INSUFFICIENT_MATERIAL:
                                         print("[GameState]: Insufficient material")
                                         view_ending_box = True
                                         white_won = None
                                         end_state = chessboard.GameState.INSUFFICIENT_MATERIAL
+                                    elif game_state == chessboard.GameState.THREEFOLD_REPETITION:
+                                        print("[GameState]: Threefold repetition")
+                                        view_ending_box = True
+                                        white_won = None
+                                        end_state = chessboard.GameState.THREEFOLD_REPETITION
+                                    elif game_state == chessboard.GameState.FIFTY_MOVE_RULE:
+                                        print("[GameState]: Fifty-move rule")
+                                        view_ending_box = True
+                                        white_won = None
+                                        end_state = chessboard.GameState.FIFTY_MOVE_RULE
                                     reset_move_attempt()
                             # First position selected v2
                             else:
                                 tiles_clicked_on = [selected_tile]
-                                selected_piece = chessboard_state.board[mouse_row][mouse_col]
+                                selected_piece = chessboard_state.get_piece(tile_to_square(selected_tile))
                                 if selected_piece is not None:
-                                    possible_moves = get_legal_moves_list(selected_piece)
+                                    possible_moves = get_legal_moves_list(chessboard_state, selected_tile)
                                     print_possible_moves(possible_moves)
                                     if possible_moves is None:
                                         reset_move_attempt()
                                 else:
                                     reset_move_attempt()
 
-        draw_chessboard_state(chessboard_state, selected_tile, possible_moves, king_pos, view_promotion_box)
-        if view_promotion_box:
-            draw_promotion_choice(selected_tile, white_move=chessboard_state.white_to_move)
-        if view_ending_box:
-            draw_game_ending(end_state, white_won)
-        p.display.flip()
+        if running:
+            board_view.draw(chessboard_state, selected_tile, possible_moves, king_pos, view_promotion_box,
+                            (end_state, white_won) if view_ending_box else None)
+
+        if ai_search is not None and ai_search.is_pondering():
+            p.display.set_caption(f"Chess - AI pondering: {ai_search.info()}")
+        elif ai_search is not None:
+            if ai_search.is_finished():
+                finish_ai_move()
+            else:
+                p.display.set_caption(f"Chess - AI thinking: {ai_search.info()} (Space - move now)")
+        elif running and play_against_ai and player_is_white != chessboard_state.white_to_move and \
+                chessboard_state.game_state() in (chessboard.GameState.CONTINUE, chessboard.GameState.CHECK):
+            start_ai_move()
 
-        if play_against_ai and (player_is_white != chessboard_state.white_to_move):
-            make_ai_move()
+    cancel_ai_move()
 
 
 # Allow accessing a piece's image by PIECE['c#'], where c - color, # - abr. piece's name
 def load_pieces():
-    """Load piece's images from "pieces" folder"""
+    """Load piece's images from "pieces" folder of the package and scale them to square size. Images are loaded
+    only once"""
     pieces = ['bB', 'bK', 'bN', 'bP', 'bQ', 'bR', 'wB', 'wK', 'wN', 'wP', 'wQ', 'wR']
     for piece in pieces:
-        PIECES[piece] = p.transform.scale(p.image.load("../pieces/" + piece + ".png"), (SQUARE_SIZE, SQUARE_SIZE))
+        if piece not in PIECES:
+            image = p.image.load(os.path.join(PIECES_DIRECTORY, piece + ".png"))
+            PIECES[piece] = p.transform.scale(image, (SQUARE_SIZE, SQUARE_SIZE)).convert_alpha()
 
 
-def draw_chessboard_state(chessboard_state, selected_tile, possible_moves, king_pos, view_promotion_box):
-    """Draw the game"""
-    draw_chessboard()
-    if king_pos is not None:
-        highlight_king(chessboard_state, king_pos)
-    if not view_promotion_box:
-        highlight_possible_moves(selected_tile, possible_moves, chessboard_state)
-    draw_pieces(chessboard_state)
+def get_font(size):
+    """Get monospace font of given size. Fonts are created once"""
+    if size not in FONTS:
+        FONTS[size] = p.font.SysFont("monospace", size)
+    return FONTS[size]
 
 
-def draw_chessboard():
-    """Draw the tiles on the board along with the border describing ranks and files"""
+def render_chessboard():
+    """Render the tiles on the board along with the border describing ranks and files to new surface"""
+    surface = p.Surface((WIDTH, HEIGHT))
+    surface.fill(COLOR_DARK)
     for row in range(8):
         for col in range(8):
-            p.draw.rect(SCREEN, get_tile_color(row, col),
+            p.draw.rect(surface, get_tile_color(row, col),
                         p.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
 
-    p.draw.line(SCREEN, COLOR_BORDER, (8 * SQUARE_SIZE, 0), (8 * SQUARE_SIZE, 8 * SQUARE_SIZE), width=3)
-    p.draw.line(SCREEN, COLOR_BORDER, (0, 8 * SQUARE_SIZE), (8 * SQUARE_SIZE, 8 * SQUARE_SIZE), width=3)
-    font = p.font.SysFont("monospace", 24)
+    p.draw.line(surface, COLOR_BORDER, (8 * SQUARE_SIZE, 0), (8 * SQUARE_SIZE, 8 * SQUARE_SIZE), width=3)
+    p.draw.line(surface, COLOR_BORDER, (0, 8 * SQUARE_SIZE), (8 * SQUARE_SIZE, 8 * SQUARE_SIZE), width=3)
+    font = get_font(24)
     for row in range(8):
         label = font.render(get_rank(row), True, COLOR_LIGHT)
-        SCREEN.blit(label, (8 * SQUARE_SIZE + BORDER_WIDTH // 3, row * SQUARE_SIZE + SQUARE_SIZE // 3))
+        surface.blit(label, (8 * SQUARE_SIZE + BORDER_WIDTH // 3, row * SQUARE_SIZE + SQUARE_SIZE // 3))
     for col in range(8):
         label = font.render(get_file(col), True, COLOR_LIGHT)
-        SCREEN.blit(label, (col * SQUARE_SIZE + SQUARE_SIZE // 3 + 4, 8 * SQUARE_SIZE + BORDER_WIDTH // 6))
-
-
-def highlight_possible_moves(selected_tile, possible_moves, chessboard_state):
-    """Highlight all the possible moves along with the selected tile"""
-    if selected_tile is None:
-        return
-
-    p.draw.rect(SCREEN, COLOR_HIGHLIGHT,
-                p.Rect(selected_tile[1] * SQUARE_SIZE, selected_tile[0] * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
-
-    for pos in possible_moves:
-        if chessboard_state.board[pos[0]][pos[1]] is None:
-            p.draw.circle(SCREEN, COLOR_HIGHLIGHT,
-                          (pos[1] * SQUARE_SIZE + SQUARE_SIZE // 2, pos[0] * SQUARE_SIZE + SQUARE_SIZE // 2),
-                          SQUARE_SIZE // 5)
+        surface.blit(label, (col * SQUARE_SIZE + SQUARE_SIZE // 3 + 4, 8 * SQUARE_SIZE + BORDER_WIDTH // 6))
+    return surface
+
+
+class BoardView:
+    """Draws the game. Static chessboard is rendered once, then only squares whose piece or highlight changed
+    are drawn and updated on display. Nothing is drawn if position, selection and popups did not change"""
+    def __init__(self):
+        self.background = render_chessboard()
+        # drawn (piece string, highlight) of every square, None if whole screen has to be drawn
+        self.squares = None
+        self.popups = None
+        self.frame_key = None
+
+    def invalidate(self):
+        """Draw whole screen next time"""
+        self.squares = None
+        self.frame_key = None
+
+    def draw(self, chessboard_state, selected_tile, possible_moves, king_pos, view_promotion_box, ending=None):
+        """Draw the game. ending is (end state, white wins) if game ending popup is visible"""
+        frame_key = (chessboard_state.zobrist_key, tuple(selected_tile) if selected_tile is not None else None,
+                     tuple(tuple(pos) for pos in possible_moves or ()),
+                     tuple(king_pos) if king_pos is not None else None, view_promotion_box, ending)
+        if frame_key == self.frame_key:
+            return
+        self.frame_key = frame_key
+
+        squares = self.get_squares(chessboard_state, selected_tile, possible_moves, king_pos, view_promotion_box)
+        popups = (view_promotion_box, ending)
+        if self.squares is None or popups != self.popups or (popups != (False, None) and squares != self.squares):
+            # popups are drawn over squares, so everything is drawn again
+            SCREEN.blit(self.background, (0, 0))
+            for square, (piece_str, highlight) in enumerate(squares):
+                self.draw_square(square // 8, square % 8, piece_str, highlight)
+            if view_promotion_box:
+                draw_promotion_choice(selected_tile, white_move=chessboard_state.white_to_move)
+            if ending is not None:
+                draw_game_ending(*ending)
+            p.display.flip()
         else:
-            p.draw.rect(SCREEN, COLOR_HIGHLIGHT,
-                        p.Rect(pos[1] * SQUARE_SIZE, pos[0] * SQUARE_SIZE, SQUARE_SIZE,
-                               SQUARE_SIZE))
-
-
-def highlight_king(chessboard_state, king_pos):
-    """Highlight appropriate king that is being checked, checkmated or stalemated"""
-    if chessboard_state.game_state() == chessboard.GameState.CHECK:
-        p.draw.rect(SCREEN, COLOR_CHECK,
-                    p.Rect(king_pos[1] * SQUARE_SIZE, king_pos[0] * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
-        p.draw.circle(SCREEN, get_tile_color(king_pos[0], king_pos[1]),
-                      (king_pos[1] * SQUARE_SIZE + SQUARE_SIZE // 2, king_pos[0] * SQUARE_SIZE + SQUARE_SIZE // 2),
-                      SQUARE_SIZE // 2)
-
-    elif chessboard_state.game_state() == chessboard.GameState.CHECKMATE:
-        p.draw.rect(SCREEN, COLOR_CHECK,
-                    p.Rect(king_pos[1] * SQUARE_SIZE, king_pos[0] * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
-
-    elif chessboard_state.game_state() == chessboard.GameState.STALEMATE:
-        p.draw.rect(SCREEN, COLOR_STALEMATE,
-                    p.Rect(king_pos[1] * SQUARE_SIZE, king_pos[0] * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
-        p.draw.circle(SCREEN, get_tile_color(king_pos[0], king_pos[1]),
-                      (king_pos[1] * SQUARE_SIZE + SQUARE_SIZE // 2, king_pos[0] * SQUARE_SIZE + SQUARE_SIZE // 2),
-                      SQUARE_SIZE // 2)
-
-
-def draw_pieces(chessboard_state):
-    """Draw pieces on the board"""
-    for row in range(8):
-        for col in range(8):
-            piece = chessboard_state.board[row][col]
-            if piece is not None:
-                SCREEN.blit(PIECES[str(piece)],
-                            p.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
+            dirty_rects = [self.draw_square(square // 8, square % 8, piece_str, highlight)
+                           for square, (piece_str, highlight) in enumerate(squares)
+                           if (piece_str, highlight) != self.squares[square]]
+            if dirty_rects:
+                p.display.update(dirty_rects)
+        self.squares = squares
+        self.popups = popups
+
+    @staticmethod
+    def get_squares(chessboard_state, selected_tile, possible_moves, king_pos, view_promotion_box):
+        """Get (piece string, highlight) of every square"""
+        highlights = {}
+        if king_pos is not None:
+            # highlight appropriate king that is being checked, checkmated or stalemated
+            game_state = chessboard_state.game_state()
+            if game_state in (chessboard.GameState.CHECK, chessboard.GameState.CHECKMATE,
+                              chessboard.GameState.STALEMATE):
+                highlights[king_pos[0] * 8 + king_pos[1]] = game_state
+        if not view_promotion_box and selected_tile is not None:
+            # highlight all the possible moves along with the selected tile
+            highlights[selected_tile[0] * 8 + selected_tile[1]] = HIGHLIGHT_SELECTED
+            for pos in possible_moves or ():
+                square = tile_to_square(pos)
+                highlights[square] = HIGHLIGHT_MOVE if chessboard_state.get_piece(square) is None else HIGHLIGHT_SELECTED
+        squares = []
+        for row in range(8):
+            for col in range(8):
+                piece = chessboard_state.get_piece(row * 8 + col)
+                squares.append((str(piece) if piece is not None else None, highlights.get(row * 8 + col)))
+        return squares
+
+    def draw_square(self, row, col, piece_str, highlight):
+        """Draw square with its highlight and piece. Returns drawn rectangle"""
+        rect = p.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
+        center = (col * SQUARE_SIZE + SQUARE_SIZE // 2, row * SQUARE_SIZE + SQUARE_SIZE // 2)
+        SCREEN.blit(self.background, rect, rect)
+        if highlight == HIGHLIGHT_SELECTED:
+            p.draw.rect(SCREEN, COLOR_HIGHLIGHT, rect)
+        elif highlight == HIGHLIGHT_MOVE:
+            p.draw.circle(SCREEN, COLOR_HIGHLIGHT, center, SQUARE_SIZE // 5)
+        elif highlight == chessboard.GameState.CHECK:
+            p.draw.rect(SCREEN, COLOR_CHECK, rect)
+            p.draw.circle(SCREEN, get_tile_color(row, col), center, SQUARE_SIZE // 2)
+        elif highlight == chessboard.GameState.CHECKMATE:
+            p.draw.rect(SCREEN, COLOR_CHECK, rect)
+        elif highlight == chessboard.GameState.STALEMATE:
+            p.draw.rect(SCREEN, COLOR_STALEMATE, rect)
+            p.draw.circle(SCREEN, get_tile_color(row, col), center, SQUARE_SIZE // 2)
+        if piece_str is not None:
+            SCREEN.blit(PIECES[piece_str], rect)
+        return rect
 
 
 def draw_init_window(top_is_white=True):
     """Draw initial window with buttons"""
     SCREEN.fill(COLOR_LIGHT)
     texts = ["Play alone", "Play against AI", "Swap colors", "Quit"]
-    font = p.font.SysFont("monospace", 18)
+    font = get_font(18)
     labels = [font.render(text, True, COLOR_LIGHT) for text in texts]
     labels_rects = [labels[0].get_rect(center=(WIDTH // 2, HEIGHT // 8)),
                     labels[1].get_rect(center=(WIDTH // 2, 3 * HEIGHT // 8)),
@@ -498,7 +704,7 @@ def draw_init_window(top_is_white=True):
 def draw_game_ending(state, white_wins=None):
     p.draw.rect(SCREEN, COLOR_LIGHT, p.Rect(RECT_GAME_END_X[0], RECT_GAME_END_Y[0],
                                             RECT_GAME_END_WIDTH, RECT_GAME_END_HEIGHT))
-    font = p.font.SysFont("monospace", 20)
+    font = get_font(20)
     if white_wins is not None:
         top_text = "Winner: "
         top_text += "white" if white_wins else "black"
@@ -518,6 +724,10 @@ def draw_game_ending(state, white_wins=None):
         bottom_text += "Stalemate"
     elif state == chessboard.GameState.INSUFFICIENT_MATERIAL:
         bottom_text += "Too few pieces"
+    elif state == chessboard.GameState.THREEFOLD_REPETITION:
+        bottom_text += "Repetition"
+    elif state == chessboard.GameState.FIFTY_MOVE_RULE:
+        bottom_text += "Fifty moves"
     elif state == chessboard.GameState.CHECKMATE:
         bottom_text += "Checkmate"
     label = font.render(bottom_text, True, COLOR_DARK)
@@ -579,12 +789,44 @@ def draw_promotion_choice(selected_tile, white_move=True):
                                               SQUARE_SIZE, SQUARE_SIZE))
 
 
-def get_legal_moves_list(piece):
-    """Get list() of legal move generator (if color is wrong or piece is None return None)"""
-    if piece is not None:
-        return piece.get_legal_moves_list()
-    else:
+def tile_to_square(tile):
+    """Get engine square index from ChessboardState.board indices"""
+    return tile[0] * 8 + tile[1]
+
+
+def square_to_tile(square):
+    """Get ChessboardState.board indices from engine square index"""
+    return [square // 8, square % 8]
+
+
+def get_legal_moves_list(chessboard_state, position):
+    """Get list() of tiles piece from position can move to (if color is wrong or there is no piece return None)"""
+    moves = chessboard_state.legal_moves_from(tile_to_square(position))
+    if moves is None:
         return None
+    legal_moves_list = []
+    for move in moves:
+        # every promotion choice is separate move with the same end tile
+        end_tile = square_to_tile(chessboard.move_end(move))
+        if end_tile not in legal_moves_list:
+            legal_moves_list.append(end_tile)
+    return legal_moves_list
+
+
+def get_move(chessboard_state, start_tile, end_tile, promotion_choice=chessboard.PieceType.QUEEN):
+    """Get engine move from start_tile to end_tile (if move is not legal return None)"""
+    end_square = tile_to_square(end_tile)
+    for move in chessboard_state.legal_moves_from(tile_to_square(start_tile)) or ():
+        if chessboard.move_end(move) == end_square and (chessboard.move_flag(move) != chessboard.MoveFlag.PROMOTION
+                                                        or chessboard.move_promotion_type(move) == promotion_choice):
+            return move
+    return None
+
+
+def get_move_str(move):
+    """Get move string from engine move"""
+    return f"{get_tile_str(square_to_tile(chessboard.move_start(move)))} --> " \
+           f"{get_tile_str(square_to_tile(chessboard.move_end(move)))}"
 
 
 def get_rank(n):
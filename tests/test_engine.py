@@ -0,0 +1,86 @@
+"""Engine checks: backends agreement, static exchange evaluation and UCI go command parsing.
+
+Run from repository root: python -m unittest discover tests (or python -m pytest tests)"""
+
+import unittest
+
+import Chess_AI.Engine.Chessboard as chessboard
+import Chess_AI.Engine.Perft as perft
+import Chess_AI.Engine.UCI as uci
+
+
+class BackendsTest(unittest.TestCase):
+    # suite depths with more known nodes are skipped, so test runs in seconds
+    MAX_NODES = 10000
+
+    def test_suite_node_counts(self):
+        for backend in perft.BACKENDS:
+            for result in perft.run_suite(backend, 3, BackendsTest.MAX_NODES):
+                with self.subTest(backend=backend, position=result["name"]):
+                    self.assertEqual(result["nodes"], result["expected"])
+
+    def test_backends_agree(self):
+        for fen in [position["fen"] for position in perft.PERFT_SUITE] + perft.EDGE_FENS:
+            with self.subTest(fen=fen):
+                self.assertIsNone(perft.compare_backends(fen, 1))
+
+    def test_en_passant_square_without_pawn_is_dropped(self):
+        for backend in perft.BACKENDS.values():
+            with self.subTest(backend=backend.__name__):
+                board_state = backend.from_fen("4k3/8/8/4P3/8/8/8/4K3 w - f6 0 1")
+                self.assertIsNone(board_state.en_passant_square)
+                self.assertEqual(len(board_state.legal_moves()), 6)
+
+
+class StaticExchangeTest(unittest.TestCase):
+    # (FEN, move, material gain of move after all captures on its end square)
+    POSITIONS = [
+        ("1k1r4/1pp4p/p7/4p3/8/P5P1/1PP4P/2K1R3 w - - 0 1", "e1e5", 100),
+        ("1k1r3q/1ppn3p/p4b2/4p3/8/P2N2P1/1PP1R1BP/2K1Q3 w - - 0 1", "d3e5", -220),
+        ("4k3/8/8/3p4/4P3/8/8/4K3 w - - 0 1", "e4d5", 100),
+        ("4k3/8/5n2/3p4/4P3/8/8/4K3 w - - 0 1", "e4d5", 0),
+        ("4k3/3r4/3r4/8/8/3R4/3R4/3QK3 w - - 0 1", "d3d6", 500),
+        ("3qk3/3r4/3r4/8/8/3R4/3R4/4K3 w - - 0 1", "d3d6", 0),
+        ("4k3/3r4/3p4/8/8/3Q4/3R4/4K3 w - - 0 1", "d3d6", -300),
+    ]
+
+    def test_known_positions(self):
+        for backend in perft.BACKENDS.values():
+            for fen, move_str, gain in StaticExchangeTest.POSITIONS:
+                with self.subTest(backend=backend.__name__, fen=fen, move=move_str):
+                    board_state = backend.from_fen(fen)
+                    move = next(move for move in board_state.legal_moves()
+                                if chessboard.move_to_str(move) == move_str)
+                    self.assertEqual(board_state.static_exchange_evaluation(move), gain)
+
+
+class UCIGoTest(unittest.TestCase):
+    def test_parse_go_arguments(self):
+        self.assertEqual(uci.parse_go_arguments("wtime 60000 btime 50000 winc 1000 binc 500 movestogo 20".split()),
+                         {"infinite": False, "ponder": False, "wtime": 60000, "btime": 50000, "winc": 1000,
+                          "binc": 500, "movestogo": 20})
+        self.assertEqual(uci.parse_go_arguments(["infinite"]), {"infinite": True, "ponder": False})
+        self.assertEqual(uci.parse_go_arguments("ponder depth 6 nodes 5000".split()),
+                         {"infinite": False, "ponder": True, "depth": 6, "nodes": 5000})
+        # value missing at end of command is ignored
+        self.assertEqual(uci.parse_go_arguments(["depth"]), {"infinite": False, "ponder": False})
+        with self.assertRaises(ValueError):
+            uci.parse_go_arguments("depth six".split())
+
+    def test_get_time_limit(self):
+        self.assertAlmostEqual(uci.get_time_limit({"movetime": 1000}, True), 0.95)
+        self.assertIsNone(uci.get_time_limit({"depth": 5}, True))
+        # remaining / movestogo + 3/4 of increment, less overhead
+        self.assertAlmostEqual(uci.get_time_limit({"wtime": 60000, "btime": 1000, "winc": 1000}, True),
+                               (60000 / uci.DEFAULT_MOVES_TO_GO + 750 - uci.MOVE_OVERHEAD_MS) / 1000)
+        self.assertAlmostEqual(uci.get_time_limit({"wtime": 60000, "btime": 30000, "movestogo": 10}, False),
+                               (3000 - uci.MOVE_OVERHEAD_MS) / 1000)
+        # single move never uses more than third of remaining time
+        self.assertAlmostEqual(uci.get_time_limit({"wtime": 3000, "movestogo": 1}, True),
+                               (1000 - uci.MOVE_OVERHEAD_MS) / 1000)
+        # at least 1 ms
+        self.assertEqual(uci.get_time_limit({"btime": 10}, False), 0.001)
+
+
+if __name__ == '__main__':
+    unittest.main()